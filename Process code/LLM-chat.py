@@ -1,17 +1,13 @@
 import os
-import openai
 import time
-import requests
-import json
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
 from groq import Groq
 import random
 import re
-import yfinance as yf
+# pandas, matplotlib and yfinance are only needed by finance mode, which
+# imports finance_analysis when it is first entered
 
 from datetime import datetime
+from tracing import TRACER
 def clear_pre_messages(pre_messages):
     """Clear old messages to maintain conversation history within limits"""
     if pre_messages is None:
@@ -22,14 +18,19 @@ def clear_pre_messages(pre_messages):
     return pre_messages
 class LLM_Chat:
     """LLM Chat class for interacting with Groq API"""
-    def __init__(self):
+    def __init__(self, base_url=None):
         self.model = "gemma2-9b-it"
         self.api_key = "API KEY"
-        self.client =  Groq(api_key=self.api_key)
+        # Point at another OpenAI-compatible server (e.g. the local mock) via
+        # the argument or LLM_BASE_URL; None keeps the normal Groq endpoint
+        self.base_url = base_url or os.environ.get("LLM_BASE_URL")
+        self.client =  Groq(api_key=self.api_key, base_url=self.base_url)
 
     def generate_response(self, pre_messages=None):
         """Generate response from LLM using previous messages as context"""
         pre_messages = clear_pre_messages(pre_messages)
+        TRACER.start_turn()
+        start = time.perf_counter()
         response = self.client.chat.completions.create(
         model=self.model,
         messages=pre_messages,
@@ -39,20 +40,29 @@ class LLM_Chat:
         stream=True,
         stop=None,
         )
+        TRACER.record("llm.request", time.perf_counter() - start)
         # Stream response processing - collect all chunks to build complete response
         full_content = ""
+        first_token = True
         for chunk in response:
                 # Process each chunk from streaming response
                 content = chunk.choices[0].delta.content
                 if content is not None:  # Check if content is not None
+                    if first_token:
+                        TRACER.record("llm.ttft", time.perf_counter() - start)
+                        first_token = False
                     full_content += content
                     # Compress multiple consecutive newlines to single newline
                     display_content = re.sub(r'[\n\r]+', '\r', content)
                     # Remove trailing newlines to avoid extra blank lines
                     display_content = display_content.rstrip('\n\r')
                     print(display_content, end="", flush=True)
+        TRACER.record("llm.stream", time.perf_counter() - start)
         print()
         print()
+        turn = TRACER.end_turn()
+        if turn is not None:
+            print(f"[latency ms] {turn.breakdown()}")
         # Clean up final content by compressing newlines and trimming whitespace
         full_content = re.sub(r'[\n\r]+', '\n', full_content)
         full_content = full_content.rstrip()
@@ -123,7 +133,7 @@ def validate_date_format(date_string):
         return False
 
 def validate_tickers(tickers_string):
-    """Validate if tickers string contains valid ticker symbols"""
+    """Parse tickers and put them in Yahoo's spelling using the local symbol index"""
     if not tickers_string or not tickers_string.strip():
         return False, "Empty ticker list"
     
@@ -131,14 +141,26 @@ def validate_tickers(tickers_string):
     if not tickers:
         return False, "No valid tickers found"
     
-    # Check if each ticker looks reasonable (letters only, 1-5 characters)
-    invalid_tickers = []
-    for ticker in tickers:
-        if not ticker.isalpha() or len(ticker) < 1 or len(ticker) > 5:
-            invalid_tickers.append(ticker)
+    # Text that can't be a symbol is refused. The index isn't a full listing,
+    # so other symbols it doesn't know are still fetched, but likely typos are
+    # offered a correction first (describe_failures suggests more if they fail)
+    from symbols import get_symbol_index
+    index = get_symbol_index()
+    tickers, unlisted, invalid = index.validate(tickers)
+    if invalid:
+        return False, f"Not ticker symbols: {', '.join(invalid)}"
     
-    if invalid_tickers:
-        return False, f"Invalid ticker format: {invalid_tickers}"
+    typos = index.typos(unlisted)
+    for ticker, close in typos.items():
+        print(f"{ticker} isn't in the local symbol list. Did you mean {', '.join(close)}?")
+        print(f"Type one of them, or press Enter to fetch {ticker} as typed: ")
+        answer = input().strip().upper()
+        if answer in close:
+            tickers = [answer if t == ticker else t for t in tickers]
+    
+    others = [t for t in unlisted if t not in typos]
+    if others:
+        print(f"Not in the local symbol list, fetching anyway: {', '.join(others)}")
     
     return True, tickers
 
@@ -160,6 +182,20 @@ def validate_path(path_string):
     
     return True, path_string.strip()
 
+def describe_failures(analyzer):
+    """Failed tickers with why they failed, e.g. 'XYZ (no data, skipped; did you mean XYL?)'"""
+    from symbols import get_symbol_index
+    hints = get_symbol_index().hints(analyzer.failed_tickers)
+    parts = []
+    for ticker in analyzer.failed_tickers:
+        reason = analyzer.failure_reasons.get(ticker, 'error').replace('_', ' ')
+        if ticker in analyzer.skipped_tickers:
+            reason += ", skipped"
+        if hints.get(ticker):
+            reason += f"; did you mean {', '.join(hints[ticker])}?"
+        parts.append(f"{ticker} ({reason})")
+    return ", ".join(parts)
+
 def finance_mode():
     """Handle finance analysis mode"""
     print("================================")
@@ -250,10 +286,59 @@ def finance_mode():
                     break
                 else:
                     print(f"Invalid ticker input: {result}")
-                    print("Please enter valid stock symbols (1-5 letters, comma-separated)")
+                    print("Please enter valid stock symbols (comma-separated, e.g., AAPL,BRK.B,^GSPC)")
         
         if tickers_input.lower() == 'quit':
             continue
+        
+        # Optional benchmark for beta in the returns analysis
+        while True:
+            print("Enter benchmark ticker for beta (optional, e.g., SPY; press Enter to skip): ")
+            benchmark = input().strip()
+            if benchmark.lower() == 'exit':
+                print("Goodbye!")
+                return True
+            elif benchmark == '' or benchmark.lower() == 'quit':
+                break
+            else:
+                is_valid, result = validate_tickers(benchmark)
+                if is_valid and len(result) == 1:
+                    benchmark = result[0]
+                    break
+                else:
+                    if not is_valid:
+                        print(result)
+                    print("Please enter a single valid stock symbol, or press Enter to skip")
+        
+        if benchmark.lower() == 'quit':
+            continue
+        
+        # Bar size; other sizes of the same range later reuse the downloaded bars
+        while True:
+            print("Enter bar interval (1m/5m/15m/30m/1h/1d/1wk/1mo; press Enter for 1d): ")
+            interval = input().strip().lower() or '1d'
+            if interval == 'exit':
+                print("Goodbye!")
+                return True
+            elif interval == 'quit' or interval in ['1m', '5m', '15m', '30m', '1h', '1d', '1wk', '1mo']:
+                break
+            else:
+                print("Invalid interval. Note that 1m bars only go back 30 days and 5m-30m bars 60 days.")
+        
+        if interval == 'quit':
+            continue
+        
+        # CSV rows are written as each ticker arrives; optionally one file per ticker
+        partition = False
+        if choice in ['1', '3']:
+            print("One CSV file per ticker? (y/N): ")
+            answer = input().strip().lower()
+            if answer == 'exit':
+                print("Goodbye!")
+                return True
+            elif answer == 'quit':
+                continue
+            partition = answer in ['y', 'yes']
             
         # Get saving path with validation
         while True:
@@ -279,6 +364,7 @@ def finance_mode():
         print(f"\nProcessing analysis...")
         print(f"Date range: {start_date} to {end_date}")
         print(f"Tickers: {tickers}")
+        print(f"Interval: {interval}")
         print(f"Output directory: {saving_path}")
         print("-" * 50)
         
@@ -294,31 +380,47 @@ def finance_mode():
             
             # Remove duplicates
             unique_tickers = analyzer.remove_duplicates(tickers)
+            if benchmark and benchmark not in unique_tickers:
+                unique_tickers.append(benchmark)
             
-            # Fetch data
-            combined_data = analyzer.combine_stock_data(unique_tickers, start_date, end_date)
+            # Symbols that failed recently are skipped without a download unless retried
+            from price_cache import FAILED_FETCHES
+            recent = {t: FAILED_FETCHES.check(t, start_date, end_date, interval) for t in unique_tickers}
+            recent = {t: reason for t, reason in recent.items() if reason}
+            if recent:
+                listed = ", ".join(f"{t} ({reason.replace('_', ' ')})" for t, reason in recent.items())
+                print(f"These tickers failed recently: {listed}")
+                print("Try them again anyway? (y/N): ")
+                if input().strip().lower() in ['y', 'yes']:
+                    FAILED_FETCHES.forget(list(recent))
+            
+            # Fetch data (for CSV output, each ticker is written as soon as it arrives)
+            if choice in ['1', '3']:
+                export = analyzer.export_stock_data_csv(unique_tickers, start_date, end_date, saving_path,
+                                                        interval, partition=partition, keep_data=True)
+                combined_data = export['data']
+            else:
+                combined_data = analyzer.combine_stock_data(unique_tickers, start_date, end_date, interval)
             
             if combined_data.empty:
                 print("No valid data was fetched for any ticker.")
-                print(f"Failed tickers: {analyzer.failed_tickers}")
+                print(f"Failed tickers: {describe_failures(analyzer)}")
                 continue
             
             # Generate outputs based on choice
             if choice == '1':  # CSV only
-                csv_path = analyzer.save_data_to_csv(combined_data, saving_path)
-                print(f"CSV data saved to: {csv_path}")
+                print(f"CSV data saved to: {export['csv_path']}")
             elif choice == '2':  # Chart only
                 chart_path = analyzer.create_stock_chart(combined_data, saving_path)
                 print(f"Chart saved to: {chart_path}")
             elif choice == '3':  # Both
-                csv_path = analyzer.save_data_to_csv(combined_data, saving_path)
                 chart_path = analyzer.create_stock_chart(combined_data, saving_path)
-                print(f"CSV data saved to: {csv_path}")
+                print(f"CSV data saved to: {export['csv_path']}")
                 print(f"Chart saved to: {chart_path}")
             
             # Show failed tickers if any
             if analyzer.failed_tickers:
-                print(f"Failed tickers: {analyzer.failed_tickers}")
+                print(f"Failed tickers: {describe_failures(analyzer)}")
             
             # Generate and show summary
             summary = analyzer.generate_summary_report(combined_data)
@@ -331,7 +433,31 @@ def finance_mode():
                 print(f"    Price Change: ${stats['price_change']}")
                 print(f"    Highest Price: ${stats['highest_price']}")
                 print(f"    Lowest Price: ${stats['lowest_price']}")
-                    
+
+            # Latest technical indicators (cached, so repeat runs are quick)
+            indicators = analyzer.generate_indicator_report(combined_data)
+            print("\nTechnical Indicators:")
+            for ticker, values in indicators.items():
+                print(f"  {ticker}:")
+                for name, value in values.items():
+                    print(f"    {name}: {value}")
+            
+            # Returns, correlation and beta across all the tickers
+            returns = analyzer.analyze_returns(combined_data, benchmark or None)
+            if returns and len(returns['tickers']) > 1:
+                from returns_analysis import top_pairs
+                print("\nReturns and Correlation:")
+                if returns['benchmark']:
+                    print(f"  (beta against {returns['benchmark']})")
+                print(returns['per_ticker'].round(4).to_string())
+                if len(returns['tickers']) <= 10:
+                    print("\nCorrelation matrix:")
+                    print(returns['correlation'].round(2).to_string())
+                else:
+                    print("\nMost and least correlated pairs:")
+                    for a, b, value in top_pairs(returns['correlation']):
+                        print(f"  {a} / {b}: {value}")
+
         except Exception as e:
             print(f"Error during analysis: {e}")
             print("Please check your inputs and try again.")
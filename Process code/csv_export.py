@@ -0,0 +1,169 @@
+"""
+Streaming CSV export
+Writes each ticker's rows as soon as they are fetched instead of waiting for
+every ticker to be downloaded and combined. Output goes to a temporary name
+(unique per export, in the target folder) and is renamed into place when
+the export finishes, so the final file (or folder) is never seen half
+written.
+"""
+
+import csv
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+
+def ticker_summary(data: pd.DataFrame) -> Dict:
+    """
+    Summary figures for one ticker's bars (the same ones
+    StockDataAnalyzer.generate_summary_report gives)
+    """
+    return {
+        'records_count': len(data),
+        'date_range': f"{data['Date'].min()} to {data['Date'].max()}",
+        'avg_close_price': round(data['Close'].mean(), 2),
+        'price_change': round(data['Close'].iloc[-1] - data['Close'].iloc[0], 2),
+        'highest_price': round(data['High'].max(), 2),
+        'lowest_price': round(data['Low'].min(), 2)
+    }
+
+
+class CSVExportWriter:
+    """
+    Appends one ticker at a time to a CSV export
+    Either one combined file (header written once) or, with partition=True,
+    a folder holding one file per ticker. The combined file has every column
+    any ticker had, like pd.concat would give. The summary is built up as
+    tickers are added, so the combined data never has to be kept.
+    """
+
+    def __init__(self, saving_path: str, filename: str = None, partition: bool = False):
+        """
+        Args:
+            saving_path: Folder to export into
+            filename: Name of the CSV file, or of the folder when partitioning
+                (a timestamped name, to the microsecond, if not given)
+            partition: Write one <ticker>.csv per ticker instead of one file
+        """
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            filename = f"stock_data_{timestamp}" + ("" if partition else ".csv")
+
+        self.path = os.path.join(saving_path, filename)
+        self.partition = partition
+        # A temp name of its own, so two exports to the same name never share one
+        if partition:
+            self.temp_path = tempfile.mkdtemp(prefix=f"{filename}.", suffix=".part", dir=saving_path)
+            self.file = None
+        else:
+            handle, self.temp_path = tempfile.mkstemp(prefix=f"{filename}.", suffix=".part", dir=saving_path)
+            self.file = os.fdopen(handle, "w", newline="")
+
+        self.columns: Optional[List[str]] = None
+        self.summary: Dict[str, Dict] = {}
+        self.records = 0
+        self.started = time.perf_counter()
+        self.finished = False
+        self.saved_path: Optional[str] = None
+        # Seconds from opening the export until the first rows were on disk
+        self.first_write_seconds: Optional[float] = None
+
+    def append(self, ticker: str, data: pd.DataFrame) -> None:
+        """
+        Write one ticker's bars
+
+        Args:
+            ticker: Stock symbol
+            data: Its bars; in the combined file columns are put in the
+                header's order (missing ones left empty) so every row lines
+                up with the header
+        """
+        if data is None or data.empty:
+            return
+
+        if self.partition:
+            data.to_csv(os.path.join(self.temp_path, f"{ticker}.csv"), index=False)
+        else:
+            if self.columns is None:
+                self.columns = list(data.columns)
+            added = [name for name in data.columns if name not in self.columns]
+            if added:
+                # e.g. "Capital Gains" from a fund after only stocks so far
+                self._add_columns(added)
+            if list(data.columns) != self.columns:
+                data = data.reindex(columns=self.columns)
+            data.to_csv(self.file, header=self.records == 0, index=False)
+            self.file.flush()
+
+        if self.first_write_seconds is None:
+            self.first_write_seconds = time.perf_counter() - self.started
+        self.summary[ticker] = ticker_summary(data)
+        self.records += len(data)
+
+    def _add_columns(self, added: List[str]) -> None:
+        """
+        Widen the combined file written so far by some columns at the end
+
+        The rows already written get empty values for them. This only
+        happens when a ticker brings columns none before it had, and costs
+        one pass over the file.
+        """
+        self.columns += added
+        if self.records == 0:
+            return
+        self.file.close()
+        header = io.StringIO()
+        csv.writer(header, lineterminator="").writerow([""] + added)
+        widened = self.temp_path + ".wide"
+        with open(self.temp_path, newline="") as old, open(widened, "w", newline="") as new:
+            for number, line in enumerate(old):
+                text = line.rstrip("\r\n")
+                new.write(text + (header.getvalue() if number == 0 else "," * len(added)) + line[len(text):])
+        os.replace(widened, self.temp_path)
+        self.file = open(self.temp_path, "a", newline="")
+
+    def close(self) -> Optional[str]:
+        """
+        Finish the export and move it into place
+
+        Returns:
+            The path of the file (or folder), or None if no rows were written
+        """
+        if self.finished:
+            return self.saved_path
+        if self.records == 0:
+            self.abort()
+            return None
+        if self.file is not None:
+            self.file.close()
+        # Temp files and folders are private to the owner; give the export the usual permissions
+        os.chmod(self.temp_path, 0o755 if self.partition else 0o644)
+        os.replace(self.temp_path, self.path)
+        self.finished = True
+        self.saved_path = self.path
+        return self.path
+
+    def abort(self) -> None:
+        """Throw away a partly written export"""
+        self.finished = True
+        if self.file is not None:
+            self.file.close()
+        if self.partition:
+            shutil.rmtree(self.temp_path, ignore_errors=True)
+        elif os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self) -> "CSVExportWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        elif not self.finished:
+            self.abort()
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Test script to check if the Groq API key is working
+
+To run it offline, start python_final_project/mock_llm_server.py and set
+LLM_BASE_URL=http://127.0.0.1:8001 before running this script.
 """
 
 from utils import query_llm
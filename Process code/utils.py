@@ -5,7 +5,10 @@ import os
 # IMPORTANT: ONLY UPDATE YOUR API KEY BELOW
 
 API_KEY = "API KEY"
-CLIENT = Groq(api_key=API_KEY)
+# Set LLM_BASE_URL to send requests somewhere else, e.g. the local mock
+# server in python_final_project/mock_llm_server.py (None means the normal Groq endpoint)
+BASE_URL = os.environ.get("LLM_BASE_URL")
+CLIENT = Groq(api_key=API_KEY, base_url=BASE_URL)
 
 def query_llm(message: str) -> str:
     """
@@ -1,13 +1,191 @@
 # app.py
 
 import streamlit as st
+import time
 from chatbot_logic import FriendlyBot, TeacherBot, FunnyBot
-import yfinance as yf
-import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
-import os
-from finance_analysis import StockDataAnalyzer
+from tracing import TRACER
+from chat_history import ChatHistory
+# finance_analysis (pandas, matplotlib, yfinance) is imported the first time
+# finance mode is opened, so chat-only sessions never pay for it
+
+# --- Shared Finance Caches ---
+# These live for the whole server process, so every session reuses the same
+# analyzer and the same downloaded prices
+FINANCE_CACHE_TTL = 60 * 60          # seconds before prices are fetched again
+FINANCE_CACHE_MAX_ENTRIES = 512      # (ticker, date range, interval) results kept in memory
+
+@st.cache_resource
+def get_analyzer():
+    """One StockDataAnalyzer for validation, CSV and chart work in all sessions"""
+    from finance_analysis import StockDataAnalyzer
+    get_price_cache()
+    return StockDataAnalyzer()
+
+@st.cache_resource
+def get_price_cache():
+    """The process-wide price cache, held to the same memory cap as the results above"""
+    from price_cache import PRICE_CACHE
+    PRICE_CACHE.max_entries = FINANCE_CACHE_MAX_ENTRIES
+    return PRICE_CACHE
+
+@st.cache_data(ttl=FINANCE_CACHE_TTL, max_entries=FINANCE_CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_ticker_data(ticker, start_date, end_date, interval="1d"):
+    """
+    Download one ticker's prices, shared across sessions
+    Streamlit lets only one session compute a missing entry, so many users
+    asking for the same ticker and range at once still cause a single fetch.
+    Other intervals of an already downloaded range are resampled from the
+    analyzer's price cache rather than downloaded; ranges reaching today
+    expire there well before this entry does, so a refetch gets new bars.
+    Failures raise instead of returning None so they are not cached.
+    """
+    from finance_analysis import StockDataAnalyzer
+    get_price_cache()
+    data = StockDataAnalyzer().fetch_stock_data(ticker, start_date, end_date, interval)
+    if data is None:
+        raise LookupError(f"No data for {ticker}")
+    return data
+
+def fetch_ticker_data_or_none(ticker, start_date, end_date, interval="1d"):
+    """Cached fetch in the form the background job runner expects"""
+    try:
+        return fetch_ticker_data(ticker, start_date, end_date, interval)
+    except LookupError:
+        return None
+
+# --- Background Finance Jobs ---
+JOB_POLL_INTERVAL = 0.5  # seconds between progress refreshes
+
+@st.cache_resource
+def get_chart_pool():
+    """Chart rendering processes shared by every session"""
+    from chart_pool import ChartRenderPool
+    return ChartRenderPool()
+
+@st.cache_resource
+def get_symbol_index():
+    """Local ticker symbol index, loaded once per server"""
+    from symbols import get_symbol_index as load_symbol_index
+    return load_symbol_index()
+
+@st.cache_resource
+def get_finance_router():
+    """Finance question router, shared by every session"""
+    from finance_router import FinanceRouter
+    get_price_cache()
+    return FinanceRouter()
+
+@st.cache_resource
+def get_finance_tools():
+    """Finance tools the LLM may call, shared by every session"""
+    from finance_tools import FinanceTools
+    get_price_cache()
+    return FinanceTools()
+
+@st.cache_resource
+def get_job_runner():
+    """Worker pool shared by every session, so jobs survive page changes"""
+    from finance_jobs import FinanceJobRunner
+    return FinanceJobRunner(max_workers=4, fetch=fetch_ticker_data_or_none,
+                            chart_pool=get_chart_pool())
+
+def show_analysis_results(result):
+    """Display the outputs and summary of a finished analysis job"""
+    st.success("Analysis completed successfully!")
+    if 'csv_path' in result:
+        st.write(f"CSV data saved to: {result['csv_path']}")
+    if result.get('first_write_seconds') is not None:
+        st.caption(f"First rows written after {result['first_write_seconds']:.1f}s")
+    if result.get('chart_png'):
+        st.image(result['chart_png'], caption="Stock Price Analysis")
+        st.download_button("Download chart", result['chart_png'],
+                           file_name="stock_chart.png", mime="image/png")
+    if 'chart_path' in result:
+        st.write(f"Chart saved to: {result['chart_path']}")
+    
+    # Show failed tickers if any, with close matches for ones the symbol list doesn't have
+    if result.get('failed_tickers'):
+        reasons = result.get('failure_reasons', {})
+        st.warning("Failed tickers: " + ", ".join(
+            f"{ticker} ({reasons[ticker].replace('_', ' ')})" if ticker in reasons else ticker
+            for ticker in result['failed_tickers']))
+        for ticker, suggestions in get_symbol_index().hints(result['failed_tickers']).items():
+            if suggestions:
+                st.caption(f"{ticker}: did you mean {', '.join(suggestions)}?")
+    
+    st.subheader("Summary Report")
+    for ticker, stats in result.get('summary', {}).items():
+        with st.expander(f"{ticker} Statistics"):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Records", stats['records_count'])
+                st.metric("Avg Close Price", f"${stats['avg_close_price']}")
+                st.metric("Price Change", f"${stats['price_change']}")
+            with col2:
+                st.metric("Highest Price", f"${stats['highest_price']}")
+                st.metric("Lowest Price", f"${stats['lowest_price']}")
+                st.write(f"**Date Range:** {stats['date_range']}")
+    
+    if result.get('indicators'):
+        import pandas as pd
+        st.subheader("Technical Indicators")
+        # One row per ticker, latest value of each indicator
+        st.dataframe(pd.DataFrame.from_dict(result['indicators'], orient='index'))
+    
+    returns = result.get('returns')
+    if returns:
+        from returns_analysis import top_pairs
+        st.subheader("Returns and Correlation")
+        if returns['benchmark']:
+            st.caption(f"Beta measured against {returns['benchmark']}")
+        st.dataframe(returns['per_ticker'])
+        if result.get('heatmap_png'):
+            st.image(result['heatmap_png'], caption="Correlation Heatmap")
+        # A full matrix is only readable for a handful of tickers
+        if len(returns['tickers']) <= 30:
+            st.dataframe(returns['correlation'].round(2))
+        else:
+            st.write("**Most and least correlated pairs:**")
+            st.table([{"Pair": f"{a} / {b}", "Correlation": value}
+                      for a, b, value in top_pairs(returns['correlation'])])
+
+    backtest = result.get('backtest')
+    if backtest:
+        st.subheader("Portfolio Backtest")
+        metrics = backtest['metrics']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Return", f"{metrics['total_return']:.1%}")
+        col1.metric("Annual Return", f"{metrics['annual_return']:.1%}")
+        col2.metric("Sharpe Ratio", f"{metrics['sharpe']:.2f}")
+        col2.metric("Volatility", f"{metrics['volatility']:.1%}")
+        col3.metric("Max Drawdown", f"{metrics['max_drawdown']:.1%}")
+        col3.metric("Turnover", f"{metrics['turnover']:.2f}")
+        st.line_chart(backtest['equity']['Portfolio'])
+        st.caption(f"Weights: {backtest['weights']} - {backtest['rebalances']} rebalances")
+        if 'sweep' in backtest:
+            st.write("**Best random portfolios by Sharpe ratio:**")
+            st.dataframe(backtest['sweep'])
+
+def parse_weights(text):
+    """
+    Read weights typed as "AAPL:0.5, MSFT:0.5"
+    
+    Returns:
+        {ticker: weight}, or None for equal weights when the box is empty
+    
+    Raises:
+        ValueError: If an entry isn't TICKER:number
+    """
+    if not text.strip():
+        return None
+    weights = {}
+    for item in text.split(','):
+        ticker, _, value = item.partition(':')
+        if not ticker.strip() or not value.strip():
+            raise ValueError(f"Expected TICKER:weight, got '{item.strip()}'")
+        weights[ticker.strip().upper()] = float(value)
+    return weights
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -62,15 +240,29 @@ with st.sidebar:
             st.session_state.bot = FunnyBot(name="Comedy")
         
         # Initialize chat history
-        st.session_state.messages = [{"role": "assistant", "content": "Hello! How can I help you today?"}]
+        st.session_state.history = ChatHistory()
+        st.session_state.history.append("assistant", "Hello! How can I help you today?")
         st.rerun()
 
     if st.session_state.bot is not None:
+        # Stock questions naming a ticker get real figures instead of the LLM's guess
+        use_router = st.checkbox("Answer stock questions from real prices", value=False, key="router_checkbox",
+                                 help='e.g. "How did AAPL do in 2023?" or "$MSFT price this year" (may download prices)')
+        st.session_state.bot.finance_router = get_finance_router() if use_router else None
+        # The model decides when to fetch prices, summaries or indicators itself
+        use_tools = st.checkbox("Let the bot look up stock data", value=False, key="tools_checkbox",
+                                help="The LLM may call fetch, summary and indicator tools (a few extra LLM calls per turn)")
+        st.session_state.bot.finance_tools = get_finance_tools() if use_tools else None
         if st.button("Reset Conversation", key="reset_button"):
             st.session_state.bot = None
-            st.session_state.messages = []
+            st.session_state.history = ChatHistory()
             st.rerun()
 
+    # Kept in this session's state and applied to the thread running this rerun,
+    # so it doesn't switch tracing on for every other open session
+    TRACER.enable_for_thread(st.checkbox("Show latency breakdown", value=TRACER.default_enabled,
+                                         key="trace_checkbox"))
+
 # --- Finance Analysis Section ---
 if st.session_state.bot is not None:
     st.sidebar.header("Finance Analysis")
@@ -97,107 +289,203 @@ if st.session_state.get('finance_mode', False):
     
     with col2:
         tickers_input = st.text_input("Stock Tickers (comma-separated)", "AAPL,GOOGL,MSFT")
+        # Autocomplete for the symbol being typed (the last one in the list)
+        typing = tickers_input.split(',')[-1].strip()
+        completions = get_symbol_index().complete(typing, limit=8) if typing else []
+        if completions and completions[0][0] != typing.upper():
+            st.caption("Matches: " + ", ".join(f"{symbol} ({name})" if name else symbol
+                                                for symbol, name in completions))
         saving_path = st.text_input("Saving Directory", "./finance_data")
     
+    interval = st.selectbox("Bar interval", ["1d", "1h", "30m", "15m", "5m", "1m", "1wk", "1mo"],
+                            help="Minute bars only go back 30 days (5-30m: 60 days, 1h: 2 years). "
+                                 "Switching interval reuses already downloaded bars.")
+    
+    # CSV rows can go to disk as each ticker arrives instead of all at the end
+    stream_csv, csv_partition = False, False
+    if analysis_type in ["CSV data only", "Both CSV and chart"]:
+        stream_csv = st.checkbox("Write CSV as each ticker arrives", value=True)
+        if stream_csv:
+            csv_partition = st.checkbox("One CSV file per ticker (in a folder)", value=False)
+    
+    # Charts are shown straight from memory; writing a PNG file is opt-in
+    save_chart = False
+    if analysis_type in ["Chart visualization", "Both CSV and chart"]:
+        save_chart = st.checkbox("Also save chart to the saving directory", value=False)
+    # Symbols that failed recently are skipped without a download unless this is ticked
+    retry_failed = st.checkbox("Retry tickers that failed recently", value=False)
+    include_indicators = st.checkbox("Include technical indicators (SMA, EMA, RSI, MACD, Bollinger, volatility, drawdown)",
+                                     value=False)
+    include_returns = st.checkbox("Include returns and correlation analysis", value=False)
+    benchmark, include_heatmap = "", False
+    if include_returns:
+        benchmark = st.text_input("Benchmark ticker for beta (optional)", "SPY").strip().upper()
+        include_heatmap = st.checkbox("Draw correlation heatmap", value=True)
+    include_backtest = st.checkbox("Run portfolio backtest", value=False)
+    weights_input, schedule, cost_bps, sweep_count = "", "monthly", 0.0, 0
+    if include_backtest:
+        weights_input = st.text_input("Weights (e.g. AAPL:0.5, MSFT:0.5; blank for equal weights)", "")
+        schedule = st.selectbox("Rebalance", ["monthly", "weekly", "quarterly", "yearly", "daily", "never"])
+        cost_bps = st.number_input("Trading cost (basis points)", min_value=0.0, value=0.0, step=1.0)
+        sweep_count = st.number_input("Also try this many random portfolios", min_value=0,
+                                      max_value=20000, value=0, step=1000)
+    
     if st.button("Analyze Stocks"):
         if start_date >= end_date:
             st.error("End date must be after start date.")
         elif not tickers_input.strip():
             st.error("Please enter at least one ticker symbol.")
         else:
-            with st.spinner("Processing analysis..."):
+            backtest_options = None
+            if include_backtest:
                 try:
-                    # Convert dates to string format
-                    start_date_str = start_date.strftime('%Y-%m-%d')
-                    end_date_str = end_date.strftime('%Y-%m-%d')
-                    
-                    # Parse tickers
-                    tickers = [t.strip().upper() for t in tickers_input.split(',') if t.strip()]
-                    
-                    # Create analyzer
-                    analyzer = StockDataAnalyzer()
-                    
-                    # Validate inputs
-                    if not analyzer.validate_inputs(start_date_str, end_date_str, tickers, saving_path):
-                        st.error("Invalid inputs. Please check your data.")
-                        st.stop()
-                    
-                    # Remove duplicates
-                    unique_tickers = analyzer.remove_duplicates(tickers)
-                    
-                    # Fetch data
-                    combined_data = analyzer.combine_stock_data(unique_tickers, start_date_str, end_date_str)
-                    
-                    if combined_data.empty:
-                        st.error("No valid data was fetched for any ticker.")
-                        if analyzer.failed_tickers:
-                            st.write(f"Failed tickers: {analyzer.failed_tickers}")
-                        st.stop()
-                    
-                    # Generate outputs
-                    results = []
-                    
-                    if analysis_type in ["CSV data only", "Both CSV and chart"]:
-                        csv_path = analyzer.save_data_to_csv(combined_data, saving_path)
-                        results.append(f"CSV data saved to: {csv_path}")
-                    
-                    if analysis_type in ["Chart visualization", "Both CSV and chart"]:
-                        chart_path = analyzer.create_stock_chart(combined_data, saving_path)
-                        results.append(f"Chart saved to: {chart_path}")
-                    
-                    # Display results
-                    st.success("Analysis completed successfully!")
-                    for result in results:
-                        st.write(result)
-                    
-                    # Show failed tickers if any
-                    if analyzer.failed_tickers:
-                        st.warning(f"Failed tickers: {analyzer.failed_tickers}")
-                    
-                    # Generate and show summary
-                    summary = analyzer.generate_summary_report(combined_data)
-                    st.subheader("Summary Report")
-                    
-                    for ticker, stats in summary.items():
-                        with st.expander(f"{ticker} Statistics"):
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.metric("Records", stats['records_count'])
-                                st.metric("Avg Close Price", f"${stats['avg_close_price']}")
-                                st.metric("Price Change", f"${stats['price_change']}")
-                            with col2:
-                                st.metric("Highest Price", f"${stats['highest_price']}")
-                                st.metric("Lowest Price", f"${stats['lowest_price']}")
-                                st.write(f"**Date Range:** {stats['date_range']}")
-                
-                except Exception as e:
-                    st.error(f"Error during analysis: {e}")
+                    backtest_options = {"weights": parse_weights(weights_input), "schedule": schedule,
+                                        "cost_bps": cost_bps, "sweep": int(sweep_count)}
+                except ValueError as e:
+                    st.error(f"Invalid weights: {e}")
+                    st.stop()
+            
+            # Convert dates to string format
+            start_date_str = start_date.strftime('%Y-%m-%d')
+            end_date_str = end_date.strftime('%Y-%m-%d')
+            
+            # Parse tickers and put them in Yahoo's spelling. Text that can't be a
+            # symbol is dropped; symbols the local index doesn't list are still
+            # fetched, but likely typos are pointed out first
+            symbol_index = get_symbol_index()
+            tickers, unlisted, invalid = symbol_index.validate(t for t in tickers_input.split(',') if t.strip())
+            if benchmark:
+                from symbols import well_formed
+                benchmark = symbol_index.resolve(benchmark) or benchmark
+                if not well_formed(benchmark):
+                    st.error(f"Not a ticker symbol: {benchmark}")
+                    st.stop()
+            if invalid:
+                st.error(f"Not ticker symbols, skipped: {', '.join(invalid)}")
+            typos = symbol_index.typos(unlisted)
+            for ticker, close in typos.items():
+                st.warning(f"{ticker} isn't in the symbol list. Did you mean {', '.join(close)}? "
+                           f"Fetching {ticker} as typed.")
+            other_unlisted = [ticker for ticker in unlisted if ticker not in typos]
+            if other_unlisted:
+                st.info(f"Not in the local symbol list, fetching anyway: {', '.join(other_unlisted)}")
+            
+            # Shared analyzer (it keeps no per-request state here)
+            analyzer = get_analyzer()
+            
+            # Validate inputs
+            if not analyzer.validate_inputs(start_date_str, end_date_str, tickers, saving_path):
+                st.error("Invalid inputs. Please check your data.")
+            else:
+                # Remove duplicates and hand the work to a background job
+                unique_tickers = analyzer.remove_duplicates(tickers)
+                if retry_failed:
+                    from price_cache import FAILED_FETCHES
+                    FAILED_FETCHES.forget(unique_tickers + ([benchmark] if benchmark else []))
+                st.session_state.finance_job_id = get_job_runner().submit(
+                    unique_tickers, start_date_str, end_date_str, saving_path,
+                    interval=interval,
+                    make_csv=analysis_type in ["CSV data only", "Both CSV and chart"],
+                    make_chart=analysis_type in ["Chart visualization", "Both CSV and chart"],
+                    save_chart=save_chart,
+                    make_indicators=include_indicators,
+                    make_returns=include_returns,
+                    benchmark=benchmark or None,
+                    make_heatmap=include_heatmap,
+                    backtest_options=backtest_options,
+                    stream_csv=stream_csv,
+                    csv_partition=csv_partition,
+                )
+    
+    # --- Background Job Progress and Results ---
+    job_running = False
+    job = get_job_runner().get(st.session_state.get('finance_job_id', ''))
+    if job is not None:
+        from finance_jobs import QUEUED, RUNNING, DONE, CANCELLED
+        snapshot = job.snapshot()
+        
+        if snapshot['status'] in (QUEUED, RUNNING):
+            job_running = True
+            stage = f"{snapshot['stage'].capitalize()} {snapshot['ticker']}".strip()
+            st.progress(snapshot['progress'],
+                        text=f"{stage} ({snapshot['completed_steps']}/{snapshot['total_steps']})")
+            if st.button("Cancel Analysis"):
+                job.cancel()
+        elif snapshot['status'] == DONE:
+            show_analysis_results(snapshot['result'])
+        elif snapshot['status'] == CANCELLED:
+            st.info("Analysis cancelled.")
+        else:
+            st.error(f"Error during analysis: {snapshot['error']}")
+            if snapshot['result'].get('failed_tickers'):
+                st.write(f"Failed tickers: {snapshot['result']['failed_tickers']}")
     
     if st.sidebar.button("Back to Chat"):
         st.session_state.finance_mode = False
         st.rerun()
+    
+    # Check on the job again shortly; the page stays usable in between
+    if job_running:
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
 
 # --- Main Chat Interface ---
 elif 'bot' in st.session_state and st.session_state.bot is not None:
+    history = st.session_state.history
+    
+    # Only the newest page of messages is drawn; older ones load on request
+    hidden = history.hidden_count()
+    if hidden:
+        if st.button(f"Load earlier messages ({hidden} hidden)", key="load_earlier_button"):
+            history.load_earlier()
+            st.rerun()
+    if history.showing_earlier():
+        if st.button("Jump to latest", key="jump_to_latest_button"):
+            history.show_latest()
+            st.rerun()
+    
     # Display chat messages
-    for message in st.session_state.get('messages', []):
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    for role, markdown in history.window():
+        with st.chat_message(role):
+            st.markdown(markdown)
 
     # Accept user input
     if prompt := st.chat_input("What would you like to say?"):
-        # Add user message to display history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        # Add user message to display history; a new message goes back to the newest page
+        history.show_latest()
+        history.append("user", prompt)
         with st.chat_message("user"):
-            st.markdown(prompt)
+            st.markdown(history.rendered[-1])
 
         # Generate and display assistant response
+        TRACER.start_turn()
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
-                response = st.session_state.bot.generate_response(prompt)
-                st.markdown(response)
-        
-        # Add assistant response to display history
-        st.session_state.messages.append({"role": "assistant", "content": response})
+                with TRACER.span("generate_response"):
+                    response = st.session_state.bot.generate_response(prompt)
+            
+            # Add assistant response to display history
+            history.append("assistant", response)
+            with TRACER.span("render"):
+                st.markdown(history.rendered[-1])
+        turn = TRACER.end_turn()
+        if turn is not None:
+            st.session_state.last_turn_trace = turn.breakdown()
+
+    # Show where the last turn spent its time (drawn after the turn so it is current)
+    if TRACER.enabled and st.session_state.get('last_turn_trace'):
+        with st.sidebar:
+            st.subheader("Last Turn Latency (ms)")
+            breakdown = st.session_state.last_turn_trace
+            st.table({"Stage": list(breakdown.keys()), "ms": list(breakdown.values())})
+            with st.expander("Latency percentiles (ms)"):
+                percentiles = TRACER.percentiles()
+                st.table({
+                    "Stage": list(percentiles.keys()),
+                    "Count": [stats["count"] for stats in percentiles.values()],
+                    "p50": [stats["p50"] for stats in percentiles.values()],
+                    "p95": [stats["p95"] for stats in percentiles.values()],
+                    "p99": [stats["p99"] for stats in percentiles.values()],
+                })
 else:
     st.info("Please configure your chatbot in the sidebar and click 'Start Chat'.")
\ No newline at end of file
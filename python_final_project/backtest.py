@@ -0,0 +1,239 @@
+"""
+Portfolio backtester
+Runs allocation what-ifs on the data StockDataAnalyzer fetches. Between
+rebalances each portfolio is buy-and-hold, so its value on any day is the
+value at the last rebalance times (price growth since then) @ weights.
+Everything is matrix products and cumulative products over the aligned
+price matrix, which lets thousands of weight vectors be tested at once.
+"""
+
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from returns_analysis import price_matrix
+
+TRADING_DAYS = 252
+
+# Calendar schedules understood by rebalance_positions, as pandas period codes
+SCHEDULES = {
+    "daily": "D",
+    "weekly": "W",
+    "monthly": "M",
+    "quarterly": "Q",
+    "yearly": "Y",
+}
+
+
+def rebalance_positions(dates: pd.DatetimeIndex, schedule: Union[str, List] = "monthly") -> np.ndarray:
+    """
+    Rows of the price matrix where the portfolio is reset to its target weights
+
+    Args:
+        dates: Trading days of the price matrix
+        schedule: "never" (buy and hold), one of SCHEDULES (first trading day
+            of each period), or a list of dates (the next trading day on or
+            after each one is used)
+
+    Returns:
+        Sorted row numbers, always starting with 0
+    """
+    if isinstance(schedule, str):
+        if schedule == "never":
+            return np.array([0])
+        if schedule not in SCHEDULES:
+            raise ValueError(f"Unknown rebalance schedule: {schedule}")
+        naive = dates.tz_localize(None) if dates.tz is not None else dates
+        periods = naive.to_period(SCHEDULES[schedule]).asi8
+        changes = np.flatnonzero(np.diff(periods)) + 1
+        return np.concatenate(([0], changes))
+
+    wanted = pd.DatetimeIndex(schedule)
+    if dates.tz is not None and wanted.tz is None:
+        wanted = wanted.tz_localize(dates.tz)
+    positions = np.searchsorted(dates, wanted)
+    positions = positions[positions < len(dates)]
+    return np.unique(np.concatenate(([0], positions)))
+
+
+def fill_prices(prices: np.ndarray) -> np.ndarray:
+    """
+    Forward-fill gaps (holidays, halted days) and back-fill before a ticker's
+    first bar, so a missing price means "unchanged" rather than NaN
+    """
+    return pd.DataFrame(prices).ffill().bfill().to_numpy(np.float64)
+
+
+def run_backtest(prices: np.ndarray, weights: np.ndarray, rebalance_at: np.ndarray,
+                 cost_bps: float = 0.0, risk_free: float = 0.0, keep_equity: bool = True,
+                 chunk_bytes: int = 256 * 1024 * 1024) -> Dict[str, np.ndarray]:
+    """
+    Backtest many portfolios over the same prices
+
+    Args:
+        prices: dates x tickers closes with no NaNs (see fill_prices)
+        weights: portfolios x tickers target weights (rows should sum to 1)
+        rebalance_at: Row numbers from rebalance_positions
+        cost_bps: Trading cost in basis points of the value traded at each rebalance
+        risk_free: Annual risk-free rate for the Sharpe ratio
+        keep_equity: Whether to return the full dates x portfolios equity curves
+        chunk_bytes: Memory allowed for the turnover step, which needs a
+            rebalances x portfolios x tickers array
+
+    Returns:
+        Per-portfolio total_return, annual_return, volatility, sharpe,
+        max_drawdown and turnover (one-way, summed over all rebalances),
+        plus equity and drawdown curves when keep_equity is set
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    days = len(prices)
+    starts = rebalance_at
+    ends = np.append(rebalance_at[1:], days - 1)
+
+    # Which rebalance each day belongs to, and price growth since that rebalance
+    period_of_day = np.searchsorted(starts, np.arange(days), side="right") - 1
+    growth = prices / prices[starts[period_of_day]]
+
+    # Value of each portfolio relative to its last rebalance: days x portfolios
+    relative = growth @ weights.T
+
+    # Price growth over each whole period: rebalances x tickers
+    period_prices = prices[ends] / prices[starts]
+
+    # Weights drift between rebalances; turnover is how far they moved back
+    # at each rebalance after the first
+    turnover = np.zeros((len(starts), len(weights)))
+    end_growth = period_prices[:-1]
+    if len(end_growth):
+        chunk = max(1, chunk_bytes // (8 * end_growth.size))
+        for first in range(0, len(weights), chunk):
+            w = weights[first:first + chunk]          # chunk x tickers
+            drifted = w[None, :, :] * end_growth[:, None, :]
+            drifted /= drifted.sum(axis=2, keepdims=True)
+            turnover[1:, first:first + chunk] = 0.5 * np.abs(drifted - w[None, :, :]).sum(axis=2)
+
+    # Portfolio value at each rebalance (after costs), then every day from it
+    period_growth = period_prices @ weights.T         # rebalances x portfolios
+    costs = 1 - cost_bps / 10_000 * 2 * turnover      # two-way value traded
+    value_at_start = np.cumprod(np.vstack([np.ones((1, len(weights))),
+                                           period_growth[:-1] * costs[1:]]), axis=0)
+    equity = value_at_start[period_of_day] * relative
+
+    daily = equity[1:] / equity[:-1] - 1
+    excess = daily - risk_free / TRADING_DAYS
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = excess.mean(axis=0) / daily.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+    years = max(days - 1, 1) / TRADING_DAYS
+
+    out = {
+        "total_return": equity[-1] - 1,
+        "annual_return": equity[-1] ** (1 / years) - 1,
+        "volatility": daily.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS),
+        "sharpe": sharpe,
+        "max_drawdown": drawdown.min(axis=0),
+        "turnover": turnover.sum(axis=0),
+    }
+    if keep_equity:
+        out["equity"] = equity
+        out["drawdown"] = drawdown
+    return out
+
+
+def weight_matrix(weights, tickers: List[str]) -> np.ndarray:
+    """
+    Turn the ways weights can be given into a portfolios x tickers array
+
+    Args:
+        weights: None (equal weights), {ticker: weight}, a list of such
+            dicts, a DataFrame with ticker columns, or an array whose columns
+            follow tickers
+        tickers: Column order of the price matrix
+
+    Returns:
+        Weights with each row scaled to sum to 1
+    """
+    if weights is None:
+        matrix = np.ones((1, len(tickers)))
+    elif isinstance(weights, dict):
+        matrix = np.array([[weights.get(t, 0.0) for t in tickers]], dtype=np.float64)
+    elif isinstance(weights, list) and weights and isinstance(weights[0], dict):
+        matrix = np.array([[w.get(t, 0.0) for t in tickers] for w in weights], dtype=np.float64)
+    elif isinstance(weights, pd.DataFrame):
+        matrix = weights.reindex(columns=tickers, fill_value=0.0).to_numpy(np.float64)
+    else:
+        matrix = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+
+    totals = matrix.sum(axis=1, keepdims=True)
+    if np.any(totals <= 0):
+        raise ValueError("Each portfolio needs a positive total weight")
+    return matrix / totals
+
+
+def random_weights(count: int, tickers: List[str], seed: int = 0) -> np.ndarray:
+    """Random long-only portfolios (uniform over all weightings) for sweeps"""
+    return np.random.default_rng(seed).dirichlet(np.ones(len(tickers)), size=count)
+
+
+def backtest(data: pd.DataFrame, weights=None, schedule: Union[str, List] = "monthly",
+             cost_bps: float = 0.0, risk_free: float = 0.0, keep_equity: bool = True) -> Dict:
+    """
+    Backtest portfolios on rows from combine_stock_data
+
+    Args:
+        data: Rows with Date, Ticker and Close
+        weights: See weight_matrix
+        schedule: See rebalance_positions
+        cost_bps: Trading cost in basis points
+        risk_free: Annual risk-free rate for the Sharpe ratio
+        keep_equity: Whether to keep the daily equity curves
+
+    Returns:
+        run_backtest's results plus "tickers", "weights", "dates",
+        "rebalance_dates" and a "metrics" DataFrame (one row per portfolio)
+    """
+    if data.empty:
+        return {}
+
+    dates, tickers, prices = price_matrix(data)
+    matrix = weight_matrix(weights, tickers)
+    rebalance_at = rebalance_positions(dates, schedule)
+    results = run_backtest(fill_prices(prices), matrix, rebalance_at,
+                           cost_bps=cost_bps, risk_free=risk_free, keep_equity=keep_equity)
+
+    metric_names = ["total_return", "annual_return", "volatility", "sharpe", "max_drawdown", "turnover"]
+    results["metrics"] = pd.DataFrame({name: results[name] for name in metric_names})
+    results["tickers"] = tickers
+    results["weights"] = matrix
+    results["dates"] = dates
+    results["rebalance_dates"] = dates[rebalance_at]
+    return results
+
+
+def sweep(data: pd.DataFrame, count: int = 1000, schedule: Union[str, List] = "monthly",
+          cost_bps: float = 0.0, seed: int = 0, top: int = 10) -> pd.DataFrame:
+    """
+    Backtest many random long-only portfolios and keep the best
+
+    Args:
+        data: Rows with Date, Ticker and Close
+        count: How many random weight vectors to try
+        schedule: See rebalance_positions
+        cost_bps: Trading cost in basis points
+        seed: Random seed, so a sweep can be repeated
+        top: How many portfolios to return
+
+    Returns:
+        The `top` portfolios by Sharpe ratio: their metrics followed by one
+        weight column per ticker
+    """
+    if data.empty:
+        return pd.DataFrame()
+
+    tickers = list(pd.unique(data["Ticker"]))
+    results = backtest(data, random_weights(count, tickers, seed), schedule,
+                       cost_bps=cost_bps, keep_equity=False)
+    weights = pd.DataFrame(results["weights"], columns=results["tickers"]).round(3)
+    table = pd.concat([results["metrics"], weights], axis=1)
+    return table.sort_values("sharpe", ascending=False).head(top).reset_index(drop=True)
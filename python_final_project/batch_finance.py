@@ -0,0 +1,353 @@
+"""
+Batch finance runner
+Runs many finance analyses from a job file without any prompts, e.g. for
+nightly watchlist reports from cron.
+
+Run with:
+    python batch_finance.py nightly.json
+    python batch_finance.py nightly.json --workers 8 --report run_report.json
+
+Job file (JSON):
+    {
+      "defaults": {"start": "2024-01-01", "end": "2024-12-31", "interval": "1d",
+                   "output_dir": "./nightly", "outputs": ["csv", "summary"]},
+      "jobs": [
+        {"name": "tech", "tickers": ["AAPL", "MSFT", "NVDA"]},
+        {"name": "banks", "tickers": ["JPM", "BAC"], "start": "2023-01-01",
+         "outputs": ["csv", "chart", "indicators", "returns", "backtest"],
+         "benchmark": "SPY", "backtest": {"schedule": "quarterly", "cost_bps": 5}}
+      ]
+    }
+
+Every job's settings fall back to "defaults". Outputs can be csv, chart,
+summary, indicators, returns and backtest. Tickers are put in Yahoo's
+spelling with the symbol index, and a job file with text that can't be a
+symbol is refused. Well-formed symbols the index doesn't list are still
+fetched; likely typos among them are printed before anything is
+downloaded, and if they fail the report suggests close matches.
+Prices are fetched once up front, one download per ticker and bar size
+the price cache keeps (daily bars serve 1d, 1wk and 1mo jobs), covering
+every job's dates. The jobs then run in parallel on the shared price
+cache. A JSON run report with per-stage timings and the number of actual
+downloads is written at the end.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from finance_analysis import StockDataAnalyzer
+from price_cache import FAILED_FETCHES, INTERVALS, PRICE_CACHE, source_interval
+from symbols import get_symbol_index, well_formed
+
+OUTPUTS = ["csv", "chart", "summary", "indicators", "returns", "backtest"]
+
+DEFAULTS = {
+    "interval": "1d",
+    "output_dir": ".",
+    "outputs": ["csv", "summary"],
+}
+
+# pyplot keeps global state, so charts are drawn one at a time
+_chart_lock = threading.Lock()
+
+
+def load_job_file(path: str) -> List[Dict]:
+    """
+    Read a job file and fill in each job from the defaults
+
+    Args:
+        path: JSON job file (see the module docstring)
+
+    Returns:
+        One settings dictionary per job, with tickers in the symbol index's
+        spelling, the ones it doesn't list also named in "unlisted_tickers"
+        and close listed symbols for likely typos in "possible_typos"
+
+    Raises:
+        ValueError: If a job is missing something it needs, has tickers
+            that can't be symbols, or asks for an unknown output or interval
+    """
+    with open(path) as f:
+        spec = json.load(f)
+
+    defaults = dict(DEFAULTS, **spec.get("defaults", {}))
+    index = get_symbol_index()
+    jobs = []
+    for number, raw in enumerate(spec.get("jobs", []), start=1):
+        job = dict(defaults, **raw)
+        job.setdefault("name", f"job{number}")
+        for key in ("tickers", "start", "end"):
+            if not job.get(key):
+                raise ValueError(f"Job {job['name']} has no {key}")
+        unknown = [output for output in job["outputs"] if output not in OUTPUTS]
+        if unknown:
+            raise ValueError(f"Job {job['name']} asks for unknown outputs: {unknown}")
+        if job["interval"] not in INTERVALS:
+            raise ValueError(f"Job {job['name']} has an unsupported interval: {job['interval']}")
+        job["tickers"], job["unlisted_tickers"], invalid = index.validate(job["tickers"])
+        if invalid:
+            raise ValueError(f"Job {job['name']} has tickers that aren't symbols: {invalid}")
+        job["possible_typos"] = index.typos(job["unlisted_tickers"])
+        if job.get("benchmark"):
+            job["benchmark"] = index.resolve(job["benchmark"]) or job["benchmark"].strip().upper()
+            if not well_formed(job["benchmark"]):
+                raise ValueError(f"Job {job['name']} has a benchmark that isn't a symbol: {job['benchmark']}")
+        jobs.append(job)
+
+    names = [job["name"] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Job names must be unique (they name the output files)")
+    return jobs
+
+
+def job_tickers(job: Dict) -> List[str]:
+    """Every ticker a job needs, including its benchmark, without duplicates"""
+    tickers = list(job["tickers"])
+    if "returns" in job["outputs"] and job.get("benchmark"):
+        tickers.append(job["benchmark"])
+    return list(dict.fromkeys(tickers))
+
+
+def plan_fetches(jobs: List[Dict]) -> Tuple[List[Tuple[str, str, str, str]], int]:
+    """
+    Work out the downloads that cover every job
+
+    The price cache keeps bars at source_interval (daily bars for 1d, 1wk
+    and 1mo jobs alike), so requests are grouped the same way and each
+    group is fetched as one span from its earliest start to its latest
+    end. The jobs' own intervals are then resampled from those bars.
+
+    Returns:
+        ([(ticker, start, end, source interval), ...], how many
+        ticker/range requests the jobs make before grouping)
+    """
+    spans: Dict[Tuple[str, str], Tuple[pd.Timestamp, pd.Timestamp]] = {}
+    requests = 0
+    for job in jobs:
+        job_start, job_end = pd.Timestamp(job["start"]), pd.Timestamp(job["end"])
+        source = source_interval(job["interval"], job_start)
+        for ticker in job_tickers(job):
+            start, end = spans.get((ticker, source), (job_start, job_end))
+            spans[(ticker, source)] = (min(start, job_start), max(end, job_end))
+            requests += 1
+
+    fetches = [(ticker, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"), source)
+               for (ticker, source), (start, end) in spans.items()]
+    return fetches, requests
+
+
+def prefetch(fetches: List[Tuple[str, str, str, str]], workers: int) -> Dict:
+    """
+    Download everything up front into the shared price cache
+
+    Args:
+        fetches: From plan_fetches
+        workers: Downloads run at the same time
+
+    Returns:
+        Timings, how many downloads actually happened (cache misses) and
+        which fetches failed (with their reason codes)
+    """
+    def fetch(ticker, start, end, interval):
+        analyzer = StockDataAnalyzer()
+        began = time.perf_counter()
+        ok = analyzer.fetch_stock_data(ticker, start, end, interval) is not None
+        return ticker, ok, analyzer.failure_reasons.get(ticker), time.perf_counter() - began
+
+    began = time.perf_counter()
+    misses = PRICE_CACHE.misses
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-fetch") as pool:
+        results = list(pool.map(lambda args: fetch(*args), fetches))
+
+    return {
+        "planned": len(fetches),
+        "downloads": PRICE_CACHE.misses - misses,
+        "seconds": round(time.perf_counter() - began, 3),
+        "slowest_seconds": round(max((r[3] for r in results), default=0.0), 3),
+        "failed": {ticker: reason for ticker, ok, reason, _ in results if not ok},
+    }
+
+
+def to_json(value):
+    """Make analysis results JSON-friendly (DataFrames become records, numbers plain floats)"""
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient="index", date_format="iso"))
+    if isinstance(value, dict):
+        return {str(k): to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    return value
+
+
+def run_job(job: Dict, run_stamp: str) -> Dict:
+    """
+    Run one job from the (already filled) price cache
+
+    Args:
+        job: Settings from load_job_file
+        run_stamp: Shared timestamp added to every output file name
+
+    Returns:
+        The job's part of the run report
+    """
+    report = {"name": job["name"], "status": "ok", "timings": {}, "outputs": {},
+              "unlisted_tickers": job.get("unlisted_tickers", []),
+              "possible_typos": job.get("possible_typos", {})}
+    began = time.perf_counter()
+
+    def timed(stage, func, *args, **kwargs):
+        stage_began = time.perf_counter()
+        value = func(*args, **kwargs)
+        report["timings"][stage] = round(time.perf_counter() - stage_began, 3)
+        return value
+
+    try:
+        analyzer = StockDataAnalyzer()
+        tickers = job_tickers(job)
+        os.makedirs(job["output_dir"], exist_ok=True)
+        data = timed("combine", analyzer.combine_stock_data, tickers, job["start"], job["end"], job["interval"])
+        report["failed_tickers"] = {t: analyzer.failure_reasons.get(t, "error") for t in analyzer.failed_tickers}
+        suggestions = get_symbol_index().hints(analyzer.failed_tickers)
+        if suggestions:
+            report["did_you_mean"] = suggestions
+        report["records"] = len(data)
+        if data.empty:
+            raise ValueError("No valid data was fetched for any ticker.")
+
+        outputs, base = job["outputs"], f"{job['name']}_{run_stamp}"
+        if "csv" in outputs:
+            report["outputs"]["csv"] = timed("csv", analyzer.save_data_to_csv, data, job["output_dir"], f"{base}.csv")
+        if "chart" in outputs:
+            with _chart_lock:
+                report["outputs"]["chart"] = timed("chart", analyzer.create_stock_chart,
+                                                   data, job["output_dir"], f"{base}.png")
+        if "summary" in outputs:
+            report["outputs"]["summary"] = to_json(timed("summary", analyzer.generate_summary_report, data))
+        if "indicators" in outputs:
+            report["outputs"]["indicators"] = to_json(timed("indicators", analyzer.generate_indicator_report, data))
+        if "returns" in outputs:
+            returns = timed("returns", analyzer.analyze_returns, data, job.get("benchmark"))
+            report["outputs"]["returns"] = {
+                "benchmark": returns.get("benchmark"),
+                "per_ticker": to_json(returns.get("per_ticker")),
+                "correlation": to_json(returns.get("correlation")),
+            }
+        if "backtest" in outputs:
+            options = job.get("backtest", {})
+            portfolio = data[data["Ticker"].isin(job["tickers"])]
+            results = timed("backtest", analyzer.backtest_portfolio, portfolio, options.get("weights"),
+                            options.get("schedule", "monthly"), options.get("cost_bps", 0.0))
+            if results:
+                report["outputs"]["backtest"] = to_json(results["metrics"].iloc[0].to_dict())
+    except Exception as e:
+        report["status"] = "failed"
+        report["error"] = str(e)
+
+    report["seconds"] = round(time.perf_counter() - began, 3)
+    return report
+
+
+def run_batch(jobs: List[Dict], workers: int = 4, retry_failed: bool = False) -> Dict:
+    """
+    Prefetch for every job, then run the jobs in parallel
+
+    Args:
+        jobs: From load_job_file
+        workers: Downloads and jobs run at the same time
+        retry_failed: Forget remembered failures first, so every ticker is really tried
+
+    Returns:
+        The run report
+    """
+    started = datetime.now()
+    run_stamp = started.strftime("%Y%m%d_%H%M%S")
+    began = time.perf_counter()
+
+    fetches, requests = plan_fetches(jobs)
+    if retry_failed:
+        FAILED_FETCHES.forget(list({ticker for ticker, *_ in fetches}))
+    # A big batch plans more ranges than the cache normally keeps; without
+    # room for all of them, early prefetches are evicted before their jobs run
+    max_entries = PRICE_CACHE.make_room(len(fetches))
+    try:
+        fetch_report = prefetch(fetches, workers)
+        fetch_report["requests"] = requests
+
+        misses = PRICE_CACHE.misses
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-job") as pool:
+            job_reports = list(pool.map(lambda job: run_job(job, run_stamp), jobs))
+        # Anything the prefetch didn't cover (ideally nothing)
+        fetch_report["job_downloads"] = PRICE_CACHE.misses - misses
+    finally:
+        PRICE_CACHE.max_entries = max_entries
+
+    return {
+        "started": started.isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - began, 3),
+        "jobs_ok": sum(report["status"] == "ok" for report in job_reports),
+        "jobs_failed": sum(report["status"] != "ok" for report in job_reports),
+        "fetch": fetch_report,
+        "jobs": job_reports,
+    }
+
+
+def write_report(report: Dict, path: str) -> str:
+    """Write the run report atomically, so a reader never sees half of it"""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    os.replace(temp_path, path)
+    return path
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Run finance analyses from a job file")
+    parser.add_argument("job_file", help="JSON job file")
+    parser.add_argument("--workers", type=int, default=4, help="Downloads and jobs run at the same time")
+    parser.add_argument("--report", default="",
+                        help="Run report path (default <first job's output_dir>/run_report_<time>.json)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Try tickers again even if they failed recently")
+    args = parser.parse_args()
+
+    try:
+        jobs = load_job_file(args.job_file)
+    except (OSError, ValueError) as e:
+        print(f"Invalid job file: {e}")
+        sys.exit(2)
+    for job in jobs:
+        for ticker, close in job["possible_typos"].items():
+            print(f"  {job['name']}: {ticker} isn't in the symbol list, did you mean "
+                  f"{', '.join(close)}? Fetching it as typed.")
+
+    report = run_batch(jobs, workers=args.workers, retry_failed=args.retry_failed)
+    path = args.report or os.path.join(jobs[0]["output_dir"] if jobs else ".",
+                                       f"run_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    write_report(report, path)
+
+    fetch = report["fetch"]
+    print(f"{report['jobs_ok']} jobs ok, {report['jobs_failed']} failed in {report['seconds']}s "
+          f"({fetch['requests']} ticker requests, {fetch['downloads'] + fetch['job_downloads']} downloads)")
+    for job in report["jobs"]:
+        if job["status"] != "ok":
+            print(f"  {job['name']}: {job['error']}")
+    print(f"Run report saved to: {path}")
+    sys.exit(1 if report["jobs_failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,711 @@
+"""
+Benchmarks for the chat and finance hot paths
+Everything runs offline: the LLM and Yahoo Finance are replaced by
+stand-ins that return synthetic data
+
+Run with:
+    python benchmarks.py                         # everything, saved to bench_results/
+    python benchmarks.py --quick --only memory,prompt
+    python benchmarks.py --compare bench_results/old.json
+    python benchmarks.py --only imports          # start-up import time report
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LLM_CHAT_PATH = os.path.join(HERE, "..", "Process code", "LLM-chat.py")
+
+
+def time_call(func: Callable, repeat: int, setup: Callable = None) -> Dict:
+    """
+    Time a function several times
+
+    Args:
+        func: What to time
+        repeat: How many timed runs
+        setup: Optional untimed function run before each timed run
+
+    Returns:
+        Min/median/mean seconds over the runs
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.mean(timings),
+    }
+
+
+def result(group: str, name: str, params: Dict, timing: Dict) -> Dict:
+    """One row of the results file"""
+    return {"group": group, "name": name, "params": params, **timing}
+
+
+# --- Stand-ins ---
+
+def synthetic_prices(ticker: str, start: str, end: str, seed: int):
+    """
+    Build a frame shaped like StockDataAnalyzer.fetch_stock_data output
+
+    Args:
+        ticker: Symbol to label the rows with
+        start: First date (YYYY-MM-DD)
+        end: Last date (YYYY-MM-DD)
+        seed: Random seed so every run sees the same prices
+
+    Returns:
+        Daily OHLCV rows with Date and Ticker columns
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, end, tz="America/New_York", name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+    spread = np.abs(rng.normal(0, 0.01, len(dates))) * close
+    data = pd.DataFrame({
+        "Open": close + rng.normal(0, 0.5, len(dates)),
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": rng.integers(1_000_000, 50_000_000, len(dates)),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=dates)
+    data["Ticker"] = ticker
+    data.reset_index(inplace=True)
+    return data
+
+
+def make_synthetic_analyzer():
+    """StockDataAnalyzer whose downloads are replaced with synthetic prices"""
+    from finance_analysis import StockDataAnalyzer
+
+    class SyntheticAnalyzer(StockDataAnalyzer):
+        def _fetch(self, ticker, start_time, end_time, interval, copy, force_retry=False):
+            return synthetic_prices(ticker, start_time, end_time, seed=zlib.crc32(ticker.encode()))
+
+    return SyntheticAnalyzer()
+
+
+def make_cached_synthetic_analyzer():
+    """StockDataAnalyzer that keeps the real price cache but downloads synthetic prices"""
+    from finance_analysis import StockDataAnalyzer
+
+    class CachedSyntheticAnalyzer(StockDataAnalyzer):
+        def download_bars(self, ticker, start_time, end_time, interval):
+            return synthetic_prices(ticker, start_time, end_time, seed=zlib.crc32(ticker.encode()))
+
+    return CachedSyntheticAnalyzer()
+
+
+def peak_memory(func: Callable) -> int:
+    """Bytes allocated at the high point of one call (numpy and pandas report to tracemalloc)"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def make_tickers(count: int) -> List[str]:
+    """Fake but stable ticker symbols"""
+    return [f"T{i:04d}" for i in range(count)]
+
+
+def load_llm_chat():
+    """Import Process code/LLM-chat.py (the dash in its name rules out a normal import)"""
+    spec = importlib.util.spec_from_file_location("llm_chat", LLM_CHAT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeStreamClient:
+    """Mimics client.chat.completions.create(stream=True) with canned chunks"""
+
+    def __init__(self, chunk_count: int):
+        words = ["Hello", " there,", " here", " is", " a", " line", " of", " text.\n\n"]
+        self.chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=words[i % len(words)]))])
+            for i in range(chunk_count)
+        ]
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        return iter(self.chunks)
+
+
+# --- Benchmarks ---
+
+def bench_memory(quick: bool) -> List[Dict]:
+    """Memory.add_message and get_recent_messages at several history sizes"""
+    from chatbot_logic import Memory
+
+    rows = []
+    sizes = [10, 1_000] if quick else [10, 1_000, 10_000, 100_000]
+    for size in sizes:
+        def fill():
+            memory = Memory()
+            for i in range(size):
+                memory.add_message("user" if i % 2 == 0 else "assistant",
+                                   f"message {i} about stocks, weather and homework")
+            return memory
+
+        timing = time_call(fill, repeat=3)
+        timing["per_message_us"] = timing["median_s"] / size * 1e6
+        rows.append(result("memory", "add_message", {"history": size}, timing))
+
+        memory = fill()
+        rows.append(result("memory", "get_recent_messages", {"history": size},
+                           time_call(memory.get_recent_messages, repeat=200)))
+        rows.append(result("memory", "get_relevant_messages", {"history": size},
+                           time_call(lambda: memory.get_relevant_messages("homework about weather"),
+                                     repeat=200)))
+    return rows
+
+
+def bench_prompt(quick: bool) -> List[Dict]:
+    """_create_prompt for each personality with a full memory"""
+    from chatbot_logic import Chatbot, FriendlyBot, TeacherBot, FunnyBot
+
+    bots = {
+        "Chatbot": Chatbot("Base"),
+        "FriendlyBot": FriendlyBot("Joy"),
+        "TeacherBot": TeacherBot("Professor Albert", "Quantum Mechanics"),
+        "FunnyBot": FunnyBot("Comedy"),
+    }
+    history = 100 if quick else 5_000
+    rows = []
+    for name, bot in bots.items():
+        for i in range(history):
+            bot.memory.add_message("user" if i % 2 == 0 else "assistant",
+                                   f"turn {i}: tell me about topic {i % 37}")
+        rows.append(result("prompt", "_create_prompt", {"personality": name, "history": history},
+                           time_call(lambda: bot._create_prompt("what about topic 12?"), repeat=500)))
+    return rows
+
+
+def bench_streaming(quick: bool) -> List[Dict]:
+    """Chunk processing loop in LLM_Chat.generate_response"""
+    llm_chat = load_llm_chat()
+    rows = []
+    for chunk_count in ([100] if quick else [100, 1_000, 5_000]):
+        llm = llm_chat.LLM_Chat()
+        llm.client = FakeStreamClient(chunk_count)
+
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                llm.generate_response([{"role": "system", "content": "hint"},
+                                       {"role": "user", "content": "hi"}])
+
+        rows.append(result("streaming", "LLM_Chat.generate_response", {"chunks": chunk_count},
+                           time_call(run, repeat=5 if quick else 20)))
+    return rows
+
+
+def bench_finance(quick: bool) -> List[Dict]:
+    """combine_stock_data, summaries, indicators, returns, backtests and create_stock_chart"""
+    import tempfile
+    import matplotlib
+    matplotlib.use("Agg")
+    import pandas as pd
+    from backtest import backtest, random_weights
+    from indicators import IncrementalIndicators, compute_indicators
+
+    analyzer = make_synthetic_analyzer()
+    rows = []
+    universes = [10, 100] if quick else [10, 100, 1_000]
+    with tempfile.TemporaryDirectory() as out_dir:
+        for count in universes:
+            tickers = make_tickers(count)
+            params = {"tickers": count, "range": "2021-01-01..2023-12-31"}
+            rows.append(result("finance", "combine_stock_data", params, time_call(
+                lambda: analyzer.combine_stock_data(tickers, "2021-01-01", "2023-12-31"), repeat=3)))
+
+            data = analyzer.combine_stock_data(tickers, "2021-01-01", "2023-12-31")
+            rows.append(result("finance", "generate_summary_report", params, time_call(
+                lambda: analyzer.generate_summary_report(data), repeat=3)))
+            store_path = os.path.join(out_dir, f"store_{count}")
+            rows.append(result("finance", "store_stock_data", params, time_call(
+                lambda: analyzer.store_stock_data(tickers, "2021-01-01", "2023-12-31", store_path),
+                repeat=1)))
+            store = analyzer.store_stock_data(tickers, "2021-01-01", "2023-12-31", store_path)
+            rows.append(result("finance", "generate_summary_report (price store)", params, time_call(
+                lambda: analyzer.generate_summary_report(store), repeat=3)))
+            rows.append(result("finance", "compute_indicators", params, time_call(
+                lambda: compute_indicators(data), repeat=3)))
+            analyzer.calculate_indicators(data)
+            rows.append(result("finance", "calculate_indicators (cached)", params, time_call(
+                lambda: analyzer.calculate_indicators(data), repeat=3)))
+
+            # Daily refresh: history already folded in, a few new bars arrive
+            dates = data["Date"].sort_values().unique()
+            history, new_bars = data[data["Date"] < dates[-5]], data[data["Date"] >= dates[-5]]
+            tracker = {}
+            def seed():
+                tracker["state"] = IncrementalIndicators()
+                tracker["state"].update(history)
+            rows.append(result("finance", "IncrementalIndicators.update (5 new bars)", params, time_call(
+                lambda: tracker["state"].update(new_bars), repeat=3, setup=seed)))
+            rows.append(result("finance", "analyze_returns", params, time_call(
+                lambda: analyzer.analyze_returns(data, tickers[0]), repeat=3)))
+            weights = random_weights(1_000, list(pd.unique(data["Ticker"])))
+            rows.append(result("finance", "backtest (1,000 portfolios, monthly)", params, time_call(
+                lambda: backtest(data, weights, "monthly", keep_equity=False), repeat=3)))
+            rows.append(result("finance", "create_stock_chart", params, time_call(
+                lambda: analyzer.create_stock_chart(data, out_dir, "bench_chart.png"),
+                repeat=1 if count >= 1_000 or quick else 3)))
+    return rows
+
+
+# What each start-up path imports, measured in a fresh interpreter each time
+IMPORT_PATHS = {
+    "chat (chatbot_logic)": "import chatbot_logic",
+    "app chat first paint (streamlit + chatbot_logic)": "import streamlit, chatbot_logic",
+    "LLM-chat.py": ("import importlib.util; spec = importlib.util.spec_from_file_location("
+                    f"'llm_chat', {LLM_CHAT_PATH!r}); spec.loader.exec_module("
+                    "importlib.util.module_from_spec(spec))"),
+    "finance mode (finance_analysis)": "import finance_analysis",
+    "finance chart (matplotlib.pyplot)": "import finance_analysis, matplotlib.pyplot",
+    "finance fetch (yfinance)": "import finance_analysis, yfinance",
+}
+
+# Chat-only use should be on screen within a second
+FIRST_PAINT_TARGET_S = 1.0
+
+
+def bench_imports(quick: bool) -> List[Dict]:
+    """Cold import time of each start-up path"""
+    rows = []
+    for name, statement in IMPORT_PATHS.items():
+        code = ("import sys, time; sys.path.insert(0, sys.argv[1]); "
+                f"start = time.perf_counter(); {statement}; "
+                "print(time.perf_counter() - start)")
+        timings = []
+        for _ in range(1 if quick else 3):
+            run = subprocess.run([sys.executable, "-c", code, HERE],
+                                 capture_output=True, text=True)
+            if run.returncode != 0:
+                print(f"  {name}: failed ({run.stderr.strip().splitlines()[-1]})")
+                break
+            timings.append(float(run.stdout.strip().splitlines()[-1]))
+        if timings:
+            rows.append(result("imports", name, {}, {
+                "repeat": len(timings),
+                "min_s": min(timings),
+                "median_s": statistics.median(timings),
+                "mean_s": statistics.mean(timings),
+            }))
+
+    for row in rows:
+        if "first paint" in row["name"]:
+            verdict = "OK" if row["median_s"] < FIRST_PAINT_TARGET_S else "OVER TARGET"
+            print(f"  First paint imports: {row['median_s']:.3f} s "
+                  f"(target {FIRST_PAINT_TARGET_S:.1f} s) {verdict}")
+    return rows
+
+
+def bench_assembly(quick: bool) -> List[Dict]:
+    """combine_stock_data from cached bars: old copy-then-concat path vs assemble_stock_data"""
+    analyzer = make_cached_synthetic_analyzer()
+    rows = []
+    for count in ([100, 300] if quick else [100, 1_000]):
+        tickers = make_tickers(count)
+        # Fill the price cache first so only assembly is measured
+        analyzer.combine_stock_data(tickers, "2021-01-01", "2023-12-31")
+        for method in ("concat", "assemble"):
+            run = lambda: analyzer.combine_stock_data(tickers, "2021-01-01", "2023-12-31", method=method)
+            params = {"tickers": count, "method": method}
+            timing = time_call(run, repeat=3)
+            timing["peak_mb"] = peak_memory(run) / 1e6
+            rows.append(result("assembly", "combine_stock_data", params, timing))
+            print(f"    {method}: peak {timing['peak_mb']:.1f} MB")
+    return rows
+
+
+def bench_csv_export(quick: bool) -> List[Dict]:
+    """CSV export: combine everything then save_data_to_csv vs export_stock_data_csv"""
+    import shutil
+    import tempfile
+
+    analyzer = make_cached_synthetic_analyzer()
+    rows = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for count in ([50, 200] if quick else [200, 1_000]):
+            tickers = make_tickers(count)
+            # Fill the price cache first so only the export is measured
+            analyzer.combine_stock_data(tickers, "2021-01-01", "2023-12-31")
+            first_write = {}
+
+            def combine_then_save():
+                start = time.perf_counter()
+                data = analyzer.combine_stock_data(tickers, "2021-01-01", "2023-12-31")
+                # Nothing reaches the file until every ticker is combined
+                first_write["combine_then_save"] = time.perf_counter() - start
+                analyzer.save_data_to_csv(data, out_dir, "combined.csv")
+
+            def streamed(partition=False):
+                export = analyzer.export_stock_data_csv(tickers, "2021-01-01", "2023-12-31", out_dir,
+                                                        filename="partitioned" if partition else "streamed.csv",
+                                                        partition=partition)
+                first_write["partitioned" if partition else "streamed"] = export["first_write_seconds"]
+                if partition:
+                    shutil.rmtree(export["csv_path"])
+
+            for name, run in [("combine_then_save", combine_then_save), ("streamed", streamed),
+                              ("partitioned", lambda: streamed(partition=True))]:
+                timing = time_call(run, repeat=1 if quick else 3)
+                timing["first_write_s"] = first_write[name]
+                timing["peak_mb"] = peak_memory(run) / 1e6
+                rows.append(result("csv_export", name, {"tickers": count}, timing))
+                print(f"    {name}: first rows after {timing['first_write_s']:.3f}s, "
+                      f"peak {timing['peak_mb']:.1f} MB")
+    return rows
+
+
+def bench_symbols(quick: bool) -> List[Dict]:
+    """Loading the local symbol index and validating typed tickers against it"""
+    from symbols import SymbolIndex
+
+    index = SymbolIndex.load()
+    lookups = (index.symbols * 10)[:10_000]
+    typed = ["AAPL", "BRK.B", "^GSPC", "APPL", "MSFTT", "GOOGLE", "hello world"]
+    unlisted = index.validate(typed)[1]
+    params = {"symbols": len(index)}
+    return [
+        result("symbols", "SymbolIndex.load", params, time_call(SymbolIndex.load, repeat=3 if quick else 10)),
+        result("symbols", "membership (10,000 lookups)", params,
+               time_call(lambda: [symbol in index for symbol in lookups], repeat=3 if quick else 10)),
+        result("symbols", "validate", {**params, "typed": typed},
+               time_call(lambda: index.validate(typed), repeat=3 if quick else 10)),
+        result("symbols", "typo check before fetching", {**params, "unlisted": unlisted},
+               time_call(lambda: index.typos(unlisted), repeat=3 if quick else 10)),
+        result("symbols", "suggestions for failed symbols", {**params, "typed": typed},
+               time_call(lambda: index.hints(typed), repeat=3 if quick else 10)),
+    ]
+
+
+def bench_failures(quick: bool) -> List[Dict]:
+    """Fetching a symbol with no data: a real (simulated 200 ms) attempt vs the negative cache"""
+    from finance_analysis import StockDataAnalyzer
+    from price_cache import FAILED_FETCHES
+
+    class FailingAnalyzer(StockDataAnalyzer):
+        def download_bars(self, ticker, start_time, end_time, interval):
+            time.sleep(0.2)  # roughly one Yahoo round trip
+            return None
+
+    analyzer = FailingAnalyzer()
+    fetch = lambda **kwargs: analyzer.fetch_stock_data("NOSUCH", "2023-01-01", "2023-12-31", **kwargs)
+    params = {"download_latency_s": 0.2}
+    rows = [result("failures", "failed fetch (force_retry)", params,
+                   time_call(lambda: fetch(force_retry=True), repeat=3))]
+    rows.append(result("failures", "failed fetch (negative cache hit)", params,
+                       time_call(fetch, repeat=100 if quick else 1000)))
+    FAILED_FETCHES.forget(["NOSUCH"])
+    return rows
+
+
+def bench_batch(quick: bool) -> List[Dict]:
+    """
+    A batch with more planned ranges than the price cache normally keeps
+
+    Also a check: every range must be downloaded exactly once, by the
+    prefetch, and none again inside the jobs (raises otherwise)
+    """
+    import tempfile
+    import threading
+
+    import batch_finance
+    from finance_analysis import StockDataAnalyzer
+    from price_cache import PRICE_CACHE
+
+    tickers = make_tickers(600 if quick else 1500)
+    downloads: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def download_bars(self, ticker, start_time, end_time, interval):
+        with lock:
+            downloads[ticker] = downloads.get(ticker, 0) + 1
+        return synthetic_prices(ticker, start_time, end_time, seed=zlib.crc32(ticker.encode()))
+
+    reports = []
+    original, StockDataAnalyzer.download_bars = StockDataAnalyzer.download_bars, download_bars
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            jobs = [dict(batch_finance.DEFAULTS, name=f"job{number}", tickers=tickers, start="2023-01-01",
+                         end="2024-01-01", output_dir=output_dir, outputs=["summary"])
+                    for number in range(3)]
+
+            def run():
+                PRICE_CACHE.clear()
+                downloads.clear()
+                reports.append(batch_finance.run_batch(jobs, workers=8))
+
+            timing = time_call(run, repeat=1 if quick else 3)
+    finally:
+        StockDataAnalyzer.download_bars = original
+        PRICE_CACHE.clear()
+
+    fetch = reports[-1]["fetch"]
+    repeated = {ticker: count for ticker, count in downloads.items() if count != 1}
+    if (fetch["downloads"] != fetch["planned"] or fetch["job_downloads"]
+            or repeated or len(downloads) != len(tickers)):
+        raise RuntimeError(f"Batch downloaded ranges more than once: {fetch['downloads']} prefetch "
+                           f"downloads for {fetch['planned']} ranges, {fetch['job_downloads']} more "
+                           f"inside the jobs, {len(repeated)} tickers fetched twice")
+    params = {"tickers": len(tickers), "jobs": len(jobs), "ranges": fetch["planned"],
+              "cache_max_entries": PRICE_CACHE.max_entries}
+    return [result("batch", "run_batch (one download per range)",
+                   {**params, "downloads": fetch["downloads"] + fetch["job_downloads"]}, timing)]
+
+
+def bench_router(quick: bool) -> List[Dict]:
+    """Finance router: the check every chat message pays, and a full answer from cached prices"""
+    from finance_router import FinanceRouter
+
+    router = FinanceRouter(fetch_missing=False)
+    # Put synthetic prices for the asked-about tickers in the shared price cache
+    analyzer = make_cached_synthetic_analyzer()
+    for ticker in ("AAPL", "MSFT"):
+        analyzer.fetch_stock_data(ticker, "2023-01-01", "2024-01-01")
+
+    chat = "Can you help me plan my study schedule for next week?"
+    question = "How did AAPL and MSFT do in 2023?"
+    repeat = 200 if quick else 2000
+    return [
+        result("router", "match (ordinary chat message)", {}, time_call(lambda: router.match(chat), repeat=repeat)),
+        result("router", "match (finance question)", {}, time_call(lambda: router.match(question), repeat=repeat)),
+        result("router", "route (answer from cached prices)", {"tickers": 2},
+               time_call(lambda: router.route(question), repeat=20 if quick else 200)),
+    ]
+
+
+def bench_tools(quick: bool) -> List[Dict]:
+    """Three tool calls from one model turn: one after another vs FinanceTools.run_all in parallel"""
+    from finance_analysis import StockDataAnalyzer
+    from finance_tools import FinanceTools
+    from price_cache import PRICE_CACHE
+
+    class SlowAnalyzer(StockDataAnalyzer):
+        def download_bars(self, ticker, start_time, end_time, interval):
+            time.sleep(0.2)  # roughly one Yahoo round trip
+            return synthetic_prices(ticker, start_time, end_time, seed=zlib.crc32(ticker.encode()))
+
+    tools = FinanceTools(analyzer_factory=SlowAnalyzer)
+    calls = [{"name": name, "arguments": json.dumps({"tickers": [ticker], "start": "2023-01-01",
+                                                       "end": "2024-01-01"})}
+             for name, ticker in [("get_summary", "AAPL"), ("get_indicators", "MSFT"), ("fetch_stock_data", "NVDA")]]
+    params = {"calls": len(calls), "download_latency_s": 0.2}
+    repeat = 3 if quick else 10
+    return [
+        result("tools", "tool calls one at a time", params,
+               time_call(lambda: [tools.run(call["name"], call["arguments"]) for call in calls],
+                         repeat=repeat, setup=PRICE_CACHE.clear)),
+        result("tools", "FinanceTools.run_all (parallel)", params,
+               time_call(lambda: tools.run_all(calls), repeat=repeat, setup=PRICE_CACHE.clear)),
+        result("tools", "FinanceTools.run_all (cached prices)", params,
+               time_call(lambda: tools.run_all(calls), repeat=repeat)),
+    ]
+
+
+def bench_context(quick: bool) -> List[Dict]:
+    """
+    Finance data in a prompt: raw to_string / CSV dumps vs encode_finance_context
+    Reports estimated tokens sent and the answer latency from the mock LLM
+    server reading the prompt at a fixed prefill speed
+    """
+    import urllib.request
+    from finance_context import encode_finance_context, estimate_tokens, raw_dump
+    from mock_llm_server import MockSettings, start_mock_server
+
+    analyzer = make_cached_synthetic_analyzer()
+    tickers = ["AAPL", "MSFT", "NVDA", "AMZN", "JPM"]
+    data = analyzer.combine_stock_data(tickers, "2023-01-01", "2024-01-01")
+    indicators = analyzer.generate_indicator_report(data)
+
+    prefill = 5000.0  # prompt tokens read per second
+    server = start_mock_server(settings=MockSettings(ttft=0.05, tokens_per_sec=0, reply="OK",
+                                                     prefill_tokens_per_sec=prefill))
+    url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+
+    def ask(prompt: str) -> None:
+        body = json.dumps({"model": "mock-model", "messages": [{"role": "user", "content": prompt}]})
+        request = urllib.request.Request(url, body.encode("utf-8"), {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+    encodings = {
+        "raw to_string": lambda: raw_dump(data, "to_string"),
+        "raw csv": lambda: raw_dump(data, "csv"),
+    }
+    for budget in (200, 400, 800):
+        encodings[f"compact budget {budget}"] = lambda budget=budget: encode_finance_context(data, budget, indicators)
+
+    rows = []
+    try:
+        for name, encode in encodings.items():
+            context = encode()
+            prompt = f"{context}\n\nHow did these stocks do in 2023?"
+            params = {"tickers": len(tickers), "rows": len(data), "chars": len(context),
+                      "tokens": estimate_tokens(context), "prefill_tokens_per_s": prefill}
+            rows.append(result("context", f"encode ({name})", params, time_call(encode, repeat=3 if quick else 10)))
+            rows.append(result("context", f"answer latency ({name})", params,
+                               time_call(lambda: ask(prompt), repeat=2 if quick else 5)))
+    finally:
+        server.shutdown()
+    return rows
+
+
+def bench_chart_pool(quick: bool) -> List[Dict]:
+    """Many charts drawn one after another vs through the process pool"""
+    import matplotlib
+    matplotlib.use("Agg")
+    from chart_pool import ChartRenderPool
+
+    analyzer = make_synthetic_analyzer()
+    chart_count = 4 if quick else 16
+    data = analyzer.combine_stock_data(make_tickers(10), "2022-01-01", "2023-12-31")
+    frames = [data] * chart_count
+    params = {"charts": chart_count, "tickers_per_chart": 10, "dpi": 100}
+
+    def serial():
+        import matplotlib.pyplot as plt
+        for data in frames:
+            fig = analyzer.build_stock_chart(data)
+            fig.savefig(io.BytesIO(), format="png", dpi=100, bbox_inches="tight")
+            plt.close(fig)
+
+    pool = ChartRenderPool()
+    try:
+        # Warm the workers up so start-up isn't counted
+        pool.render(frames[0], dpi=100)
+
+        def pooled():
+            futures = [pool.submit(data, dpi=100) for data in frames]
+            for future in futures:
+                future.result()
+
+        rows = [result("chart_pool", "serial", params, time_call(serial, repeat=1 if quick else 3)),
+                result("chart_pool", "process_pool", {**params, "workers": os.cpu_count()},
+                       time_call(pooled, repeat=1 if quick else 3))]
+    finally:
+        pool.shutdown()
+    return rows
+
+
+BENCHMARKS: Dict[str, Callable[[bool], List[Dict]]] = {
+    "memory": bench_memory,
+    "prompt": bench_prompt,
+    "streaming": bench_streaming,
+    "finance": bench_finance,
+    "chart_pool": bench_chart_pool,
+    "imports": bench_imports,
+    "assembly": bench_assembly,
+    "csv_export": bench_csv_export,
+    "symbols": bench_symbols,
+    "failures": bench_failures,
+    "batch": bench_batch,
+    "router": bench_router,
+    "tools": bench_tools,
+    "context": bench_context,
+}
+
+
+# --- Reporting ---
+
+def git_revision() -> str:
+    """Current commit, so results can be matched to a version"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def row_key(row: Dict) -> str:
+    """Identify the same measurement across two result files"""
+    return f"{row['group']}/{row['name']}/{json.dumps(row['params'], sort_keys=True)}"
+
+
+def compare(current: List[Dict], previous_path: str) -> None:
+    """Print how each measurement changed against an older results file"""
+    with open(previous_path) as f:
+        previous = {row_key(row): row for row in json.load(f)["results"]}
+
+    print(f"\nCompared with {previous_path} (median, >1.00x means slower now):")
+    for row in current:
+        old = previous.get(row_key(row))
+        if old and old["median_s"] > 0:
+            ratio = row["median_s"] / old["median_s"]
+            flag = "  <-- regression" if ratio > 1.2 else ""
+            print(f"  {row_key(row)}: {ratio:.2f}x{flag}")
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the chatbot")
+    parser.add_argument("--only", default="", help=f"Comma-separated groups: {','.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast check")
+    parser.add_argument("--output", default="", help="Results file (default bench_results/<rev>_<time>.json)")
+    parser.add_argument("--compare", default="", help="Older results file to compare against")
+    args = parser.parse_args()
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()] or list(BENCHMARKS)
+    unknown = [g for g in groups if g not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark groups: {unknown}")
+
+    rows = []
+    for group in groups:
+        print(f"Running {group} benchmarks...")
+        for row in BENCHMARKS[group](args.quick):
+            print(f"  {row['name']} {row['params']}: {row['median_s'] * 1000:.3f} ms")
+            rows.append(row)
+
+    revision = git_revision()
+    report = {
+        "revision": revision,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": rows,
+    }
+    output = args.output or os.path.join(
+        HERE, "bench_results", f"{revision}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {output}")
+
+    if args.compare:
+        compare(rows, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Chart rendering pool
+Draws stock charts in separate processes so many charts can be rendered at
+once on different cores. Price data is handed over through shared memory
+instead of being pickled.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# Set in each worker process by _init_worker
+_worker_analyzer = None
+
+
+def _init_worker() -> None:
+    """Load matplotlib once per worker so each chart doesn't pay for it"""
+    global _worker_analyzer
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401  (preload)
+    from finance_analysis import StockDataAnalyzer
+    _worker_analyzer = StockDataAnalyzer()
+
+
+def _worker_context():
+    """
+    How to start the worker processes
+
+    Forking a threaded server (Streamlit, the job runner) can copy a lock
+    another thread was holding, so the workers come from a forkserver
+    instead, or are spawned where forkserver isn't available (Windows).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _pack_frame(data: pd.DataFrame) -> Dict:
+    """
+    Copy the columns a chart needs into one shared memory block
+
+    Layout: Date as int64 nanoseconds, Close as float64, ticker codes as int32
+
+    Args:
+        data: Combined stock data with Date, Ticker and Close columns
+
+    Returns:
+        Everything a worker needs to find and read the block
+    """
+    rows = len(data)
+    dates = pd.DatetimeIndex(data["Date"])
+    codes, tickers = pd.factorize(data["Ticker"])
+
+    block = shared_memory.SharedMemory(create=True, size=max(1, rows * (8 + 8 + 4)))
+    np.ndarray(rows, dtype=np.int64, buffer=block.buf, offset=0)[:] = dates.as_unit("ns").asi8
+    np.ndarray(rows, dtype=np.float64, buffer=block.buf, offset=rows * 8)[:] = data["Close"].to_numpy(np.float64)
+    np.ndarray(rows, dtype=np.int32, buffer=block.buf, offset=rows * 16)[:] = codes
+
+    return {
+        "block": block,
+        "name": block.name,
+        "rows": rows,
+        "tickers": list(tickers),
+        "tz": str(dates.tz) if dates.tz is not None else None,
+    }
+
+
+def _unpack_frame(name: str, rows: int, tickers: list, tz: Optional[str]) -> pd.DataFrame:
+    """Rebuild the chart columns from a shared memory block (worker side)"""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        date_values = np.ndarray(rows, dtype=np.int64, buffer=block.buf, offset=0)
+        close = np.ndarray(rows, dtype=np.float64, buffer=block.buf, offset=rows * 8)
+        codes = np.ndarray(rows, dtype=np.int32, buffer=block.buf, offset=rows * 16)
+
+        dates = pd.to_datetime(date_values, utc=tz is not None)
+        if tz is not None:
+            dates = dates.tz_convert(tz)
+        # The frame takes copies, so the block can be closed straight after
+        return pd.DataFrame({
+            "Date": dates,
+            "Ticker": np.asarray(tickers, dtype=object)[codes],
+            "Close": close.copy(),
+        })
+    finally:
+        block.close()
+
+
+def _render(name: str, rows: int, tickers: list, tz: Optional[str],
+            full_path: Optional[str], dpi: int) -> Union[str, bytes]:
+    """Worker task: draw one chart and save it to a file or return PNG bytes"""
+    import matplotlib.pyplot as plt
+
+    data = _unpack_frame(name, rows, tickers, tz)
+    if not full_path:
+        return _worker_analyzer.create_stock_chart_bytes(data, dpi=dpi)
+
+    fig = _worker_analyzer.build_stock_chart(data)
+    try:
+        fig.savefig(full_path, dpi=dpi, bbox_inches="tight")
+        return full_path
+    finally:
+        plt.close(fig)
+
+
+def _render_heatmap(name: str, size: int, tickers: list, dpi: int) -> bytes:
+    """Worker task: draw a correlation heatmap from a shared float32 matrix"""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        matrix = np.ndarray((size, size), dtype=np.float32, buffer=block.buf)
+        correlation = pd.DataFrame(matrix.copy(), index=tickers, columns=tickers)
+    finally:
+        block.close()
+    return _worker_analyzer.create_correlation_heatmap_bytes(correlation, dpi=dpi)
+
+
+class ChartRenderPool:
+    """
+    Process pool for StockDataAnalyzer charts
+    """
+
+    def __init__(self, max_workers: int = None):
+        """
+        Args:
+            max_workers: Worker processes (defaults to the number of CPU cores)
+        """
+        self.executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                            mp_context=_worker_context(),
+                                            initializer=_init_worker)
+
+    def submit(self, data: pd.DataFrame, saving_path: str = None, filename: str = None,
+               dpi: int = 300) -> Future:
+        """
+        Queue a chart
+
+        Args:
+            data: Combined stock data to plot
+            saving_path: Folder to save the PNG in; leave empty to get the
+                image bytes back instead
+            filename: What to call the chart file (optional)
+            dpi: Image resolution
+
+        Returns:
+            A future that resolves to the saved file path, or to PNG bytes
+            when no saving_path was given ("" if there was nothing to plot)
+        """
+        if data.empty:
+            future = Future()
+            future.set_result("" if saving_path else b"")
+            return future
+
+        full_path = None
+        if saving_path:
+            if filename is None:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+                filename = f"stock_chart_{timestamp}.png"
+            full_path = os.path.join(saving_path, filename)
+
+        packed = _pack_frame(data)
+        future = self.executor.submit(_render, packed["name"], packed["rows"],
+                                      packed["tickers"], packed["tz"], full_path, dpi)
+        # Free the shared block once the worker has finished with it
+        block = packed["block"]
+        future.add_done_callback(lambda _: (block.close(), block.unlink()))
+        return future
+
+    def submit_heatmap(self, correlation: pd.DataFrame, dpi: int = 150) -> Future:
+        """
+        Queue a correlation heatmap
+
+        Args:
+            correlation: Square correlation DataFrame from returns_analysis
+            dpi: Image resolution
+
+        Returns:
+            A future that resolves to PNG bytes (b"" if there was nothing to plot)
+        """
+        if correlation.empty:
+            future = Future()
+            future.set_result(b"")
+            return future
+
+        size = len(correlation)
+        block = shared_memory.SharedMemory(create=True, size=size * size * 4)
+        np.ndarray((size, size), dtype=np.float32, buffer=block.buf)[:] = correlation.to_numpy(np.float32)
+        future = self.executor.submit(_render_heatmap, block.name, size,
+                                      list(correlation.index), dpi)
+        future.add_done_callback(lambda _: (block.close(), block.unlink()))
+        return future
+
+    def render(self, data: pd.DataFrame, saving_path: str = None, filename: str = None,
+               dpi: int = 300) -> Union[str, bytes]:
+        """Draw one chart and wait for it (see submit for arguments)"""
+        return self.submit(data, saving_path, filename, dpi).result()
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        self.executor.shutdown()
@@ -0,0 +1,86 @@
+"""
+Chat history for the Streamlit page
+Keeps every displayed message but only hands the newest page to the UI, so
+a rerun costs the same however long the conversation gets
+"""
+
+import re
+from typing import List, Tuple
+
+# A dollar sign in front of an amount ("$150", "$ 1.2M"), not one opening LaTeX
+CURRENCY_DOLLAR = re.compile(r"(?<!\\)\$(?=\s?\d)")
+
+
+def render_markdown(content: str) -> str:
+    """
+    Prepare a message for st.markdown
+
+    Streamlit treats text between dollar signs as LaTeX, which mangles price
+    talk like "$150 to $180", so dollar signs in front of amounts are
+    escaped; other ones are left alone, so maths like $x^2$ still renders.
+    This is done once when the message is stored rather than on every rerun.
+
+    Args:
+        content: Raw message text
+
+    Returns:
+        Markdown safe to pass to st.markdown
+    """
+    return CURRENCY_DOLLAR.sub(r"\\$", content)
+
+
+class ChatHistory:
+    """
+    Messages shown in the chat window with paging over older ones
+    """
+
+    def __init__(self, page_size: int = 20):
+        """
+        Args:
+            page_size: Messages shown at first and added by each "load earlier"
+        """
+        self.page_size = page_size
+        self.visible = page_size
+        # Parallel lists are lighter than one dict per message
+        self.roles: List[str] = []
+        self.rendered: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.roles)
+
+    def append(self, role: str, content: str) -> None:
+        """
+        Store a message
+
+        Args:
+            role: "user" or "assistant"
+            content: The message text
+        """
+        self.roles.append(role)
+        self.rendered.append(render_markdown(content))
+
+    def window(self) -> List[Tuple[str, str]]:
+        """
+        Messages to draw on this rerun
+
+        Returns:
+            (role, markdown) pairs for the newest `visible` messages, oldest first
+        """
+        start = max(0, len(self.roles) - self.visible)
+        return list(zip(self.roles[start:], self.rendered[start:]))
+
+    def hidden_count(self) -> int:
+        """How many older messages are not being drawn"""
+        return max(0, len(self.roles) - self.visible)
+
+    def load_earlier(self) -> None:
+        """Show one more page of older messages"""
+        self.visible = min(len(self.roles), self.visible + self.page_size)
+
+    def showing_earlier(self) -> bool:
+        """Whether older pages have been loaded on top of the newest one"""
+        return self.visible > self.page_size
+
+    def show_latest(self) -> None:
+        """Go back to showing only the newest page"""
+        self.visible = self.page_size
@@ -0,0 +1,480 @@
+"""
+Headless chat service
+Serves the chatbot personalities over HTTP so other programs can use them
+
+Run with:
+    python chat_service.py --port 8000
+
+Endpoints:
+    POST   /sessions                 create a session, body {"personality", "name", "subject"}
+    GET    /sessions/<id>            session info
+    DELETE /sessions/<id>            end a session (messages still waiting get 410)
+    POST   /sessions/<id>/messages   send a message, body {"content"}, returns {"response"}
+    POST   /sessions/<id>/stream     send a message and stream the reply as server-sent events
+    GET    /health                   service statistics
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from chatbot_logic import Chatbot, FriendlyBot, TeacherBot, FunnyBot
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 410: "Gone", 413: "Payload Too Large",
+    429: "Too Many Requests", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+MAX_BODY_BYTES = 64 * 1024
+STREAM_BUFFER_CHUNKS = 64
+
+
+class ServiceError(Exception):
+    """An error that should be sent back to the client as an HTTP status"""
+    def __init__(self, status: int, message: str, headers: Dict[str, str] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def create_bot(personality: str, name: str = "", subject: str = "") -> Chatbot:
+    """
+    Build a chatbot the same way the Streamlit app does
+
+    Args:
+        personality: 'friendly', 'teacher' or 'funny'
+        name: Teacher's name (teacher only)
+        subject: Subject to teach (teacher only)
+
+    Returns:
+        A new chatbot with empty memory
+    """
+    personality = (personality or "friendly").lower()
+    if personality == "friendly":
+        return FriendlyBot(name="Joy")
+    if personality == "teacher":
+        if not name or not subject:
+            raise ServiceError(400, "Teacher sessions need both 'name' and 'subject'")
+        return TeacherBot(name=f"Professor {name}", subject=subject)
+    if personality == "funny":
+        return FunnyBot(name="Comedy")
+    raise ServiceError(400, f"Unknown personality: {personality}")
+
+
+class ReplyStream:
+    """
+    Chunks of one streamed reply, passed from an LLM thread to the event loop
+    The buffer is bounded, so the thread waits for a slow reader instead of
+    piling the whole reply up in memory. If the reader goes away, abandon()
+    empties the buffer and tells the thread to stop generating.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = STREAM_BUFFER_CHUNKS):
+        self.loop = loop
+        self.chunks: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.abandoned = threading.Event()
+
+    def put_from_thread(self, chunk: str) -> bool:
+        """
+        Hand a chunk to the event loop, waiting while the buffer is full
+
+        Returns:
+            False once nobody is reading any more
+        """
+        if self.abandoned.is_set():
+            return False
+        asyncio.run_coroutine_threadsafe(self.chunks.put(chunk), self.loop).result()
+        return not self.abandoned.is_set()
+
+    async def get(self) -> Optional[str]:
+        """Next chunk, or None at the end of the reply"""
+        return await self.chunks.get()
+
+    async def finish(self) -> None:
+        """Mark the end of the reply once the reader has room for it"""
+        if not self.abandoned.is_set():
+            await self.chunks.put(None)
+
+    def abandon(self) -> None:
+        """Drop whatever is buffered, unblock the thread and end the stream"""
+        self.abandoned.set()
+        while not self.chunks.empty():
+            self.chunks.get_nowait()
+        # The buffer is empty, so this can't be full; a put the thread still
+        # had waiting lands after the end marker and is never read
+        self.chunks.put_nowait(None)
+
+
+class SessionActor:
+    """
+    Owns one chatbot and handles its messages strictly one at a time
+    Turn order is kept by a single worker task reading from a bounded queue.
+    When the session is closed, the message being answered and every queued
+    one fail with 410 instead of leaving their callers waiting.
+    """
+
+    def __init__(self, session_id: str, bot: Chatbot, service: "ChatService"):
+        self.session_id = session_id
+        self.bot = bot
+        self.service = service
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=service.max_queue)
+        self.turns = 0
+        self.last_active = time.monotonic()
+        self.worker = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, content: str, stream: bool) -> Tuple[asyncio.Future, Optional[ReplyStream]]:
+        """
+        Queue a message for this session
+
+        Args:
+            content: The user's message
+            stream: Whether the reply should be streamed chunk by chunk
+
+        Returns:
+            A future for the full reply, plus a ReplyStream when streaming
+        """
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        chunks = ReplyStream(loop) if stream else None
+        try:
+            self.queue.put_nowait((content, done, chunks))
+        except asyncio.QueueFull:
+            raise ServiceError(429, "Too many queued messages for this session",
+                               {"Retry-After": "1"})
+        self.last_active = time.monotonic()
+        return done, chunks
+
+    async def _run(self) -> None:
+        """Process queued messages in the order they arrived"""
+        while True:
+            content, done, chunks = await self.queue.get()
+            try:
+                async with self.service.slots:
+                    self.service.in_flight += 1
+                    try:
+                        if chunks is None:
+                            reply = await self.service.run_blocking(self.bot.generate_response, content)
+                        else:
+                            reply = await self.service.run_blocking(self._stream_into, content, chunks)
+                    finally:
+                        self.service.in_flight -= 1
+                self.turns += 1
+                if not done.done():
+                    done.set_result(reply)
+            except asyncio.CancelledError:
+                if not done.done():
+                    done.set_exception(self._closed_error())
+                if chunks is not None:
+                    # The reader gets the 410 right away and the thread stops streaming
+                    chunks.abandon()
+                raise
+            except Exception as e:
+                if not done.done():
+                    done.set_exception(e)
+            finally:
+                self.last_active = time.monotonic()
+                self.queue.task_done()
+                if chunks is not None:
+                    try:
+                        await chunks.finish()
+                    except asyncio.CancelledError:
+                        chunks.abandon()
+                        raise
+
+    def _stream_into(self, content: str, chunks: ReplyStream) -> str:
+        """Run the bot's stream in a worker thread and hand chunks to the event loop"""
+        reply = ""
+        for chunk in self.bot.stream_response(content):
+            reply += chunk
+            if not chunks.put_from_thread(chunk):
+                break
+        return reply
+
+    def _closed_error(self) -> ServiceError:
+        """What a message still waiting on a closed session gets"""
+        return ServiceError(410, f"Session {self.session_id} was closed")
+
+    def close(self) -> None:
+        """Stop the worker task and fail every message still waiting"""
+        self.worker.cancel()
+        while not self.queue.empty():
+            _, done, chunks = self.queue.get_nowait()
+            if not done.done():
+                done.set_exception(self._closed_error())
+            if chunks is not None:
+                chunks.abandon()
+            self.queue.task_done()
+
+
+class ChatService:
+    """
+    Keeps track of sessions and limits how many LLM calls run at once
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 8,
+                 max_sessions: int = 1000, idle_timeout: float = 1800):
+        """
+        Args:
+            max_concurrency: LLM calls allowed in flight across all sessions
+            max_queue: Messages a single session may have waiting
+            max_sessions: Open sessions allowed before new ones are refused
+            idle_timeout: Seconds before an idle session may be dropped
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions: Dict[str, SessionActor] = {}
+        self.in_flight = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                           thread_name_prefix="chat-llm")
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> None:
+        """Bind to the running event loop (call before handling requests)"""
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def run_blocking(self, func, *args):
+        """Run a blocking chatbot call on the worker threads"""
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    def create_session(self, personality: str, name: str = "", subject: str = "") -> SessionActor:
+        """Start a new chat session"""
+        if len(self.sessions) >= self.max_sessions:
+            self.evict_idle()
+        if len(self.sessions) >= self.max_sessions:
+            raise ServiceError(503, "Session limit reached", {"Retry-After": "5"})
+
+        session_id = uuid.uuid4().hex
+        actor = SessionActor(session_id, create_bot(personality, name, subject), self)
+        self.sessions[session_id] = actor
+        return actor
+
+    def get_session(self, session_id: str) -> SessionActor:
+        """Look up a session or fail with 404"""
+        actor = self.sessions.get(session_id)
+        if actor is None:
+            raise ServiceError(404, f"Unknown session: {session_id}")
+        return actor
+
+    def close_session(self, session_id: str) -> None:
+        """End a session and stop its worker"""
+        self.get_session(session_id).close()
+        del self.sessions[session_id]
+
+    def evict_idle(self) -> int:
+        """Drop sessions with nothing queued that have been idle too long"""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [session_id for session_id, actor in self.sessions.items()
+                if actor.last_active < cutoff and actor.queue.empty()]
+        for session_id in idle:
+            self.close_session(session_id)
+        return len(idle)
+
+    def stats(self) -> Dict:
+        """Numbers for the health endpoint"""
+        return {
+            "sessions": len(self.sessions),
+            "queued_messages": sum(actor.queue.qsize() for actor in self.sessions.values()),
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+# --- HTTP handling ---
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict]:
+    """
+    Read one HTTP request
+
+    Returns:
+        (method, path, parsed JSON body)
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        raise ConnectionError("Client closed the connection")
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ServiceError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise ServiceError(400, "Content-Length must be a number")
+    if length < 0:
+        raise ServiceError(400, "Content-Length must not be negative")
+    if length > MAX_BODY_BYTES:
+        raise ServiceError(413, "Request body too large")
+    body = {}
+    if length:
+        try:
+            body = json.loads(await reader.readexactly(length))
+        except ValueError:
+            raise ServiceError(400, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise ServiceError(400, "Body must be a JSON object")
+
+    return method.upper(), path.split("?", 1)[0], body
+
+
+def write_head(writer: asyncio.StreamWriter, status: int, headers: Dict[str, str]) -> None:
+    """Write the status line and headers"""
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+    lines += [f"{key}: {value}" for key, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+
+async def send_json(writer: asyncio.StreamWriter, status: int, payload: Dict,
+                    headers: Dict[str, str] = None) -> None:
+    """Send a complete JSON response"""
+    body = json.dumps(payload).encode("utf-8")
+    write_head(writer, status, {
+        "Content-Type": "application/json",
+        "Content-Length": str(len(body)),
+        "Connection": "close",
+        **(headers or {}),
+    })
+    writer.write(body)
+    await writer.drain()
+
+
+async def send_stream(writer: asyncio.StreamWriter, done: asyncio.Future,
+                      chunks: ReplyStream) -> None:
+    """
+    Forward reply chunks to the client as server-sent events
+
+    Once the 200 headers are out, any failure is reported as an error
+    event on the stream; a JSON error response can't follow them.
+    """
+    write_head(writer, 200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "Connection": "close",
+    })
+    try:
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            writer.write(f"data: {json.dumps({'delta': chunk})}\n\n".encode("utf-8"))
+            # Waiting on drain means a slow reader slows its own stream, not the service
+            await writer.drain()
+        reply = await done
+        writer.write(f"event: done\ndata: {json.dumps({'response': reply})}\n\n".encode("utf-8"))
+    except (ConnectionError, asyncio.CancelledError):
+        # Nobody is reading, so don't leave the LLM thread waiting on a full buffer
+        chunks.abandon()
+        raise
+    except Exception as e:
+        writer.write(f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n".encode("utf-8"))
+    await writer.drain()
+
+
+async def route(service: ChatService, method: str, path: str, body: Dict,
+                writer: asyncio.StreamWriter) -> None:
+    """Dispatch a request to the matching endpoint"""
+    parts = [part for part in path.split("/") if part]
+
+    if parts == ["health"] and method == "GET":
+        await send_json(writer, 200, service.stats())
+        return
+
+    if parts == ["sessions"] and method == "POST":
+        actor = service.create_session(body.get("personality", "friendly"),
+                                       body.get("name", ""), body.get("subject", ""))
+        await send_json(writer, 201, {"session_id": actor.session_id, "name": actor.bot.name})
+        return
+
+    if len(parts) == 2 and parts[0] == "sessions":
+        if method == "GET":
+            actor = service.get_session(parts[1])
+            await send_json(writer, 200, {"session_id": actor.session_id, "name": actor.bot.name,
+                                          "turns": actor.turns, "queued": actor.queue.qsize()})
+            return
+        if method == "DELETE":
+            service.close_session(parts[1])
+            await send_json(writer, 200, {"closed": parts[1]})
+            return
+
+    if len(parts) == 3 and parts[0] == "sessions" and parts[2] in ("messages", "stream"):
+        if method != "POST":
+            raise ServiceError(405, "Use POST")
+        content = body.get("content")
+        if not isinstance(content, str) or not content.strip():
+            raise ServiceError(400, "Body needs a non-empty 'content' string")
+
+        actor = service.get_session(parts[1])
+        done, chunks = actor.submit(content, stream=(parts[2] == "stream"))
+        if chunks is None:
+            await send_json(writer, 200, {"response": await done})
+        else:
+            await send_stream(writer, done, chunks)
+        return
+
+    raise ServiceError(404, f"No route for {method} {path}")
+
+
+async def handle_connection(service: ChatService, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+    """Serve a single request and close the connection"""
+    try:
+        method, path, body = await read_request(reader)
+        await route(service, method, path, body, writer)
+    except ServiceError as e:
+        await send_json(writer, e.status, {"error": str(e)}, e.headers)
+    except ConnectionError:
+        pass
+    except Exception as e:
+        await send_json(writer, 500, {"error": f"Internal error: {e}"})
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int, service: ChatService) -> None:
+    """Start the service and run until cancelled"""
+    await service.start()
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer), host, port)
+    print(f"Chat service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Serve the chatbot over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrency", type=int, default=8,
+                        help="LLM calls allowed in flight at once")
+    parser.add_argument("--max-queue", type=int, default=8,
+                        help="Messages each session may have waiting")
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    args = parser.parse_args()
+
+    service = ChatService(args.max_concurrency, args.max_queue, args.max_sessions)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        print("Goodbye!")
+
+
+if __name__ == "__main__":
+    main()
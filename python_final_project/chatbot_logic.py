@@ -1,11 +1,22 @@
-from typing import List, Dict
-from utils import query_llm
+from datetime import date
+from typing import List, Dict, Iterator, Optional
+from utils import query_llm, stream_llm, query_llm_with_tools, tool_call_message
+from memory_index import TurnIndex
+from tracing import TRACER
+from finance_router import FinanceRouter
+from finance_tools import FinanceTools, TOOL_SCHEMAS
+
+# Most times the LLM may ask for tools in one turn before it has to answer,
+# so a turn never takes more than MAX_TOOL_ROUNDS + 1 LLM calls
+MAX_TOOL_ROUNDS = 3
 
 class Memory:
     """Stores conversation history"""
     def __init__(self):
         # Store last 3 messages (each message is a dictionary with 'role' and 'content')
         self.messages: List[Dict] = []
+        # Every message ever added, searchable for long-range recall
+        self.index: TurnIndex = TurnIndex()
     
     def add_message(self, role: str, content: str) -> None:
         """
@@ -25,6 +36,9 @@ class Memory:
         # Add it to self.messages
         self.messages.append(message)
         
+        # Index it so it can still be recalled after it leaves the window
+        self.index.add(role, content)
+        
         # Keep only the last 3 messages (6 total for 3 exchanges)
         if len(self.messages) > 6:
             self.messages = self.messages[-6:]
@@ -47,12 +61,79 @@ class Memory:
             content = message["content"]
             output += f"{role}: {content}\n"
         return output.strip()
+    
+    def get_relevant_messages(self, query: str, k: int = 3) -> str:
+        """
+        Get string of older messages that relate to a query
+        Args:
+            query: Text to look for (usually the user's new message)
+            k: How many older messages to return at most
+        Returns:
+            The best matching messages from outside the recent window,
+            in conversation order, or an empty string if none match
+        """
+        # Messages still in the recent window are already in the prompt
+        window_start = len(self.index) - len(self.messages)
+        matches = self.index.search(query, k=k, before=window_start)
+        
+        output = ""
+        for turn_id in sorted(turn_id for turn_id, _ in matches):
+            message = self.index.turns[turn_id]
+            output += f"{message['role'].capitalize()}: {message['content']}\n"
+        return output.strip()
 
 class Chatbot:
     """Base chatbot class with core functionality"""
     def __init__(self, name: str):
         self.name: str = name
         self.memory: Memory = Memory()
+        # Answers questions like "how did AAPL do in 2023" from real prices
+        # (off by default; set a FinanceRouter to turn it on)
+        self.finance_router: Optional[FinanceRouter] = None
+        # Lets the LLM look up stock data itself through tool calls (off by default)
+        self.finance_tools: Optional[FinanceTools] = None
+    
+    def _route_finance(self, user_input: str) -> Optional[Dict]:
+        """
+        Check the message with the finance router
+        Args:
+            user_input: The user's message
+        Returns:
+            The router's result ({"answer"} or {"context"}), or None when
+            the message should go to the LLM as usual
+        """
+        if self.finance_router is None:
+            return None
+        with TRACER.span("finance_router"):
+            return self.finance_router.route(user_input)
+    
+    def _create_grounded_prompt(self, user_input: str, routed: Optional[Dict]) -> str:
+        """
+        Create the LLM prompt, with real market figures in front of it when
+        the finance router found some
+        """
+        prompt = self._create_prompt(user_input)
+        if routed is not None and "context" in routed:
+            prompt = f"""{routed["context"]}
+
+Use these figures rather than guessing when they answer the question.
+
+{prompt}"""
+        return prompt
+    
+    def _get_relevant_history(self, user_input: str) -> str:
+        """
+        Build the long-term memory section of a prompt
+        Args:
+            user_input: The user's message
+        Returns:
+            A prompt section with related older messages, or an empty
+            string when nothing from earlier in the conversation matches
+        """
+        relevant_messages = self.memory.get_relevant_messages(user_input)
+        if not relevant_messages:
+            return ""
+        return f"Relevant earlier conversation:\n{relevant_messages}\n\n"
     
     def _create_prompt(self, user_input: str) -> str:
         """
@@ -69,11 +150,12 @@ class Chatbot:
         """
         # Get recent conversation history
         recent_messages = self.memory.get_recent_messages()
+        relevant_history = self._get_relevant_history(user_input)
         
         # Create a comprehensive prompt with context
         prompt = f"""You are {self.name}, a helpful AI assistant. 
 
-Recent conversation history:
+{relevant_history}Recent conversation history:
 {recent_messages}
 
 Current user message: {user_input}
@@ -82,6 +164,39 @@ Please respond as {self.name} in a helpful and engaging way. Consider the conver
         
         return prompt
     
+    def _answer_with_tools(self, prompt: str) -> str:
+        """
+        Get the LLM's reply, running any finance tools it asks for
+        Args:
+            prompt: The prompt from _create_prompt
+        Returns:
+            The final reply text
+        
+        Each round the model may ask for several tools; they run in parallel
+        and their compact results go back to it. After MAX_TOOL_ROUNDS it has
+        to answer with what it has.
+        """
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant. When a question needs real stock "
+                                          "prices or indicators, call the finance tools instead of guessing. "
+                                          f"Today is {date.today().isoformat()}."},
+            {"role": "user", "content": prompt},
+        ]
+        for _ in range(MAX_TOOL_ROUNDS):
+            with TRACER.span("query_llm"):
+                reply = query_llm_with_tools(messages, TOOL_SCHEMAS)
+            if not reply["tool_calls"]:
+                return reply["content"]
+            messages.append(tool_call_message(reply["content"], reply["tool_calls"]))
+            with TRACER.span("finance_tools"):
+                results = self.finance_tools.run_all(reply["tool_calls"])
+            for call, result in zip(reply["tool_calls"], results):
+                messages.append({"role": "tool", "tool_call_id": call["id"], "content": result})
+        
+        # Out of tool rounds: answer from the results gathered so far
+        with TRACER.span("query_llm"):
+            return query_llm_with_tools(messages)["content"]
+    
     def generate_response(self, user_input: str) -> str:
         """
         Generate a response to user input
@@ -100,16 +215,61 @@ Please respond as {self.name} in a helpful and engaging way. Consider the conver
         # Store the user's message in memory
         self.memory.add_message("user", user_input)
         
+        # Finance lookups are answered from real prices without the LLM
+        routed = self._route_finance(user_input)
+        if routed is not None and "answer" in routed:
+            self.memory.add_message("assistant", routed["answer"])
+            return routed["answer"]
+        
         # Create a prompt using _create_prompt() method
-        prompt = self._create_prompt(user_input)
+        with TRACER.span("create_prompt"):
+            prompt = self._create_grounded_prompt(user_input, routed)
         
         # Use query_llm() to get a response from GPT
-        response = query_llm(prompt)
+        if self.finance_tools is not None:
+            response = self._answer_with_tools(prompt)
+        else:
+            with TRACER.span("query_llm"):
+                response = query_llm(prompt)
         
         # Store the bot's response in memory before returning it
         self.memory.add_message("assistant", response)
         
         return response
+    
+    def stream_response(self, user_input: str) -> Iterator[str]:
+        """
+        Generate a response to user input piece by piece
+        Args:
+            user_input: The user's message
+        Yields:
+            Parts of the chatbot's response as they arrive
+        
+        The full response is stored in memory once streaming finishes,
+        so the conversation history looks the same as generate_response().
+        """
+        self.memory.add_message("user", user_input)
+        routed = self._route_finance(user_input)
+        if routed is not None and "answer" in routed:
+            self.memory.add_message("assistant", routed["answer"])
+            yield routed["answer"]
+            return
+        with TRACER.span("create_prompt"):
+            prompt = self._create_grounded_prompt(user_input, routed)
+        
+        if self.finance_tools is not None:
+            # Tool rounds can't be streamed; the finished reply comes as one piece
+            response = self._answer_with_tools(prompt)
+            self.memory.add_message("assistant", response)
+            yield response
+            return
+        
+        response = ""
+        for chunk in stream_llm(prompt):
+            response += chunk
+            yield chunk
+        
+        self.memory.add_message("assistant", response)
 
 class FriendlyBot(Chatbot):
     """A casual and friendly personality"""
@@ -124,11 +284,12 @@ class FriendlyBot(Chatbot):
         """
         # Get recent conversation history
         recent_messages = self.memory.get_recent_messages()
+        relevant_history = self._get_relevant_history(user_input)
         
         # Create a friendly personality prompt
         prompt = f"""You are {self.name}, a casual and warm AI assistant. You should be approachable, friendly, and welcoming in your responses.
 
-Recent conversation history:
+{relevant_history}Recent conversation history:
 {recent_messages}
 
 Current user message: {user_input}
@@ -154,11 +315,12 @@ class TeacherBot(Chatbot):
         """
         # Get recent conversation history
         recent_messages = self.memory.get_recent_messages()
+        relevant_history = self._get_relevant_history(user_input)
         
         # Create an educational personality prompt
         prompt = f"""You are {self.name}, a formal and educational AI assistant specializing in {self.subject}. You should be instructional, informative, and provide detailed explanations.
 
-Recent conversation history:
+{relevant_history}Recent conversation history:
 {recent_messages}
 
 Current user message: {user_input}
@@ -175,11 +337,12 @@ class FunnyBot(Chatbot):
         """
         # Get recent conversation history
         recent_messages = self.memory.get_recent_messages()
+        relevant_history = self._get_relevant_history(user_input)
         
         # Create a funny personality prompt
         prompt = f"""You are {self.name}, a witty and humorous AI assistant with sharp wit and a good sense of humor. You should be entertaining, clever, and use humor appropriately without being overly exaggerated.
 
-Recent conversation history:
+{relevant_history}Recent conversation history:
 {recent_messages}
 
 Current user message: {user_input}
@@ -3,14 +3,26 @@ Stock data analysis tool using yfinance
 A modular tool for fetching, processing and visualizing stock data
 """
 
-import yfinance as yf
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 from datetime import datetime
 import os
 from typing import List, Tuple, Dict, Optional
 
+from indicators import INDICATOR_ENGINE, IncrementalIndicators, latest_values
+from returns_analysis import analyze_returns
+from backtest import backtest
+from price_cache import FAILED_FETCHES, NO_DATA, PRICE_CACHE, failure_reason
+from price_store import PriceStore, PriceStoreWriter
+from csv_export import CSVExportWriter, ticker_summary
+
+# yfinance and matplotlib are slow to import, so they are loaded inside the
+# methods that need them rather than when this module is imported
+
+# pandas 3 is copy-on-write, so pd.concat of the cached frames already copies
+# each value just once and is quicker than filling preallocated columns
+PANDAS_COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3
+
 class StockDataAnalyzer:
     """
     Main class for analyzing stock data from Yahoo Finance
@@ -20,6 +32,12 @@ class StockDataAnalyzer:
     def __init__(self):
         """Set up the analyzer"""
         self.failed_tickers = []
+        # Why each failed ticker failed: no_data, error or timeout
+        self.failure_reasons: Dict[str, str] = {}
+        # Failed tickers answered from the negative cache without a download
+        self.skipped_tickers: List[str] = []
+        # Rolling indicator state per ticker, so new bars can be added cheaply
+        self.indicator_state = IncrementalIndicators()
         
     def validate_inputs(self, start_time: str, end_time: str, tickers: List[str], saving_path: str) -> bool:
         """
@@ -67,36 +85,101 @@ class StockDataAnalyzer:
         
         return unique_tickers
     
-    def fetch_stock_data(self, ticker: str, start_time: str, end_time: str) -> Optional[pd.DataFrame]:
+    def fetch_stock_data(self, ticker: str, start_time: str, end_time: str,
+                         interval: str = "1d", force_retry: bool = False) -> Optional[pd.DataFrame]:
         """
-        Download stock data for one ticker
+        Get stock data for one ticker
+        
+        Bars come from the shared price cache when it already has this range
+        at the same or a finer interval (resampled if needed), so switching
+        between e.g. hourly and daily views doesn't download again.
+        Failures are remembered process-wide for a while (see
+        price_cache.FAILURE_TTL), so a delisted or mistyped symbol fails at
+        once on the next request instead of after another download attempt
         
         Args:
             ticker: Stock symbol like 'AAPL'
             start_time: When to start (YYYY-MM-DD)
             end_time: When to end (YYYY-MM-DD)
+            interval: Bar size: 1m, 5m, 15m, 30m, 1h, 1d, 1wk or 1mo
+            force_retry: Download even if this ticker failed recently
             
         Returns:
-            Stock data if successful, None if it failed
+            Stock data if successful (the caller's own copy), None if it failed
         """
-        try:
-            stock = yf.Ticker(ticker)
-            data = stock.history(start=start_time, end=end_time)
-            
-            if data.empty:
-                raise ValueError(f"No data available for {ticker}")
-            
-            # Add a column to know which stock this data is for
-            data['Ticker'] = ticker
-            data.reset_index(inplace=True)
-            
-            return data
+        return self._fetch(ticker, start_time, end_time, interval, copy=True, force_retry=force_retry)
+    
+    def _fetch(self, ticker: str, start_time: str, end_time: str, interval: str,
+               copy: bool, force_retry: bool = False) -> Optional[pd.DataFrame]:
+        """
+        fetch_stock_data, optionally without copying the cached bars
+        
+        copy=False hands back rows of the price cache's own frame, which
+        every later request shares. That is only used inside this class, by
+        code that reads the rows once and writes them somewhere else
+        (combine_stock_data, export_stock_data_csv); it is not offered to
+        callers, who could otherwise change the cache by accident.
+        """
+        reason = None if force_retry else FAILED_FETCHES.check(ticker, start_time, end_time, interval)
+        if reason is not None:
+            self.skipped_tickers.append(ticker)
+        else:
+            try:
+                data = PRICE_CACHE.get(ticker, start_time, end_time, interval, self.download_bars, copy=copy)
+                
+                if data is not None and not data.empty:
+                    return data
+                reason = NO_DATA
+                
+            except Exception as e:
+                reason = failure_reason(e)
+            FAILED_FETCHES.add(ticker, start_time, end_time, interval, reason)
+        
+        self.failed_tickers.append(ticker)
+        self.failure_reasons[ticker] = reason
+        return None
+    
+    def download_bars(self, ticker: str, start_time: str, end_time: str, interval: str) -> Optional[pd.DataFrame]:
+        """
+        Download bars from Yahoo Finance (no caching)
+        
+        Args:
+            ticker: Stock symbol
+            start_time: When to start (YYYY-MM-DD)
+            end_time: When to end (YYYY-MM-DD)
+            interval: Bar size as yfinance names it
             
-        except Exception as e:
-            self.failed_tickers.append(ticker)
+        Returns:
+            Bars with Date and Ticker columns, or None if there were none
+        """
+        import yfinance as yf
+        
+        stock = yf.Ticker(ticker)
+        if interval == "1m":
+            # Yahoo only hands out 1-minute bars a week at a time
+            edges = list(pd.date_range(start_time, end_time, freq="7D")) + [pd.Timestamp(end_time)]
+            pieces = [stock.history(start=a, end=b, interval=interval)
+                      for a, b in zip(edges[:-1], edges[1:]) if a < b]
+            pieces = [piece for piece in pieces if not piece.empty]
+            data = pd.concat(pieces) if pieces else pd.DataFrame()
+        else:
+            data = stock.history(start=start_time, end=end_time, interval=interval)
+        
+        if data.empty:
             return None
+        
+        # Intraday bars come back indexed by 'Datetime'; use 'Date' everywhere
+        data.index.name = 'Date'
+        data = data[~data.index.duplicated()]
+        
+        # Add a column to know which stock this data is for
+        data['Ticker'] = ticker
+        data.reset_index(inplace=True)
+        
+        return data
     
-    def combine_stock_data(self, tickers: List[str], start_time: str, end_time: str) -> pd.DataFrame:
+    def combine_stock_data(self, tickers: List[str], start_time: str, end_time: str,
+                           interval: str = "1d", method: str = "assemble") -> pd.DataFrame:
         """
         Download data for multiple stocks and put them all together
         
@@ -104,6 +187,11 @@ class StockDataAnalyzer:
             tickers: List of stock symbols
             start_time: Start date
             end_time: End date
+            interval: Bar size (see fetch_stock_data)
+            method: "assemble" joins the cached bars with
+                assemble_stock_data (lower peak memory, see there);
+                "concat" is the old copy-then-pd.concat path, which is
+                faster on pandas 2
             
         Returns:
             All the stock data combined into one table
@@ -111,15 +199,124 @@ class StockDataAnalyzer:
         all_data = []
         
         for ticker in tickers:
-            data = self.fetch_stock_data(ticker, start_time, end_time)
+            data = self._fetch(ticker, start_time, end_time, interval, copy=(method == "concat"))
             if data is not None:
                 all_data.append(data)
         
-        if all_data:
-            combined_data = pd.concat(all_data, ignore_index=True)
-            return combined_data
-        else:
+        if method == "concat":
+            return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
+        return self.assemble_stock_data(all_data)
+    
+    def assemble_stock_data(self, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Stack per-ticker frames into one, copying each value exactly once
+        (on pandas 3 plain pd.concat already does, so it is used there)
+        
+        The row counts are known up front, so the price columns are
+        allocated once at their final size, as the single 2D block pandas
+        keeps them in, and filled slice by slice. The frame is built around
+        that block, so no intermediate or consolidated copies are made and
+        the inputs can be the cache's own frames rather than copies.
+        
+        This trades time for memory. On pandas 2, combining 100 tickers of
+        3 years of daily bars (a 5.6 MB result) peaks at 7.3 MB instead of
+        12.2 MB for copy-then-concat, but takes about 55 ms instead of 36 ms.
+        Use combine_stock_data(method="concat") when speed matters more.
+        
+        Args:
+            frames: Per-ticker data (these are only read)
+            
+        Returns:
+            All the rows in one table, same columns as pd.concat would give
+        """
+        frames = [frame for frame in frames if frame is not None and not frame.empty]
+        if not frames:
             return pd.DataFrame()
+        if PANDAS_COPY_ON_WRITE:
+            return pd.concat(frames, ignore_index=True)
+        
+        total = sum(len(frame) for frame in frames)
+        bounds = np.cumsum([0] + [len(frame) for frame in frames])
+        columns = list(dict.fromkeys(name for frame in frames for name in frame.columns))
+        
+        # Work out each column's output type first
+        frame_dtypes = [frame.dtypes.to_dict() for frame in frames]
+        kinds = {}
+        for name in columns:
+            dtypes = [found[name] for found in frame_dtypes if name in found]
+            if all(pd.api.types.is_datetime64_any_dtype(dtype) for dtype in dtypes):
+                kinds[name] = 'datetime'
+            elif all(pd.api.types.is_numeric_dtype(dtype) for dtype in dtypes):
+                dtype = np.result_type(*dtypes)
+                if len(dtypes) < len(frames) and not np.issubdtype(dtype, np.floating):
+                    dtype = np.dtype(np.float64)  # room for NaN where a ticker lacks the column
+                kinds[name] = dtype
+            else:
+                kinds[name] = np.dtype(object)
+        
+        # The float64 columns (the prices) share one 2D block, which is how
+        # pandas stores them anyway, so building the frame doesn't copy them
+        block_names = [name for name in columns if kinds[name] == np.float64]
+        block = np.empty((len(block_names), total), dtype=np.float64)
+        for i, frame in enumerate(frames):
+            rows = [row for row, name in enumerate(block_names) if name in frame.columns]
+            if len(rows) < len(block_names):
+                block[:, bounds[i]:bounds[i + 1]] = np.nan
+            names = [block_names[row] for row in rows]
+            block[rows, bounds[i]:bounds[i + 1]] = frame[names].to_numpy(np.float64).T
+        combined = pd.DataFrame(block.T, columns=block_names, copy=False)
+        
+        # Everything else (dates, volumes, tickers) is joined column by column,
+        # which keeps each column's own type and copies it once
+        for position, name in enumerate(columns):
+            if name in block_names:
+                continue
+            column_parts = [frame[name] if name in frame.columns else None for frame in frames]
+            if kinds[name] == 'datetime':
+                zones = {str(part.dt.tz) for part in column_parts if part is not None}
+                if len(zones) > 1:
+                    # Mixed timezones can't share a column, so they end up in UTC
+                    column_parts = [part.dt.tz_convert('UTC') if part is not None and part.dt.tz is not None
+                                    else part for part in column_parts]
+                dtype = next(part.dtype for part in column_parts if part is not None)
+            else:
+                dtype = kinds[name]
+            # Tickers without this column get an all-missing piece
+            column_parts = [pd.Series(index=pd.RangeIndex(bounds[i + 1] - bounds[i]), dtype=dtype)
+                            if part is None else part for i, part in enumerate(column_parts)]
+            combined.insert(position, name, pd.concat(column_parts, ignore_index=True))
+        
+        return combined
+    
+    def store_stock_data(self, tickers: List[str], start_time: str, end_time: str, store_path: str,
+                         interval: str = "1d", append: bool = False) -> PriceStore:
+        """
+        Download data for many stocks straight into a memory-mapped price store
+        
+        Unlike combine_stock_data nothing is concatenated in memory: each
+        ticker is written to disk as soon as it arrives, so the universe can
+        be much bigger than RAM
+        
+        Args:
+            tickers: List of stock symbols
+            start_time: Start date
+            end_time: End date
+            store_path: Folder for the store
+            interval: Bar size (see fetch_stock_data)
+            append: Add to an existing store instead of replacing it
+            
+        Returns:
+            The store, ready to read
+        """
+        with PriceStoreWriter(store_path, append=append) as writer:
+            for ticker in tickers:
+                if ticker in writer.tickers:
+                    continue
+                data = self.fetch_stock_data(ticker, start_time, end_time, interval)
+                if data is not None:
+                    writer.append(ticker, data)
+        
+        return PriceStore(store_path)
     
     def save_data_to_csv(self, data: pd.DataFrame, saving_path: str, filename: str = None) -> str:
         """
@@ -142,6 +339,51 @@ class StockDataAnalyzer:
         
         return full_path
     
+    def export_stock_data_csv(self, tickers: List[str], start_time: str, end_time: str, saving_path: str,
+                              interval: str = "1d", filename: str = None, partition: bool = False,
+                              keep_data: bool = False) -> Dict:
+        """
+        Download data for multiple stocks, writing each one to CSV as it arrives
+        
+        The first rows are on disk after the first ticker instead of after
+        the slowest one, and unless keep_data is set no ticker's data is held
+        once it has been written
+        
+        Args:
+            tickers: List of stock symbols
+            start_time: Start date
+            end_time: End date
+            saving_path: Where to put the file
+            interval: Bar size (see fetch_stock_data)
+            filename: What to call the file, or the folder when partitioning (optional)
+            partition: Write one CSV per ticker into a folder instead of one file
+            keep_data: Also return the combined data (e.g. for a chart afterwards)
+            
+        Returns:
+            A dictionary with csv_path (None if nothing was fetched), summary
+            (as generate_summary_report), records, first_write_seconds and,
+            with keep_data, data
+        """
+        frames = []
+        with CSVExportWriter(saving_path, filename, partition) as writer:
+            for ticker in tickers:
+                data = self._fetch(ticker, start_time, end_time, interval, copy=False)
+                if data is None:
+                    continue
+                writer.append(ticker, data)
+                if keep_data:
+                    frames.append(data)
+        
+        export = {
+            'csv_path': writer.close(),
+            'summary': writer.summary,
+            'records': writer.records,
+            'first_write_seconds': writer.first_write_seconds,
+        }
+        if keep_data:
+            export['data'] = self.assemble_stock_data(frames)
+        return export
+    
     def calculate_date_interval(self, start_date, end_date):
         """
         Figure out how often to show dates on the chart
@@ -174,42 +416,140 @@ class StockDataAnalyzer:
         
         return interval_months
 
+    def choose_date_axis(self, start_date, end_date):
+        """
+        Pick x-axis date labels that suit how long the chart covers
+        
+        Args:
+            start_date: When the data starts
+            end_date: When the data ends
+            
+        Returns:
+            (matplotlib locator, date format string)
+        """
+        import matplotlib.dates as mdates
+        
+        start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        span = end_date - start_date
+        tz = start_date.tz
+        
+        if span <= pd.Timedelta(days=2):
+            # Intraday: label every few hours
+            hours = max(1, int(span.total_seconds() // 3600 // 8))
+            return mdates.HourLocator(interval=hours, tz=tz), '%m-%d %H:%M'
+        if span <= pd.Timedelta(days=31):
+            return mdates.DayLocator(interval=max(1, span.days // 10), tz=tz), '%m-%d'
+        if span <= pd.Timedelta(days=183):
+            weeks = max(1, span.days // 7 // 10)
+            return mdates.WeekdayLocator(byweekday=mdates.MO, interval=weeks, tz=tz), '%Y-%m-%d'
+        
+        interval_months = self.calculate_date_interval(start_date, end_date)
+        # For long periods just show the year, otherwise year and month
+        date_format = '%Y' if interval_months >= 12 else '%Y-%m'
+        return mdates.MonthLocator(interval=interval_months, tz=tz), date_format
+    
     def create_stock_chart(self, data: pd.DataFrame, saving_path: str, filename: str = None) -> str:
         """
         Make a chart showing stock prices over time
         
         Args:
-            data: The stock data to plot
+            data: The stock data to plot (a DataFrame, or a PriceStore)
             saving_path: Where to save the chart
             filename: What to call the chart file (optional)
             
         Returns:
             The full path where the chart was saved
         """
-        if data.empty:
+        if self._nothing_to_plot(data):
             return ""
         
+        import matplotlib.pyplot as plt
+        
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"stock_chart_{timestamp}.png"
         
+        fig = self.build_stock_chart(data)
+        
+        # Save the chart to a file
+        full_path = os.path.join(saving_path, filename)
+        fig.savefig(full_path, dpi=300, bbox_inches='tight')
+        plt.close(fig)
+        
+        return full_path
+    
+    def create_stock_chart_bytes(self, data: pd.DataFrame, dpi: int = 150) -> bytes:
+        """
+        Make the stock chart in memory instead of saving it to a file
+        
+        Args:
+            data: The stock data to plot (a DataFrame, or a PriceStore)
+            dpi: Image resolution (lower than the saved chart, for the screen)
+            
+        Returns:
+            The chart as PNG bytes, ready for st.image or a download button
+            (empty if there was nothing to plot)
+        """
+        if self._nothing_to_plot(data):
+            return b""
+        
+        import io
+        import matplotlib.pyplot as plt
+        
+        fig = self.build_stock_chart(data)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+        
+        return buffer.getvalue()
+    
+    def _nothing_to_plot(self, data) -> bool:
+        """True for an empty DataFrame or a PriceStore with no rows"""
+        if isinstance(data, PriceStore):
+            return data.rows == 0
+        return data.empty
+    
+    def build_stock_chart(self, data: pd.DataFrame):
+        """
+        Draw the stock price chart without saving it
+        
+        Args:
+            data: The stock data to plot (needs Date, Ticker and Close columns),
+                  or a PriceStore, which is plotted from each ticker's Close
+                  slice without rebuilding the rows
+            
+        Returns:
+            The matplotlib figure (the caller saves and closes it)
+        """
+        import matplotlib.pyplot as plt
+        import matplotlib.dates as mdates
+        
         # Set up the chart
         fig, ax = plt.subplots(1, 1, figsize=(12, 8))
         fig.suptitle('Stock Price Analysis', fontsize=16, fontweight='bold')
         
-        # Draw lines for each stock
-        unique_tickers = data['Ticker'].unique()
-        colors = plt.cm.Set3(range(len(unique_tickers)))
+        # One (ticker, dates, closes) line per stock, plus the date range for the x-axis
+        if isinstance(data, PriceStore):
+            lines = []
+            for ticker in data.tickers:
+                close = data.series(ticker, 'Close')
+                if len(close):
+                    lines.append((ticker, close.index, close.to_numpy()))
+            min_date = min(dates.min() for _, dates, _ in lines)
+            max_date = max(dates.max() for _, dates, _ in lines)
+        else:
+            lines = []
+            for ticker in data['Ticker'].unique():
+                ticker_data = data[data['Ticker'] == ticker]
+                lines.append((ticker, ticker_data['Date'], ticker_data['Close']))
+            min_date = data['Date'].min()
+            max_date = data['Date'].max()
         
-        for i, ticker in enumerate(unique_tickers):
-            ticker_data = data[data['Ticker'] == ticker]
-            ax.plot(ticker_data['Date'], ticker_data['Close'], 
-                   label=ticker, color=colors[i], linewidth=2)
+        # Draw lines for each stock
+        colors = plt.cm.Set3(range(len(lines)))
         
-        # Figure out how often to show dates on the x-axis
-        min_date = data['Date'].min()
-        max_date = data['Date'].max()
-        interval_months = self.calculate_date_interval(min_date, max_date)
+        for i, (ticker, dates, close) in enumerate(lines):
+            ax.plot(dates, close, label=ticker, color=colors[i], linewidth=2)
         
         ax.set_title('Closing Prices Over Time', fontsize=14, fontweight='bold')
         ax.set_xlabel('Date')
@@ -218,55 +558,217 @@ class StockDataAnalyzer:
         ax.grid(True, alpha=0.3)
         
         # Set up the date labels on the x-axis
-        if interval_months >= 12:
-            # For long periods, just show the year
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-        else:
-            # For shorter periods, show year and month
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
-        
-        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=interval_months))
+        locator, date_format = self.choose_date_axis(min_date, max_date)
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter(date_format, tz=getattr(min_date, 'tz', None)))
         
         # Tilt the date labels so they don't overlap
         plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
         
-        plt.tight_layout()
-        
-        # Save the chart to a file
-        full_path = os.path.join(saving_path, filename)
-        plt.savefig(full_path, dpi=300, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
         
-        return full_path
+        return fig
     
     def generate_summary_report(self, data: pd.DataFrame) -> Dict:
         """
         Create a summary of the stock data
         
         Args:
-            data: The stock data to summarize
+            data: The stock data to summarize (a DataFrame, or a PriceStore
+                  which is read column slice by column slice)
             
         Returns:
             A dictionary with key stats for each stock
         """
+        if isinstance(data, PriceStore):
+            return data.summary()
+        
         if data.empty:
             return {}
         
         summary = {}
         for ticker in data['Ticker'].unique():
-            ticker_data = data[data['Ticker'] == ticker]
-            summary[ticker] = {
-                'records_count': len(ticker_data),
-                'date_range': f"{ticker_data['Date'].min()} to {ticker_data['Date'].max()}",
-                'avg_close_price': round(ticker_data['Close'].mean(), 2),
-                'price_change': round(ticker_data['Close'].iloc[-1] - ticker_data['Close'].iloc[0], 2),
-                'highest_price': round(ticker_data['High'].max(), 2),
-                'lowest_price': round(ticker_data['Low'].min(), 2)
-            }
+            summary[ticker] = ticker_summary(data[data['Ticker'] == ticker])
         
         return summary
     
-
-
+    def calculate_indicators(self, data: pd.DataFrame, params: Dict = None) -> pd.DataFrame:
+        """
+        Work out technical indicators (SMA, EMA, RSI, MACD, Bollinger bands,
+        volatility, drawdown) for every stock in the data
+        
+        Args:
+            data: The stock data from combine_stock_data
+            params: Optional indicator settings (see indicators.DEFAULT_PARAMS)
+            
+        Returns:
+            One row per ticker and date with the indicator columns
+        """
+        # Results are cached per ticker, date range and settings
+        return INDICATOR_ENGINE.compute(data, params)
+    
+    def generate_indicator_report(self, data: pd.DataFrame, params: Dict = None) -> Dict:
+        """
+        Latest indicator values for each stock
+        
+        Args:
+            data: The stock data from combine_stock_data
+            params: Optional indicator settings
+            
+        Returns:
+            A dictionary of indicator values for each stock
+        """
+        return latest_values(self.calculate_indicators(data, params))
+    
+    def update_indicators(self, new_data: pd.DataFrame) -> Dict:
+        """
+        Bring SMA, EMA, RSI and volatility up to date with newly fetched bars
+        
+        Only bars newer than the last one seen for each ticker are processed,
+        so a daily refresh doesn't go back over years of history
+        
+        Args:
+            new_data: Stock data with the new bars (older rows are skipped)
+            
+        Returns:
+            A dictionary of current indicator values for each stock
+        """
+        return self.indicator_state.update(new_data)
+    
+    def save_indicator_state(self, saving_path: str, filename: str = "indicator_state.pkl") -> str:
+        """
+        Save the rolling indicator state next to the stock data
+        
+        Args:
+            saving_path: Folder to save the state in
+            filename: What to call the file
+            
+        Returns:
+            The full path of the saved file
+        """
+        full_path = os.path.join(saving_path, filename)
+        self.indicator_state.save(full_path)
+        return full_path
+    
+    def load_indicator_state(self, path: str) -> None:
+        """
+        Pick up rolling indicator state saved by save_indicator_state
+        
+        Args:
+            path: The saved state file
+        """
+        self.indicator_state = IncrementalIndicators.load(path)
+    
+    def analyze_returns(self, data: pd.DataFrame, benchmark: str = None) -> Dict:
+        """
+        Compare the stocks with each other: log returns, correlation and
+        covariance matrices, and beta against a benchmark
+        
+        Args:
+            data: The stock data from combine_stock_data
+            benchmark: Ticker to measure beta against (needs to be in the data)
+            
+        Returns:
+            The results from returns_analysis.analyze_returns
+        """
+        return analyze_returns(data, benchmark)
+    
+    def build_correlation_heatmap(self, correlation: pd.DataFrame):
+        """
+        Draw a correlation matrix as a heatmap without saving it
+        
+        Args:
+            correlation: Square correlation DataFrame (tickers on both axes)
+            
+        Returns:
+            The matplotlib figure (close it with plt.close when done)
+        """
+        import matplotlib.pyplot as plt
+        
+        size = len(correlation)
+        fig, ax = plt.subplots(figsize=(min(4 + size * 0.4, 14), min(3 + size * 0.4, 12)))
+        image = ax.imshow(correlation.to_numpy(), cmap='RdBu_r', vmin=-1, vmax=1,
+                          interpolation='nearest')
+        fig.colorbar(image, ax=ax, label='Correlation')
+        
+        # Labels are unreadable past a few dozen tickers, so leave them off
+        if size <= 40:
+            ax.set_xticks(range(size))
+            ax.set_yticks(range(size))
+            ax.set_xticklabels(correlation.columns, rotation=90)
+            ax.set_yticklabels(correlation.index)
+        else:
+            ax.set_xticks([])
+            ax.set_yticks([])
+            ax.set_xlabel(f'{size} tickers')
+        
+        ax.set_title('Daily Log Return Correlation')
+        fig.tight_layout()
+        
+        return fig
+    
+    def create_correlation_heatmap_bytes(self, correlation: pd.DataFrame, dpi: int = 150) -> bytes:
+        """
+        Make the correlation heatmap in memory
+        
+        Args:
+            correlation: Square correlation DataFrame
+            dpi: Image resolution
+            
+        Returns:
+            The heatmap as PNG bytes (empty if there was nothing to plot)
+        """
+        if correlation.empty:
+            return b""
+        
+        import io
+        import matplotlib.pyplot as plt
+        
+        fig = self.build_correlation_heatmap(correlation)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+        
+        return buffer.getvalue()
+    
+    def backtest_portfolio(self, data: pd.DataFrame, weights=None, schedule: str = "monthly",
+                           cost_bps: float = 0.0) -> Dict:
+        """
+        Test how a portfolio of the stocks would have done
+        
+        Args:
+            data: The stock data from combine_stock_data
+            weights: Target weights, e.g. {"AAPL": 0.6, "MSFT": 0.4}
+                (None for equal weights; see backtest.weight_matrix)
+            schedule: How often to rebalance ("never", "daily", "weekly",
+                "monthly", "quarterly", "yearly")
+            cost_bps: Trading cost in basis points
+            
+        Returns:
+            The results from backtest.backtest (metrics, equity curve, ...)
+        """
+        return backtest(data, weights, schedule, cost_bps=cost_bps)
+    
+    def generate_indicator_report_from_store(self, store: PriceStore, tickers: List[str] = None,
+                                             batch_size: int = 200, params: Dict = None) -> Dict:
+        """
+        Latest indicator values for stocks in a price store
+        
+        Tickers are loaded a batch at a time, so memory use depends on
+        batch_size rather than on how many tickers the store holds
+        
+        Args:
+            store: An open PriceStore
+            tickers: Which stocks (all of them if None)
+            batch_size: Tickers loaded at once
+            params: Optional indicator settings
+            
+        Returns:
+            A dictionary of indicator values for each stock
+        """
+        report = {}
+        for batch in store.batches(batch_size, tickers, columns=["Close"]):
+            report.update(latest_values(self.calculate_indicators(batch, params)))
+        return report
 
 
@@ -0,0 +1,181 @@
+"""
+Compact finance context for LLM prompts
+Turns StockDataAnalyzer outputs into short text for a prompt. A DataFrame
+dump (to_string or CSV) of a year of daily bars costs thousands of tokens,
+and every one of them adds prefill time and cost. Instead the encoder
+writes key statistics per ticker, optional indicator, return and backtest
+figures, and a downsampled close series. Numbers are rounded to a fixed
+number of significant digits, and everything is kept under a token budget.
+
+Token counts are estimated: numbers count as one token per three digits
+and words as roughly one token each, which is close to what BPE tokenizers
+do for this kind of text.
+"""
+
+import math
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from returns_analysis import top_pairs
+
+# Pieces a BPE tokenizer typically turns into one token each
+TOKEN_PATTERN = re.compile(r"\d{1,3}|[A-Za-z]{1,8}|[^\sA-Za-z\d]")
+
+DEFAULT_BUDGET = 400
+SIGNIFICANT_DIGITS = 5
+# Fewest points worth sending as a series (fewer says nothing the stats don't)
+MIN_SERIES_POINTS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a piece of text"""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def fmt(value, decimals: int = 2) -> str:
+    """
+    Round a number for a prompt
+
+    Keeps at most SIGNIFICANT_DIGITS digits and at most `decimals` decimal
+    places, so 38123.42 is sent as 38123 and 0.123456 as 0.12.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "n/a"
+    value = float(value)
+    digits = len(str(int(abs(value)))) if abs(value) >= 1 else 1
+    return f"{value:.{max(0, min(decimals, SIGNIFICANT_DIGITS - digits))}f}"
+
+
+def downsample(length: int, points: int) -> np.ndarray:
+    """Evenly spread row positions, always keeping the first and last row"""
+    if points >= length:
+        return np.arange(length)
+    return np.unique(np.linspace(0, length - 1, points).round().astype(int))
+
+
+def ticker_stats(ticker: str, rows: pd.DataFrame, decimals: int) -> str:
+    """One line of key figures for a ticker"""
+    close = rows["Close"].to_numpy(dtype=float)
+    first, last = close[0], close[-1]
+    change = (last / first - 1) * 100 if first else 0.0
+    dates = rows["Date"]
+    return (f"{ticker} {str(dates.iloc[0])[:10]}..{str(dates.iloc[-1])[:10]} {len(rows)}d: "
+            f"first {fmt(first, decimals)} last {fmt(last, decimals)} chg {change:+.1f}% "
+            f"hi {fmt(rows['High'].max(), decimals)} lo {fmt(rows['Low'].min(), decimals)} "
+            f"avg {fmt(close.mean(), decimals)}")
+
+
+def series_line(rows: pd.DataFrame, points: int, decimals: int) -> str:
+    """A downsampled close series as one line"""
+    positions = downsample(len(rows), points)
+    close = rows["Close"].to_numpy(dtype=float)[positions]
+    step = max(1, round((len(rows) - 1) / max(len(positions) - 1, 1)))
+    return f"  close every ~{step}d: " + " ".join(fmt(value, decimals) for value in close)
+
+
+def indicator_line(values: Dict, decimals: int) -> str:
+    """Latest indicator values as one line"""
+    return "  ind: " + " ".join(f"{name} {fmt(value, decimals)}" for name, value in values.items()
+                               if name != "Close" and value == value)
+
+
+def returns_lines(returns: Dict, decimals: int, pairs: int = 3) -> List[str]:
+    """Per-ticker return figures and the most/least correlated pairs"""
+    lines = []
+    per_ticker = returns.get("per_ticker")
+    if per_ticker is not None and not per_ticker.empty:
+        for ticker, row in per_ticker.iterrows():
+            lines.append(f"{ticker} returns: " + " ".join(f"{name} {fmt(value, decimals)}"
+                                                          for name, value in row.items()))
+    correlation = returns.get("correlation")
+    if correlation is not None and len(correlation) > 1:
+        lines.append("corr: " + ", ".join(f"{a}/{b} {fmt(value, decimals)}"
+                                          for a, b, value in top_pairs(correlation, pairs)))
+    return lines
+
+
+def backtest_line(backtest: Dict, decimals: int) -> str:
+    """Backtest metrics (first portfolio) as one line"""
+    metrics = backtest["metrics"].iloc[0]
+    return "backtest: " + " ".join(f"{name} {fmt(value, decimals)}" for name, value in metrics.items())
+
+
+def encode_finance_context(data: pd.DataFrame, budget: int = DEFAULT_BUDGET,
+                           indicators: Optional[Dict] = None, returns: Optional[Dict] = None,
+                           backtest: Optional[Dict] = None, decimals: int = 2) -> str:
+    """
+    Encode finance results as compact text under a token budget
+
+    Statistics come first, then indicators, returns and backtest figures;
+    whatever budget is left is shared out as downsampled close series. When
+    even the figures don't fit, the optional sections are dropped first and
+    then tickers (their count is still mentioned); the first ticker's
+    figures are always kept, even over a tiny budget.
+
+    Args:
+        data: Stock data from combine_stock_data
+        budget: Most (estimated) tokens the text may use
+        indicators: Output of generate_indicator_report
+        returns: Output of analyze_returns
+        backtest: Output of backtest_portfolio
+        decimals: Most decimal places for any number
+
+    Returns:
+        The text (empty if there is no data)
+    """
+    if data is None or data.empty:
+        return ""
+
+    groups = [(ticker, rows) for ticker, rows in data.groupby("Ticker", sort=False)]
+
+    def render(tickers, with_indicators: bool, with_extras: bool, series: Dict[str, int] = None) -> str:
+        lines = ["Daily prices (rounded; d = trading days):"]
+        for ticker, rows in tickers:
+            lines.append(ticker_stats(ticker, rows, decimals))
+            if with_indicators and indicators and ticker in indicators:
+                lines.append(indicator_line(indicators[ticker], decimals))
+            if series and ticker in series:
+                lines.append(series_line(rows, series[ticker], decimals))
+        if with_extras and returns:
+            lines += returns_lines(returns, decimals)
+        if with_extras and backtest:
+            lines.append(backtest_line(backtest, decimals))
+        if len(tickers) < len(groups):
+            lines.append(f"(+{len(groups) - len(tickers)} more tickers not shown)")
+        return "\n".join(lines)
+
+    # Drop the optional sections, then tickers, until the figures fit
+    kept, with_indicators, with_extras = groups, True, True
+    if estimate_tokens(render(kept, True, True)) > budget:
+        with_extras = False
+    if estimate_tokens(render(kept, True, False)) > budget:
+        with_indicators = False
+    while estimate_tokens(render(kept, with_indicators, with_extras)) > budget and len(kept) > 1:
+        kept = kept[:-1]
+    text = render(kept, with_indicators, with_extras)
+
+    # Share what is left between the tickers' close series
+    spare = budget - estimate_tokens(text)
+    series = {}
+    for ticker, rows in kept:
+        point_tokens = max(estimate_tokens(" " + fmt(rows["Close"].median(), decimals)), 1)
+        overhead = estimate_tokens(series_line(rows.iloc[:1], 1, decimals)) - point_tokens + 1
+        points = min(len(rows), (spare // len(kept) - overhead) // point_tokens)
+        if points >= MIN_SERIES_POINTS:
+            series[ticker] = points
+
+    while series:
+        with_series = render(kept, with_indicators, with_extras, series)
+        if estimate_tokens(with_series) <= budget:
+            return with_series
+        # The per-point estimate was a little short; trim every series by a fifth
+        series = {t: int(p * 0.8) for t, p in series.items() if int(p * 0.8) >= MIN_SERIES_POINTS}
+    return text
+
+
+def raw_dump(data: pd.DataFrame, how: str = "to_string") -> str:
+    """The naive way of putting data in a prompt, for comparison ("to_string" or "csv")"""
+    return data.to_csv(index=False) if how == "csv" else data.to_string(index=False)
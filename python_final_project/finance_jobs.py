@@ -0,0 +1,358 @@
+"""
+Background finance jobs
+Runs the StockDataAnalyzer pipeline on worker threads so the caller
+(e.g. a Streamlit session) can poll for progress instead of blocking
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from csv_export import CSVExportWriter
+from finance_analysis import StockDataAnalyzer
+from price_cache import FAILED_FETCHES
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# pyplot keeps global state, so without a chart pool the job threads
+# draw one chart at a time
+_chart_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested"""
+    pass
+
+
+class FinanceJob:
+    """
+    One analysis request and everything known about its progress
+    Workers update it; readers should use snapshot() for a consistent view
+    """
+
+    def __init__(self, job_id: str, tickers: List[str], start_time: str, end_time: str,
+                 saving_path: str, make_csv: bool, make_chart: bool, save_chart: bool = False,
+                 make_indicators: bool = False, make_returns: bool = False,
+                 benchmark: str = None, make_heatmap: bool = False,
+                 backtest_options: Optional[Dict] = None, interval: str = "1d",
+                 stream_csv: bool = False, csv_partition: bool = False):
+        self.job_id = job_id
+        # The benchmark has to be downloaded too for beta, but it isn't part
+        # of the portfolio
+        self.portfolio_tickers = tickers
+        if make_returns and benchmark and benchmark not in tickers:
+            tickers = tickers + [benchmark]
+        self.tickers = tickers
+        self.start_time = start_time
+        self.end_time = end_time
+        self.interval = interval
+        self.saving_path = saving_path
+        self.make_csv = make_csv
+        self.stream_csv = make_csv and stream_csv
+        self.csv_partition = csv_partition
+        self.make_chart = make_chart
+        self.save_chart = make_chart and save_chart
+        self.make_indicators = make_indicators
+        self.make_returns = make_returns
+        self.benchmark = benchmark if make_returns else None
+        self.make_heatmap = make_returns and make_heatmap
+        self.backtest_options = backtest_options
+        # A streamed CSV-only job never needs every ticker in memory at once
+        self.keep_data = (not self.stream_csv or make_chart or make_indicators
+                          or make_returns or backtest_options is not None)
+
+        self.status = QUEUED
+        self.stage = "queued"
+        self.current_ticker = ""
+        self.completed_steps = 0
+        # One step per ticker fetch, plus combine and summary, plus each output
+        self.total_steps = (len(tickers) + 2 + int(make_csv) + int(make_chart)
+                            + int(self.save_chart) + int(make_indicators)
+                            + int(self.make_returns) + int(self.make_heatmap)
+                            + int(backtest_options is not None))
+        self.result: Dict = {}
+        self.error = ""
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+
+    def update(self, stage: str, ticker: str = "", step_done: bool = False) -> None:
+        """Record what the worker is doing now"""
+        with self.lock:
+            self.stage = stage
+            self.current_ticker = ticker
+            if step_done:
+                self.completed_steps += 1
+
+    def check_cancelled(self) -> None:
+        """Stop the job at the next safe point if it was cancelled"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def cancel(self) -> None:
+        """Ask the job to stop (it finishes the step it is on first)"""
+        self.cancel_event.set()
+
+    def snapshot(self) -> Dict:
+        """
+        Copy of the job's state for display
+
+        Returns:
+            Status, stage, progress fraction, result and error
+        """
+        with self.lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "stage": self.stage,
+                "ticker": self.current_ticker,
+                "progress": self.completed_steps / self.total_steps if self.total_steps else 1.0,
+                "completed_steps": self.completed_steps,
+                "total_steps": self.total_steps,
+                "result": dict(self.result),
+                "error": self.error,
+            }
+
+
+class FinanceJobRunner:
+    """
+    Thread pool that runs finance jobs and remembers recent ones
+    """
+
+    def __init__(self, max_workers: int = 2, fetch: Callable = None, keep: int = 100,
+                 chart_pool=None):
+        """
+        Args:
+            max_workers: Jobs allowed to run at the same time
+            fetch: Function (ticker, start, end, interval) -> DataFrame or None used to
+                download prices; defaults to StockDataAnalyzer.fetch_stock_data
+            keep: Finished jobs remembered before the oldest are dropped
+            chart_pool: Optional chart_pool.ChartRenderPool; charts are then
+                drawn in worker processes instead of one at a time on the
+                job threads
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="finance-job")
+        self.fetch = fetch
+        self.chart_pool = chart_pool
+        self.keep = keep
+        self.jobs: Dict[str, FinanceJob] = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def submit(self, tickers: List[str], start_time: str, end_time: str, saving_path: str,
+               make_csv: bool = True, make_chart: bool = False, save_chart: bool = False,
+               make_indicators: bool = False, make_returns: bool = False,
+               benchmark: str = None, make_heatmap: bool = False,
+               backtest_options: Optional[Dict] = None, interval: str = "1d",
+               stream_csv: bool = False, csv_partition: bool = False) -> str:
+        """
+        Queue an analysis
+
+        Args:
+            tickers: Stock symbols (duplicates already removed)
+            start_time: Start date (YYYY-MM-DD)
+            end_time: End date (YYYY-MM-DD)
+            saving_path: Folder for the CSV and chart
+            make_csv: Whether to save the combined data as CSV
+            make_chart: Whether to draw the price chart (kept in memory as PNG bytes)
+            save_chart: Whether to also save the chart to saving_path
+            make_indicators: Whether to work out technical indicators
+            make_returns: Whether to run the cross-ticker returns/correlation analysis
+            benchmark: Ticker to measure beta against (fetched if not in tickers)
+            make_heatmap: Whether to draw the correlation heatmap
+            backtest_options: Run a portfolio backtest with these settings:
+                weights ({ticker: weight} or None for equal), schedule,
+                cost_bps and sweep (number of random portfolios to also try)
+            interval: Bar size (1m, 5m, 15m, 30m, 1h, 1d, 1wk or 1mo)
+            stream_csv: Append each ticker to the CSV as soon as it is fetched
+                instead of saving everything at the end
+            csv_partition: With stream_csv, write one CSV per ticker into a folder
+
+        Returns:
+            The job id to poll with get()
+        """
+        job = FinanceJob(f"job-{next(self.ids)}", tickers, start_time, end_time,
+                         saving_path, make_csv, make_chart, save_chart, make_indicators,
+                         make_returns, benchmark, make_heatmap, backtest_options, interval,
+                         stream_csv, csv_partition)
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self._forget_old_jobs()
+        self.executor.submit(self._run, job)
+        return job.job_id
+
+    def get(self, job_id: str) -> Optional[FinanceJob]:
+        """Look up a job (None if unknown or already forgotten)"""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job; returns False if there is no such job"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def _forget_old_jobs(self) -> None:
+        """Drop the oldest finished jobs once more than `keep` are stored"""
+        finished = [job for job in self.jobs.values() if job.finished is not None]
+        for job in sorted(finished, key=lambda j: j.finished)[:max(0, len(self.jobs) - self.keep)]:
+            del self.jobs[job.job_id]
+
+    def _backtest(self, analyzer: StockDataAnalyzer, data: pd.DataFrame, job: FinanceJob) -> Dict:
+        """Run the requested backtest and keep only what the page shows"""
+        from backtest import sweep
+
+        options = job.backtest_options
+        data = data[data["Ticker"].isin(job.portfolio_tickers)]
+        schedule = options.get("schedule", "monthly")
+        cost_bps = options.get("cost_bps", 0.0)
+        results = analyzer.backtest_portfolio(data, options.get("weights"), schedule, cost_bps)
+        summary = {
+            "metrics": results["metrics"].iloc[0].to_dict(),
+            "equity": pd.DataFrame({"Portfolio": results["equity"][:, 0],
+                                    "Drawdown": results["drawdown"][:, 0]},
+                                   index=results["dates"]),
+            "weights": {t: round(float(w), 3) for t, w in zip(results["tickers"], results["weights"][0])},
+            "rebalances": len(results["rebalance_dates"]),
+        }
+        if options.get("sweep"):
+            summary["sweep"] = sweep(data, options["sweep"], schedule, cost_bps)
+        return summary
+
+    def _failure_reasons(self, failed_tickers: List[str], job: FinanceJob) -> Dict[str, str]:
+        """Why each ticker failed, as remembered by the negative cache"""
+        return {ticker: FAILED_FETCHES.reason(ticker, job.interval) or "error" for ticker in failed_tickers}
+
+    def _run(self, job: FinanceJob) -> None:
+        """Worker: fetch each ticker, then build the requested outputs"""
+        analyzer = StockDataAnalyzer()
+        fetch = self.fetch or analyzer.fetch_stock_data
+        failed_tickers = []
+        writer = None
+        with job.lock:
+            job.status = RUNNING
+        try:
+            if job.stream_csv:
+                writer = CSVExportWriter(job.saving_path, partition=job.csv_partition)
+            frames = []
+            for ticker in job.tickers:
+                job.check_cancelled()
+                job.update("fetching", ticker)
+                data = fetch(ticker, job.start_time, job.end_time, job.interval)
+                if data is None:
+                    failed_tickers.append(ticker)
+                else:
+                    if writer is not None:
+                        writer.append(ticker, data)
+                    if job.keep_data:
+                        frames.append(data)
+                job.update("fetching", ticker, step_done=True)
+
+            job.check_cancelled()
+            job.update("combining")
+            combined_data = analyzer.assemble_stock_data(frames)
+            job.update("combining", step_done=True)
+            records = writer.records if writer is not None else len(combined_data)
+            result = {"failed_tickers": failed_tickers, "records": records,
+                      "failure_reasons": self._failure_reasons(failed_tickers, job)}
+
+            if records == 0:
+                raise ValueError("No valid data was fetched for any ticker.")
+
+            if writer is not None:
+                job.update("saving CSV")
+                result["csv_path"] = writer.close()
+                result["first_write_seconds"] = writer.first_write_seconds
+                job.update("saving CSV", step_done=True)
+            elif job.make_csv:
+                job.check_cancelled()
+                job.update("saving CSV")
+                result["csv_path"] = analyzer.save_data_to_csv(combined_data, job.saving_path)
+                job.update("saving CSV", step_done=True)
+
+            if job.make_chart:
+                job.check_cancelled()
+                job.update("drawing chart")
+                if self.chart_pool is not None:
+                    result["chart_png"] = self.chart_pool.render(combined_data, dpi=150)
+                else:
+                    with _chart_lock:
+                        result["chart_png"] = analyzer.create_stock_chart_bytes(combined_data)
+                job.update("drawing chart", step_done=True)
+
+            if job.save_chart:
+                job.check_cancelled()
+                job.update("saving chart")
+                if self.chart_pool is not None:
+                    result["chart_path"] = self.chart_pool.render(combined_data, job.saving_path)
+                else:
+                    with _chart_lock:
+                        result["chart_path"] = analyzer.create_stock_chart(combined_data, job.saving_path)
+                job.update("saving chart", step_done=True)
+
+            if job.make_indicators:
+                job.check_cancelled()
+                job.update("computing indicators")
+                result["indicators"] = analyzer.generate_indicator_report(combined_data)
+                job.update("computing indicators", step_done=True)
+
+            if job.make_returns:
+                job.check_cancelled()
+                job.update("computing correlations")
+                result["returns"] = analyzer.analyze_returns(combined_data, job.benchmark)
+                job.update("computing correlations", step_done=True)
+
+            if job.make_heatmap:
+                job.check_cancelled()
+                job.update("drawing heatmap")
+                correlation = result["returns"]["correlation"]
+                if self.chart_pool is not None:
+                    result["heatmap_png"] = self.chart_pool.submit_heatmap(correlation).result()
+                else:
+                    with _chart_lock:
+                        result["heatmap_png"] = analyzer.create_correlation_heatmap_bytes(correlation)
+                job.update("drawing heatmap", step_done=True)
+
+            if job.backtest_options is not None:
+                job.check_cancelled()
+                job.update("backtesting")
+                result["backtest"] = self._backtest(analyzer, combined_data, job)
+                job.update("backtesting", step_done=True)
+
+            job.check_cancelled()
+            job.update("summarizing")
+            if job.keep_data:
+                result["summary"] = analyzer.generate_summary_report(combined_data)
+            else:
+                result["summary"] = writer.summary
+            job.update("done", step_done=True)
+
+            with job.lock:
+                job.result = result
+                job.status = DONE
+        except JobCancelled:
+            with job.lock:
+                job.status = CANCELLED
+                job.stage = "cancelled"
+        except Exception as e:
+            with job.lock:
+                job.status = FAILED
+                job.error = str(e)
+                job.result = {"failed_tickers": failed_tickers,
+                              "failure_reasons": self._failure_reasons(failed_tickers, job)}
+        finally:
+            if writer is not None and not writer.finished:
+                writer.abort()
+            job.finished = time.time()
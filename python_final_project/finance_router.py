@@ -0,0 +1,320 @@
+"""
+Finance intent router for the chatbot
+Spots chat messages like "how did AAPL do in 2023" with compiled patterns
+and answers them from real prices (the shared price cache and the summary
+report) instead of letting the LLM guess. Only confident matches (a $TICKER,
+or a ticker next to a price or performance term) are answered directly,
+with no LLM call; questions that also want an opinion or an explanation get
+a short block of the real figures added to the prompt. Looser matches
+(a ticker next to a word like "up" or "high") only ever add figures that
+are already cached, so a false alarm costs neither a download nor a wrong
+canned reply. The chatbot only uses the router when it is switched on.
+
+Only the symbol index is loaded to recognise a question; pandas and
+finance_analysis are imported the first time one is actually answered.
+"""
+
+import calendar
+import re
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from symbols import get_symbol_index
+
+# Price and performance terms: with one of these a capitalised ticker is
+# clearly meant as a stock, not e.g. "IT" or "AMD did X"
+FINANCE_WORDS = re.compile(
+    r"\b(stocks?|shares?|share price|price[sd]?|closed|closing|traded|trading|market cap|"
+    r"perform(ed|ing|ance)|returns?|gain(ed|s)?|rall(y|ied)|ytd|year to date|volatil(e|ity)|"
+    r"rsi|macd|sma|ema|bollinger|moving averages?|indicators?|momentum|drawdown)\b",
+    re.IGNORECASE)
+
+# "How did X do / has X done": a performance question even without a price word
+PERFORMANCE_QUESTION = re.compile(
+    r"\bhow (did|has|have|is|was)\s+\S+(\s+and\s+\S+)*\s+(do|done|doing|perform(ed|ing)?)\b",
+    re.IGNORECASE)
+
+# Words that often mean markets but just as often don't ("up", "high",
+# "buy"); on their own they only add already-cached figures to the prompt
+MAYBE_FINANCE_WORDS = re.compile(
+    r"\b(up|down|high(est)?|low(est)?|open(ed)?|close|trade|los[st]|drop(ped)?|fell|rose|"
+    r"worth|buy|sell|invest(ing|ment)?)\b",
+    re.IGNORECASE)
+
+# Questions asking for technical indicators rather than a price summary
+INDICATOR_WORDS = re.compile(
+    r"\b(rsi|macd|sma|ema|bollinger|moving averages?|indicators?|momentum|drawdown|volatil(e|ity))\b",
+    re.IGNORECASE)
+
+# Questions that need the LLM to reason about the numbers, not just state them
+REASONING_WORDS = re.compile(
+    r"\b(why|should|would|could|predict(ion)?|forecast|expect|think|opinion|recommend|"
+    r"explain|buy|sell|hold|invest(ing|ment)?|compare|better|worse|outlook|risk[sy]?)\b",
+    re.IGNORECASE)
+
+# $aapl in any case, ^GSPC, or a word of two or more capitals (BRK.B, BRK-B
+# too); one-letter symbols like F or T only count with a $
+TICKER_PATTERN = re.compile(r"\$([A-Za-z][A-Za-z.\-]{0,9})\b|(\^[A-Za-z]{2,6})\b|\b([A-Z][A-Z0-9]{1,5}(?:[.\-][A-Z])?)\b")
+
+# LaTeX-style maths ($$...$$, or $...$ with an operator inside), whose
+# letters aren't tickers even with a $ in front
+MATH_SPAN = re.compile(r"\$\$.*?\$\$|\$[^$\n]*[=^_\\{}+*/][^$\n]*\$", re.DOTALL)
+
+# Capitalised words that are much more likely English than a ticker
+NOT_TICKERS = frozenset("""
+A I AM AN AND ARE AS AT BE BY CAN DO FOR GO HE HI IF IN IS IT ME MY NO NOT NOW OF OK
+ON OR SO THE TO UP US WE YOU ALL ANY HOW WHO WHY YTD CEO USD EPS ETF IPO AI
+""".split())
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+
+ISO_DATE = r"(\d{4}-\d{2}-\d{2})"
+YEAR = r"((?:19|20)\d{2})"
+UNITS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+DATE_RANGE = re.compile(rf"\b(?:from|between)\s+{ISO_DATE}\s+(?:to|and|until)\s+{ISO_DATE}\b", re.IGNORECASE)
+YEAR_RANGE = re.compile(rf"\b(?:from|between)?\s*{YEAR}\s*(?:-|to|and|until)\s*{YEAR}\b", re.IGNORECASE)
+SINCE = re.compile(rf"\bsince\s+(?:{ISO_DATE}|{YEAR})\b", re.IGNORECASE)
+QUARTER = re.compile(rf"\bq([1-4])\s*(?:of\s+)?{YEAR}\b", re.IGNORECASE)
+MONTH_YEAR = re.compile(rf"\b({MONTH_NAMES})\.?\s+{YEAR}\b", re.IGNORECASE)
+TRAILING = re.compile(r"\b(?:last|past|previous)\s+(\d+)\s+(day|week|month|year)s?\b", re.IGNORECASE)
+LAST_ONE = re.compile(r"\b(last|past|this)\s+(week|month|year)\b", re.IGNORECASE)
+YEAR_TO_DATE = re.compile(r"\b(ytd|year to date)\b", re.IGNORECASE)
+SINGLE_YEAR = re.compile(rf"\b{YEAR}\b")
+
+# How far back to look when the question gives no time period
+DEFAULT_LOOKBACK_DAYS = 365
+
+
+def parse_period(text: str, today: date = None) -> Tuple[date, date, str]:
+    """
+    Find the time period a question asks about
+
+    Args:
+        text: The user's message
+        today: For testing; defaults to today
+
+    Returns:
+        (start, end, label) with end exclusive like yfinance and never
+        past tomorrow; the past year when no period is mentioned
+    """
+    today = today or date.today()
+
+    def clip(start: date, end: date, label: str) -> Tuple[date, date, str]:
+        return start, min(end, today + timedelta(days=1)), label
+
+    if match := DATE_RANGE.search(text):
+        start, end = date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2))
+        return clip(start, end + timedelta(days=1), f"from {start} to {end}")
+    if match := SINCE.search(text):
+        start = date.fromisoformat(match.group(1)) if match.group(1) else date(int(match.group(2)), 1, 1)
+        return clip(start, today + timedelta(days=1), f"since {match.group(1) or match.group(2)}")
+    if match := QUARTER.search(text):
+        quarter, year = int(match.group(1)), int(match.group(2))
+        start = date(year, 3 * quarter - 2, 1)
+        end = date(year + 1, 1, 1) if quarter == 4 else date(year, 3 * quarter + 1, 1)
+        return clip(start, end, f"in Q{quarter} {year}")
+    if match := MONTH_YEAR.search(text):
+        month, year = MONTHS[match.group(1).lower()], int(match.group(2))
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return clip(date(year, month, 1), end, f"in {calendar.month_name[month]} {year}")
+    if match := YEAR_RANGE.search(text):
+        first, last = sorted((int(match.group(1)), int(match.group(2))))
+        return clip(date(first, 1, 1), date(last + 1, 1, 1), f"from {first} to {last}")
+    if match := TRAILING.search(text):
+        count, unit = int(match.group(1)), match.group(2).lower()
+        return clip(today - timedelta(days=count * UNITS[unit]), today + timedelta(days=1),
+                    f"over the past {count} {unit}{'s' if count != 1 else ''}")
+    if YEAR_TO_DATE.search(text):
+        return clip(date(today.year, 1, 1), today + timedelta(days=1), "so far this year")
+    if match := LAST_ONE.search(text):
+        which, unit = match.group(1).lower(), match.group(2).lower()
+        if unit == "week":
+            return clip(today - timedelta(days=7), today + timedelta(days=1), "over the past week")
+        if unit == "month":
+            first = today.replace(day=1)
+            if which == "this":
+                return clip(first, today + timedelta(days=1), "this month")
+            previous = (first - timedelta(days=1)).replace(day=1)
+            return clip(previous, first, f"in {calendar.month_name[previous.month]} {previous.year}")
+        if which == "this":
+            return clip(date(today.year, 1, 1), today + timedelta(days=1), "so far this year")
+        if which == "last":
+            return clip(date(today.year - 1, 1, 1), date(today.year, 1, 1), f"in {today.year - 1}")
+        return clip(today - timedelta(days=365), today + timedelta(days=1), "over the past year")
+    if match := SINGLE_YEAR.search(text):
+        year = int(match.group(1))
+        return clip(date(year, 1, 1), date(year + 1, 1, 1), f"in {year}")
+    return clip(today - timedelta(days=DEFAULT_LOOKBACK_DAYS), today + timedelta(days=1),
+                "over the past year")
+
+
+class FinanceRouter:
+    """
+    Decides whether a chat message is a finance question and answers it
+    from local data
+    """
+
+    def __init__(self, fetch_missing: bool = True, max_tickers: int = 5, context_budget: int = 300,
+                 today: date = None):
+        """
+        Args:
+            fetch_missing: Download prices that aren't cached yet; False only
+                ever answers from the price cache (and leaves the rest to the LLM)
+            max_tickers: Most tickers one question may look up
+            context_budget: Most tokens of figures added to an LLM prompt
+            today: For testing; defaults to today
+        """
+        self.fetch_missing = fetch_missing
+        self.max_tickers = max_tickers
+        self.context_budget = context_budget
+        self.today = today
+        self.routed = 0
+        self.answered_directly = 0
+
+    def find_tickers(self, text: str) -> Tuple[List[str], bool]:
+        """
+        Symbols mentioned in a message, in the order they appear
+
+        Capitalised words only count when the symbol index knows them;
+        $TICKER and ^INDEX are taken as written, since they can't be
+        anything else (maths between dollar signs is skipped).
+
+        Args:
+            text: The user's message
+
+        Returns:
+            (symbols in the index's spelling without duplicates, whether
+            any was written as $TICKER or ^INDEX)
+        """
+        index = get_symbol_index()
+        tickers, explicit = [], False
+        for dollar, caret, capitals in TICKER_PATTERN.findall(MATH_SPAN.sub(" ", text)):
+            if capitals:
+                if capitals in NOT_TICKERS:
+                    continue
+                symbol = index.resolve(capitals)
+            elif len(dollar) == 1 and dollar.islower():
+                continue  # $x is a variable, $X or $xom a ticker
+            else:
+                symbol = index.resolve(dollar or caret) or (dollar or caret).upper()
+                explicit = True
+            if symbol and symbol not in tickers:
+                tickers.append(symbol)
+        return tickers[:self.max_tickers], explicit
+
+    def match(self, text: str) -> Optional[Dict]:
+        """
+        Recognise a finance question without touching any price data
+
+        Args:
+            text: The user's message
+
+        Returns:
+            {"tickers", "start", "end", "label", "kind" ("summary" or
+            "indicators"), "confident" (may download prices), "direct"
+            (answer without the LLM)}, or None if this isn't a finance
+            question
+        """
+        confident = bool(FINANCE_WORDS.search(text) or PERFORMANCE_QUESTION.search(text))
+        if not confident and not MAYBE_FINANCE_WORDS.search(text) and "$" not in text:
+            return None
+        tickers, explicit = self.find_tickers(text)
+        if not tickers:
+            return None
+        confident = confident or explicit
+        start, end, label = parse_period(text, self.today)
+        if start >= end:
+            return None
+        return {
+            "tickers": tickers,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "label": label,
+            "kind": "indicators" if INDICATOR_WORDS.search(text) else "summary",
+            "confident": confident,
+            "direct": confident and not REASONING_WORDS.search(text),
+        }
+
+    def load_data(self, query: Dict):
+        """Prices for a matched question, from the price cache (downloading only if allowed and confident)"""
+        import pandas as pd
+        from finance_analysis import StockDataAnalyzer
+        from price_cache import PRICE_CACHE
+
+        analyzer = StockDataAnalyzer()
+        if self.fetch_missing and query["confident"]:
+            data = analyzer.combine_stock_data(query["tickers"], query["start"], query["end"])
+        else:
+            frames = [PRICE_CACHE.get(ticker, query["start"], query["end"], "1d", lambda *args: None)
+                      for ticker in query["tickers"]]
+            frames = [frame for frame in frames if frame is not None]
+            data = analyzer.assemble_stock_data(frames) if frames else pd.DataFrame()
+        return analyzer, data
+
+    def describe(self, query: Dict, analyzer, data) -> List[str]:
+        """
+        One line of real figures per ticker
+
+        Returns:
+            Lines like "AAPL in 2023: closed at 192.53, up 48.2% from 130.42 ..."
+        """
+        lines = []
+        summary = analyzer.generate_summary_report(data)
+        indicators = analyzer.generate_indicator_report(data) if query["kind"] == "indicators" else {}
+        for ticker in query["tickers"]:
+            if ticker not in summary:
+                lines.append(f"{ticker} {query['label']}: no price data available.")
+                continue
+            stats = summary[ticker]
+            close = data.loc[data["Ticker"] == ticker, "Close"]
+            first, last = float(close.iloc[0]), float(close.iloc[-1])
+            change = (last / first - 1) * 100 if first else 0.0
+            first_day, last_day = (str(part)[:10] for part in stats["date_range"].split(" to "))
+            line = (f"{ticker} {query['label']} ({first_day} to {last_day}, {stats['records_count']} trading days): "
+                    f"closed at {last:.2f}, {'up' if change >= 0 else 'down'} {abs(change):.1f}% from {first:.2f}; "
+                    f"high {stats['highest_price']:.2f}, low {stats['lowest_price']:.2f}, "
+                    f"average close {stats['avg_close_price']:.2f}.")
+            if ticker in indicators:
+                values = ", ".join(f"{name} {value}" for name, value in indicators[ticker].items()
+                                   if name != "Close" and value == value)
+                line += f" Latest indicators: {values}."
+            lines.append(line)
+        return lines
+
+    def route(self, text: str) -> Optional[Dict]:
+        """
+        Answer a message from local data if it is a finance question
+
+        Args:
+            text: The user's message
+
+        Returns:
+            None to leave the message to the LLM as usual, otherwise
+            {"query", "answer"} for a finished reply or {"query", "context"}
+            for real figures to put in the LLM prompt
+        """
+        query = self.match(text)
+        if query is None:
+            return None
+        try:
+            analyzer, data = self.load_data(query)
+        except Exception:
+            # Never let a data problem break the chat; the LLM still answers
+            return None
+        if data.empty:
+            return None
+
+        self.routed += 1
+        if query["direct"]:
+            self.answered_directly += 1
+            lines = self.describe(query, analyzer, data)
+            return {"query": query, "answer": "\n\n".join(lines) + "\n\n(From Yahoo Finance daily prices.)"}
+
+        # The LLM gets the figures plus the shape of the price path, within a token budget
+        from finance_context import encode_finance_context
+        indicators = analyzer.generate_indicator_report(data) if query["kind"] == "indicators" else None
+        context = encode_finance_context(data, self.context_budget, indicators)
+        return {"query": query, "context": f"Real market data for this question {query['label']}:\n{context}"}
@@ -0,0 +1,217 @@
+"""
+Finance tools the LLM can call
+Describes fetch / summary / indicator / price history lookups in the
+OpenAI "tools" format and runs the calls the model asks for against
+StockDataAnalyzer. Prices come through the shared price cache, so asking
+again for the same tickers costs no download. Several calls from one
+model turn run at the same time, and every result is cut down to a small
+JSON string before it goes back into the conversation.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List
+
+from symbols import get_symbol_index
+
+# Parameters shared by every tool
+RANGE_PARAMETERS = {
+    "tickers": {"type": "array", "items": {"type": "string"},
+                "description": "Stock symbols as used by Yahoo Finance, e.g. [\"AAPL\", \"MSFT\"]"},
+    "start": {"type": "string", "description": "First date, YYYY-MM-DD"},
+    "end": {"type": "string", "description": "Last date, YYYY-MM-DD (not included)"},
+}
+
+TOOL_SCHEMAS: List[Dict] = [
+    {
+        "type": "function",
+        "function": {
+            "name": "fetch_stock_data",
+            "description": "Check which tickers have daily price data for a date range, "
+                           "with their first and last closing prices",
+            "parameters": {"type": "object", "properties": RANGE_PARAMETERS,
+                           "required": ["tickers", "start", "end"]},
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_summary",
+            "description": "Price summary per ticker for a date range: trading days, average close, "
+                           "price change, highest and lowest price",
+            "parameters": {"type": "object", "properties": RANGE_PARAMETERS,
+                           "required": ["tickers", "start", "end"]},
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_indicators",
+            "description": "Latest technical indicators per ticker at the end of a date range: "
+                           "SMA, EMA, RSI, MACD, Bollinger bands, volatility and drawdown",
+            "parameters": {"type": "object", "properties": RANGE_PARAMETERS,
+                           "required": ["tickers", "start", "end"]},
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_price_history",
+            "description": "How the price moved over a date range: key figures per ticker plus "
+                           "a downsampled series of closing prices",
+            "parameters": {"type": "object", "properties": RANGE_PARAMETERS,
+                           "required": ["tickers", "start", "end"]},
+        },
+    },
+]
+
+
+def default_analyzer():
+    """A new StockDataAnalyzer (imported on first use, so chat-only sessions skip pandas)"""
+    from finance_analysis import StockDataAnalyzer
+    return StockDataAnalyzer()
+
+
+class FinanceTools:
+    """
+    Runs the model's tool calls locally
+    """
+
+    def __init__(self, max_workers: int = 4, max_tickers: int = 10, max_result_chars: int = 2000,
+                 history_budget: int = 400, analyzer_factory: Callable = default_analyzer):
+        """
+        Args:
+            max_workers: Tool calls run at the same time
+            max_tickers: Most tickers one call may ask for
+            max_result_chars: Longest result sent back to the model (longer
+                ones are cut and marked as truncated)
+            history_budget: Token budget of a get_price_history result
+            analyzer_factory: Makes the StockDataAnalyzer each call uses
+        """
+        self.max_workers = max_workers
+        self.max_tickers = max_tickers
+        self.max_result_chars = max_result_chars
+        self.history_budget = history_budget
+        self.analyzer_factory = analyzer_factory
+        self.calls = 0
+        self.tools: Dict[str, Callable] = {
+            "fetch_stock_data": self.fetch_stock_data,
+            "get_summary": self.get_summary,
+            "get_indicators": self.get_indicators,
+            "get_price_history": self.get_price_history,
+        }
+
+    def _load(self, tickers: List[str], start: str, end: str):
+        """Check the arguments and get the prices; returns (analyzer, data, notes for the model)"""
+        for value in (start, end):
+            date.fromisoformat(value)
+        if start >= end:
+            raise ValueError("start must be before end")
+
+        # Text that can't be a symbol is refused without a download. Symbols
+        # the local index doesn't list are fetched anyway, but likely typos are
+        # named up front, since a typo can still be a real (different) ticker
+        index = get_symbol_index()
+        resolved, unlisted, invalid = index.validate(tickers[:self.max_tickers])
+        notes = {}
+        if len(tickers) > self.max_tickers:
+            notes["skipped_tickers"] = tickers[self.max_tickers:]
+        if invalid:
+            notes["invalid_tickers"] = invalid
+        typos = index.typos(unlisted)
+        if typos:
+            notes["possible_typos"] = typos
+
+        analyzer = self.analyzer_factory()
+        data = analyzer.combine_stock_data(list(dict.fromkeys(resolved)), start, end) if resolved else None
+        if analyzer.failed_tickers:
+            notes["failed_tickers"] = {t: analyzer.failure_reasons.get(t, "error") for t in analyzer.failed_tickers}
+            suggestions = index.hints(analyzer.failed_tickers)
+            if suggestions:
+                notes["did_you_mean"] = suggestions
+        return analyzer, data, notes
+
+    def fetch_stock_data(self, tickers: List[str], start: str, end: str) -> Dict:
+        """Which tickers have data, with their first and last close"""
+        _, data, notes = self._load(tickers, start, end)
+        result = {}
+        if data is not None and not data.empty:
+            for ticker, rows in data.groupby("Ticker", sort=False):
+                result[ticker] = {
+                    "days": len(rows),
+                    "first": str(rows["Date"].iloc[0])[:10],
+                    "last": str(rows["Date"].iloc[-1])[:10],
+                    "first_close": round(float(rows["Close"].iloc[0]), 2),
+                    "last_close": round(float(rows["Close"].iloc[-1]), 2),
+                }
+        return {"data": result, **notes}
+
+    def get_summary(self, tickers: List[str], start: str, end: str) -> Dict:
+        """generate_summary_report for the tickers"""
+        analyzer, data, notes = self._load(tickers, start, end)
+        summary = analyzer.generate_summary_report(data) if data is not None else {}
+        for stats in summary.values():
+            first, last = stats["date_range"].split(" to ")
+            stats["date_range"] = f"{first[:10]} to {last[:10]}"
+        return {"summary": summary, **notes}
+
+    def get_indicators(self, tickers: List[str], start: str, end: str) -> Dict:
+        """generate_indicator_report for the tickers"""
+        analyzer, data, notes = self._load(tickers, start, end)
+        report = analyzer.generate_indicator_report(data) if data is not None and not data.empty else {}
+        # NaN (not enough history yet) isn't valid JSON
+        report = {ticker: {name: value for name, value in values.items() if value == value}
+                  for ticker, values in report.items()}
+        return {"indicators": report, **notes}
+
+    def get_price_history(self, tickers: List[str], start: str, end: str) -> Dict:
+        """Key figures and a downsampled close series, from finance_context"""
+        from finance_context import encode_finance_context
+        _, data, notes = self._load(tickers, start, end)
+        return {"history": encode_finance_context(data, self.history_budget), **notes}
+
+    def run(self, name: str, arguments: str) -> str:
+        """
+        Run one tool call
+
+        Args:
+            name: Tool name from TOOL_SCHEMAS
+            arguments: The model's arguments as a JSON string
+
+        Returns:
+            Compact JSON for the model; problems come back as {"error": ...}
+            so the model can correct itself instead of the chat failing
+        """
+        self.calls += 1
+        try:
+            if name not in self.tools:
+                raise ValueError(f"Unknown tool: {name}")
+            args = json.loads(arguments or "{}")
+            tickers = args.get("tickers") or []
+            if isinstance(tickers, str):
+                tickers = [t for t in tickers.replace(",", " ").split() if t]
+            result = self.tools[name]([str(t) for t in tickers], str(args.get("start", "")), str(args.get("end", "")))
+        except Exception as e:
+            result = {"error": str(e)}
+
+        text = json.dumps(result, separators=(",", ":"), default=str)
+        if len(text) > self.max_result_chars:
+            text = text[:self.max_result_chars] + "...(truncated)"
+        return text
+
+    def run_all(self, calls: List[Dict]) -> List[str]:
+        """
+        Run every tool call from one model turn, in parallel when there are several
+
+        Args:
+            calls: [{"id", "name", "arguments"}, ...]
+
+        Returns:
+            Results in the same order as the calls
+        """
+        if len(calls) == 1:
+            return [self.run(calls[0]["name"], calls[0]["arguments"])]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(calls)),
+                                thread_name_prefix="finance-tool") as pool:
+            return list(pool.map(lambda call: self.run(call["name"], call["arguments"]), calls))
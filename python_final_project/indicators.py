@@ -0,0 +1,401 @@
+"""
+Technical indicators for StockDataAnalyzer data
+Computes moving averages, EMA, RSI, MACD, Bollinger bands, rolling
+volatility and drawdown for every ticker at once with grouped pandas
+operations (no Python loops over rows). IncrementalIndicators keeps the
+rolling state per ticker so new bars can be added without going back over
+the whole history.
+"""
+
+import math
+import pickle
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PARAMS = {
+    "sma_windows": (20, 50),
+    "ema_spans": (12, 26),
+    "rsi_period": 14,
+    "macd": (12, 26, 9),           # fast span, slow span, signal span
+    "bollinger": (20, 2.0),        # window, number of standard deviations
+    "volatility_window": 20,
+    "trading_days": 252,           # used to annualise volatility
+}
+
+
+def params_key(params: Dict) -> Tuple:
+    """Hashable version of a params dict, for cache keys"""
+    return tuple(sorted((name, tuple(value) if isinstance(value, (list, tuple)) else value)
+                        for name, value in params.items()))
+
+
+def compute_indicators(data: pd.DataFrame, params: Dict = None) -> pd.DataFrame:
+    """
+    Add indicator columns to long-format stock data
+
+    Args:
+        data: Rows from combine_stock_data (needs Date, Ticker and Close)
+        params: Indicator settings; missing keys use DEFAULT_PARAMS
+
+    Returns:
+        Date, Ticker, Close plus one column per indicator, sorted by ticker
+        and date
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if data.empty:
+        return pd.DataFrame(columns=["Date", "Ticker", "Close"])
+
+    frame = (data[["Date", "Ticker", "Close"]]
+             .sort_values(["Ticker", "Date"], kind="stable")
+             .reset_index(drop=True))
+    tickers = frame["Ticker"]
+    close = frame["Close"].astype(np.float64)
+    by_ticker = close.groupby(tickers, sort=False)
+
+    def rolling(series: pd.Series, window: int):
+        # groupby().rolling() walks each ticker's rows once in compiled code
+        return series.groupby(tickers, sort=False).rolling(window, min_periods=window)
+
+    def ewm_mean(series: pd.Series, **kwargs) -> pd.Series:
+        return series.groupby(tickers, sort=False).ewm(adjust=False, **kwargs).mean().droplevel(0)
+
+    # Moving averages
+    for window in params["sma_windows"]:
+        frame[f"SMA_{window}"] = rolling(close, window).mean().droplevel(0)
+    for span in params["ema_spans"]:
+        frame[f"EMA_{span}"] = ewm_mean(close, span=span)
+
+    # RSI with Wilder's smoothing
+    period = params["rsi_period"]
+    change = by_ticker.diff()
+    avg_gain = ewm_mean(change.clip(lower=0), alpha=1 / period, min_periods=period)
+    avg_loss = ewm_mean(-change.clip(upper=0), alpha=1 / period, min_periods=period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    # No losses at all in the window means RSI is at its maximum
+    frame[f"RSI_{period}"] = rsi.where(avg_loss != 0, 100.0).where(avg_gain.notna())
+
+    # MACD
+    fast, slow, signal = params["macd"]
+    macd = ewm_mean(close, span=fast) - ewm_mean(close, span=slow)
+    frame["MACD"] = macd
+    frame["MACD_signal"] = ewm_mean(macd, span=signal)
+    frame["MACD_hist"] = frame["MACD"] - frame["MACD_signal"]
+
+    # Bollinger bands
+    window, width = params["bollinger"]
+    middle = rolling(close, window).mean().droplevel(0)
+    spread = rolling(close, window).std().droplevel(0) * width
+    frame["BB_middle"] = middle
+    frame["BB_upper"] = middle + spread
+    frame["BB_lower"] = middle - spread
+
+    # Annualised rolling volatility of log returns
+    log_returns = np.log(close).groupby(tickers, sort=False).diff()
+    window = params["volatility_window"]
+    frame[f"Volatility_{window}"] = (rolling(log_returns, window).std().droplevel(0)
+                                     * np.sqrt(params["trading_days"]))
+
+    # Drawdown from the running peak
+    frame["Drawdown"] = close / by_ticker.cummax() - 1
+
+    return frame
+
+
+def latest_values(indicators: pd.DataFrame, decimals: int = 2) -> Dict[str, Dict]:
+    """
+    Last row of indicators for each ticker
+
+    Args:
+        indicators: Output of compute_indicators
+        decimals: Rounding for display
+
+    Returns:
+        {ticker: {indicator: value}} with NaN for indicators that need more history
+    """
+    if indicators.empty:
+        return {}
+    last = indicators.groupby("Ticker", sort=False).tail(1).set_index("Ticker")
+    columns = [c for c in last.columns if c not in ("Date", "Close")]
+    return last[["Close"] + columns].round(decimals).to_dict(orient="index")
+
+
+class IndicatorEngine:
+    """
+    compute_indicators with a cache per (ticker, date range, closes, params)
+    Tickers already computed for the same range are reused; the rest are
+    computed together in one grouped pass.
+    """
+
+    def __init__(self, params: Dict = None, max_entries: int = 1024):
+        """
+        Args:
+            params: Default indicator settings
+            max_entries: Ticker results kept before the least recently used go
+        """
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        self.max_entries = max_entries
+        self.cache: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def compute(self, data: pd.DataFrame, params: Dict = None) -> pd.DataFrame:
+        """
+        Indicators for every ticker in data, using cached results where possible
+
+        Args:
+            data: Rows from combine_stock_data
+            params: Overrides for this call
+
+        Returns:
+            Same layout as compute_indicators
+        """
+        params = {**self.params, **(params or {})}
+        if data.empty:
+            return compute_indicators(data, params)
+
+        # A ticker's range is identified by its first and last date and row count,
+        # plus a hash of its closes so a refreshed live bar isn't served stale
+        grouped = data.groupby("Ticker", sort=False)
+        ranges = grouped["Date"].agg(["min", "max", "count"])
+        closes = grouped["Close"].agg(lambda close: hash(close.to_numpy(np.float64).tobytes()))
+        p_key = params_key(params)
+        keys = {ticker: (ticker, str(row["min"]), str(row["max"]), int(row["count"]),
+                         closes[ticker], p_key)
+                for ticker, row in ranges.iterrows()}
+
+        pieces: List[pd.DataFrame] = []
+        missing = []
+        with self.lock:
+            for ticker, key in keys.items():
+                cached = self.cache.get(key)
+                if cached is None:
+                    missing.append(ticker)
+                else:
+                    self.cache.move_to_end(key)
+                    pieces.append(cached)
+
+        if missing:
+            fresh = compute_indicators(data[data["Ticker"].isin(missing)], params)
+            with self.lock:
+                for ticker, rows in fresh.groupby("Ticker", sort=False):
+                    self.cache[keys[ticker]] = rows
+                    pieces.append(rows)
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
+
+        return pd.concat(pieces, ignore_index=True)
+
+
+# One engine (and cache) shared by everything in the process
+INDICATOR_ENGINE = IndicatorEngine()
+
+
+# --- Incremental updates ---
+
+class RollingStats:
+    """Mean and sample standard deviation over the last `window` values, O(1) per value"""
+
+    __slots__ = ("window", "values", "total", "total_sq")
+
+    def __init__(self, window: int, values=()):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        for value in values:
+            self.push(value)
+
+    def push(self, value: float) -> None:
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+
+    def mean(self) -> float:
+        if len(self.values) < self.window:
+            return math.nan
+        return self.total / self.window
+
+    def std(self) -> float:
+        n = len(self.values)
+        if n < self.window or n < 2:
+            return math.nan
+        variance = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+class TickerState:
+    """
+    Everything needed to carry one ticker's SMA, EMA, RSI and volatility
+    forward by one bar. Matches compute_indicators on the same data.
+    """
+
+    def __init__(self, params: Dict):
+        self.last_date: Optional[int] = None      # nanoseconds since epoch
+        self.last_close: Optional[float] = None
+        self.sma = {window: RollingStats(window) for window in params["sma_windows"]}
+        self.ema: Dict[int, Optional[float]] = {span: None for span in params["ema_spans"]}
+        self.avg_gain: Optional[float] = None
+        self.avg_loss: Optional[float] = None
+        self.changes = 0
+        self.log_returns = RollingStats(params["volatility_window"])
+
+    def push(self, date: int, close: float, params: Dict) -> None:
+        """Add one new bar"""
+        for stats in self.sma.values():
+            stats.push(close)
+        for span, value in self.ema.items():
+            alpha = 2 / (span + 1)
+            self.ema[span] = close if value is None else value + alpha * (close - value)
+
+        if self.last_close is not None:
+            change = close - self.last_close
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            if self.avg_gain is None:
+                self.avg_gain, self.avg_loss = gain, loss
+            else:
+                alpha = 1 / params["rsi_period"]
+                self.avg_gain += alpha * (gain - self.avg_gain)
+                self.avg_loss += alpha * (loss - self.avg_loss)
+            self.changes += 1
+            self.log_returns.push(math.log(close / self.last_close))
+
+        self.last_date = date
+        self.last_close = close
+
+    def values(self, params: Dict) -> Dict[str, float]:
+        """Current indicator values, named like the compute_indicators columns"""
+        out = {"Close": self.last_close}
+        for window, stats in self.sma.items():
+            out[f"SMA_{window}"] = stats.mean()
+        for span, value in self.ema.items():
+            out[f"EMA_{span}"] = value
+        period = params["rsi_period"]
+        if self.changes < period:
+            rsi = math.nan
+        elif self.avg_loss == 0:
+            rsi = 100.0
+        else:
+            rsi = 100 - 100 / (1 + self.avg_gain / self.avg_loss)
+        out[f"RSI_{period}"] = rsi
+        out[f"Volatility_{params['volatility_window']}"] = (self.log_returns.std()
+                                                          * math.sqrt(params["trading_days"]))
+        return out
+
+
+class IncrementalIndicators:
+    """
+    SMA, EMA, RSI and volatility kept up to date bar by bar for many tickers
+    A ticker seen for the first time is seeded from its full history in one
+    grouped pass; after that update() only touches bars newer than the last
+    one it has seen, so a daily refresh costs O(new bars).
+    """
+
+    def __init__(self, params: Dict = None):
+        """
+        Args:
+            params: Indicator settings; missing keys use DEFAULT_PARAMS
+        """
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        self.states: Dict[str, TickerState] = {}
+        self.lock = threading.Lock()
+
+    def update(self, data: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+        """
+        Feed in price rows; bars already seen are skipped
+
+        Args:
+            data: Rows with Date, Ticker and Close (new bars only, or a full
+                refreshed history - either works)
+
+        Returns:
+            {ticker: {indicator: value}} for every ticker in data
+        """
+        if data.empty:
+            return {}
+        frame = (data[["Date", "Ticker", "Close"]]
+                 .sort_values(["Ticker", "Date"], kind="stable")
+                 .reset_index(drop=True))
+        dates = pd.DatetimeIndex(frame["Date"]).as_unit("ns").asi8
+        closes = frame["Close"].to_numpy(np.float64)
+        positions = frame.groupby("Ticker", sort=False).indices
+
+        with self.lock:
+            new_tickers = [ticker for ticker in positions if ticker not in self.states]
+            if new_tickers:
+                self._seed(frame[frame["Ticker"].isin(new_tickers)])
+
+            latest = {}
+            for ticker, rows in positions.items():
+                state = self.states[ticker]
+                # Only the bars after the last one already folded in
+                start = np.searchsorted(dates[rows], state.last_date, side="right")
+                for row in rows[start:]:
+                    state.push(int(dates[row]), float(closes[row]), self.params)
+                latest[ticker] = state.values(self.params)
+            return latest
+
+    def _seed(self, frame: pd.DataFrame) -> None:
+        """Build states for new tickers from their history (frame is sorted)"""
+        params = self.params
+        tickers = frame["Ticker"]
+        close = frame["Close"].astype(np.float64)
+
+        def ewm_last(series: pd.Series, **kwargs) -> pd.Series:
+            return (series.groupby(tickers, sort=False).ewm(adjust=False, **kwargs).mean()
+                    .groupby(level=0, sort=False).last())
+
+        emas = {span: ewm_last(close, span=span) for span in params["ema_spans"]}
+        change = close.groupby(tickers, sort=False).diff()
+        avg_gain = ewm_last(change.clip(lower=0), alpha=1 / params["rsi_period"])
+        avg_loss = ewm_last(-change.clip(upper=0), alpha=1 / params["rsi_period"])
+        log_returns = np.log(close).groupby(tickers, sort=False).diff()
+        dates = pd.DatetimeIndex(frame["Date"]).as_unit("ns").asi8
+
+        # Rolling windows only need the last few values of each ticker
+        keep = max(max(params["sma_windows"], default=1), params["volatility_window"])
+        close_values = close.to_numpy()
+        return_values = log_returns.to_numpy()
+        for ticker, rows in frame.groupby("Ticker", sort=False).indices.items():
+            state = TickerState(params)
+            tail = rows[-keep:]
+            for window, stats in state.sma.items():
+                for value in close_values[tail[-window:]]:
+                    stats.push(float(value))
+            for value in return_values[tail[-params["volatility_window"]:]]:
+                if not np.isnan(value):
+                    state.log_returns.push(float(value))
+            state.ema = {span: float(emas[span][ticker]) for span in params["ema_spans"]}
+            state.changes = len(rows) - 1
+            if state.changes:
+                state.avg_gain = float(avg_gain[ticker])
+                state.avg_loss = float(avg_loss[ticker])
+            state.last_date = int(dates[rows[-1]])
+            state.last_close = float(close_values[rows[-1]])
+            self.states[ticker] = state
+
+    def forget(self, ticker: str) -> None:
+        """Drop a ticker's state (e.g. after a split or a corrected history)"""
+        with self.lock:
+            self.states.pop(ticker, None)
+
+    def save(self, path: str) -> None:
+        """Write the per-ticker state to a file"""
+        with self.lock, open(path, "wb") as f:
+            pickle.dump({"params": self.params, "states": self.states}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "IncrementalIndicators":
+        """Read state written by save()"""
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        tracker = cls(saved["params"])
+        tracker.states = saved["states"]
+        return tracker
@@ -0,0 +1,125 @@
+"""
+Long-term memory index for the chatbot
+A small BM25 search engine over every past turn of a conversation
+"""
+
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Words that show up in almost every turn and never help pick a relevant one
+STOPWORDS = frozenset("""
+a an and are as at be but by can could did do does for from had has have he her
+him his how i if in is it its just me my no not of on or our she so than that the
+their them then there these they this to too us was we were what when where which
+who why will with would you your yes ok okay please thanks thank hi hello hey
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search terms
+
+    Args:
+        text: Any message text
+
+    Returns:
+        List of terms with stopwords and single letters removed
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+class TurnIndex:
+    """
+    Inverted index with BM25 scoring over conversation turns
+    Turns are added one at a time, so the index never has to be rebuilt
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75,
+                 max_df_ratio: float = 0.05, max_postings: int = 256):
+        """
+        Set up an empty index
+
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 length normalisation
+            max_df_ratio: Terms found in more than this share of turns are
+                skipped at query time (their IDF is close to zero anyway)
+            max_postings: Only the most recent turns for each term are scored,
+                which keeps lookups under a millisecond on very long sessions
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.max_postings = max_postings
+        self.turns: List[Dict] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def add(self, role: str, content: str) -> int:
+        """
+        Index one turn
+
+        Args:
+            role: Who said it
+            content: The message text
+
+        Returns:
+            The id of the new turn (its position in the conversation)
+        """
+        turn_id = len(self.turns)
+        terms = tokenize(content)
+        self.turns.append({"role": role, "content": content})
+        self.doc_lengths.append(len(terms))
+        self.total_length += len(terms)
+
+        for term, count in Counter(terms).items():
+            self.postings.setdefault(term, []).append((turn_id, count))
+
+        return turn_id
+
+    def search(self, query: str, k: int = 3, before: int = None) -> List[Tuple[int, float]]:
+        """
+        Find the turns that best match a query
+
+        Args:
+            query: Text to look for (usually the user's new message)
+            k: How many turns to return
+            before: Only consider turns with an id lower than this
+
+        Returns:
+            List of (turn_id, score) pairs, best match first
+        """
+        doc_count = len(self.turns) if before is None else min(before, len(self.turns))
+        if doc_count <= 0 or k <= 0:
+            return []
+
+        avg_length = (self.total_length / len(self.turns)) or 1.0
+        max_df = max(self.max_postings, int(len(self.turns) * self.max_df_ratio))
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings or len(postings) > max_df:
+                continue
+
+            df = len(postings)
+            idf = math.log(1 + (len(self.turns) - df + 0.5) / (df + 0.5))
+
+            # Posting lists are in turn order, so the cut-off is a binary search
+            end = bisect_left(postings, (doc_count,))
+            for turn_id, tf in postings[max(0, end - self.max_postings):end]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[turn_id] / avg_length)
+                scores[turn_id] = scores.get(turn_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,294 @@
+"""
+Mock LLM server
+A local stand-in for the Groq/OpenAI chat completions API, for load tests
+and offline development
+
+Run with:
+    python mock_llm_server.py --port 8001 --ttft 0.3 --tokens-per-sec 80
+    python mock_llm_server.py --prefill-tokens-per-sec 2000   # long prompts answer later
+
+Then point the clients at it:
+    LLM_BASE_URL=http://127.0.0.1:8001 streamlit run app.py
+    LLM_BASE_URL=http://127.0.0.1:8001 python test_api.py
+
+Any POST path ending in /chat/completions is answered, so both the Groq
+client (/openai/v1/...) and plain OpenAI clients (/v1/...) work.
+
+With --tool-calls, a (non-streamed) request that offers tools and has no
+tool results yet after the last user message gets those tool calls back
+instead of the reply, e.g.
+    --tool-calls '[{"name": "get_summary", "arguments": {"tickers": ["AAPL"],
+                    "start": "2023-01-01", "end": "2024-01-01"}}]'
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+DEFAULT_REPLY = (
+    "This is a reply from the mock LLM server. It streams a fixed amount of text "
+    "at a steady pace so that latency and throughput measurements are repeatable "
+    "from one run to the next, without a network connection or an API key."
+)
+
+
+class MockSettings:
+    """Behaviour of the mock server, shared by all request threads"""
+
+    def __init__(self, ttft: float = 0.2, tokens_per_sec: float = 100.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 reply: str = DEFAULT_REPLY, seed: int = 0, tool_calls: List[Dict] = None,
+                 prefill_tokens_per_sec: float = 0.0):
+        """
+        Args:
+            ttft: Seconds before the first token is sent
+            tokens_per_sec: Speed of generation after the first token (0 = instant)
+            error_rate: Share of requests answered with a 500 error
+            rate_limit_rate: Share of requests answered with a 429 error
+            reply: Text every completion returns
+            seed: Seed for the error injection, so failures repeat between runs
+            tool_calls: [{"name", "arguments"}, ...] to ask for when a request
+                offers tools (None never calls tools)
+            prefill_tokens_per_sec: Speed of reading the prompt, added to the
+                time to first token like a real model (0 = prompt length is free)
+        """
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.reply = reply
+        self.tool_calls = tool_calls or []
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    def next_outcome(self) -> str:
+        """Decide whether the next request succeeds, fails or is rate limited"""
+        with self.lock:
+            self.request_count += 1
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+
+def prompt_length_tokens(messages: List[Dict]) -> int:
+    """Approximate prompt size in model tokens (about four characters each)"""
+    return sum(len(str(m.get("content") or "")) for m in messages) // 4
+
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """Cut the reply into word-sized 'tokens', keeping the spaces"""
+    tokens = [word + " " for word in text.split(" ")]
+    tokens[-1] = tokens[-1].rstrip()
+    return tokens[:max_tokens]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests like the real API would"""
+
+    protocol_version = "HTTP/1.1"
+    settings: MockSettings = MockSettings()
+
+    def log_message(self, format, *args):
+        # Keep the console quiet during load tests
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON", "type": "invalid_request_error"}})
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        outcome = self.settings.next_outcome()
+        if outcome == "rate_limited":
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)",
+                                            "type": "rate_limit_exceeded",
+                                            "code": "rate_limit_exceeded"}},
+                            {"Retry-After": "1"})
+            return
+        if outcome == "error":
+            self._send_json(500, {"error": {"message": "Injected server error (mock)",
+                                            "type": "internal_server_error"}})
+            return
+
+        model = body.get("model", "mock-model")
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or 1024
+        tokens = split_tokens(self.settings.reply, int(max_tokens))
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        completion_id = f"chatcmpl-mock-{self.settings.request_count}"
+        ttft = self.settings.ttft
+        if self.settings.prefill_tokens_per_sec > 0:
+            ttft += prompt_length_tokens(body.get("messages", [])) / self.settings.prefill_tokens_per_sec
+
+        if self._wants_tool_calls(body):
+            time.sleep(ttft)
+            calls = [{"id": f"call_mock_{i}", "type": "function",
+                      "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))}}
+                     for i, call in enumerate(self.settings.tool_calls)]
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0,
+                             "message": {"role": "assistant", "content": None, "tool_calls": calls},
+                             "finish_reason": "tool_calls"}],
+                "usage": usage,
+            })
+        elif body.get("stream"):
+            self._stream_completion(completion_id, model, tokens, ttft)
+        else:
+            time.sleep(ttft + self._token_delay() * max(len(tokens) - 1, 0))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0,
+                             "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+    def _wants_tool_calls(self, body: Dict) -> bool:
+        """Whether to answer with tool calls: tools offered and none answered since the last user message"""
+        if not self.settings.tool_calls or not body.get("tools") or body.get("stream"):
+            return False
+        for message in reversed(body.get("messages", [])):
+            if message.get("role") == "tool":
+                return False
+            if message.get("role") == "user":
+                return True
+        return True
+
+    def _token_delay(self) -> float:
+        """Seconds between tokens"""
+        if self.settings.tokens_per_sec <= 0:
+            return 0.0
+        return 1.0 / self.settings.tokens_per_sec
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict[str, str] = None) -> None:
+        """Send a complete JSON response"""
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, text: str) -> None:
+        """Write one piece of a chunked HTTP response"""
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_completion(self, completion_id: str, model: str, tokens: List[str], ttft: float) -> None:
+        """Send the reply as server-sent events, one token at a time"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta: Dict, finish_reason=None) -> str:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        time.sleep(ttft)
+        self._write_chunk(event({"role": "assistant", "content": ""}))
+        delay = self._token_delay()
+        for i, token in enumerate(tokens):
+            if i and delay:
+                time.sleep(delay)
+            self._write_chunk(event({"content": token}))
+        self._write_chunk(event({}, "stop"))
+        self._write_chunk("data: [DONE]\n\n")
+        # Zero-length chunk ends the response
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0,
+                      settings: MockSettings = None) -> ThreadingHTTPServer:
+    """
+    Start the mock server on a background thread
+
+    Args:
+        host: Interface to listen on
+        port: Port to use (0 picks a free one)
+        settings: Latency and failure behaviour
+
+    Returns:
+        The running server; its base URL is f"http://{host}:{server.server_port}"
+    """
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,),
+                   {"settings": settings or MockSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of 429 responses")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Text every completion returns")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=0.0,
+                        help="Prompt reading speed added to the time to first token (0 = off)")
+    parser.add_argument("--tool-calls", default="",
+                        help="JSON list of {name, arguments} to ask for when tools are offered")
+    args = parser.parse_args()
+
+    settings = MockSettings(args.ttft, args.tokens_per_sec, args.error_rate,
+                            args.rate_limit_rate, args.reply, args.seed,
+                            json.loads(args.tool_calls) if args.tool_calls else None,
+                            args.prefill_tokens_per_sec)
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {"settings": settings})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    print(f"Mock LLM server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Goodbye!")
+
+
+if __name__ == "__main__":
+    main()
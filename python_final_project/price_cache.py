@@ -0,0 +1,385 @@
+"""
+Price bar cache with interval support
+Bars are kept at the finest interval that was downloaded for each ticker;
+coarser views (hourly from minutes, weekly from days, ...) are made by
+resampling the cached bars instead of downloading again.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Supported bar sizes, finest first, with the pandas frequency used to resample to them
+INTERVALS: Dict[str, str] = {
+    "1m": "1min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "1h": "1h",
+    "1d": "1D",
+    "1wk": "W-MON",
+    "1mo": "MS",
+}
+INTERVAL_ORDER: List[str] = list(INTERVALS)
+
+# How far back Yahoo Finance serves each intraday size (days before today)
+INTRADAY_LOOKBACK_DAYS = {
+    "1m": 30,
+    "5m": 60,
+    "15m": 60,
+    "30m": 60,
+    "1h": 730,
+}
+
+# Why a fetch failed, and how many seconds that is trusted before trying again.
+# No data (delisted or mistyped symbols) rarely changes; errors and timeouts
+# are usually passing network trouble
+NO_DATA = "no_data"
+ERROR = "error"
+TIMEOUT = "timeout"
+FAILURE_TTL = {
+    NO_DATA: 6 * 60 * 60,
+    ERROR: 5 * 60,
+    TIMEOUT: 60,
+}
+
+# How to combine the columns of several bars into one
+OHLCV_AGGREGATION = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Volume": "sum",
+    "Dividends": "sum",
+    "Stock Splits": "max",
+    "Capital Gains": "sum",
+}
+
+# Seconds a cached range that reaches today is trusted, keyed by is_intraday:
+# the newest bars are still forming and the latest day may not be in yet
+LIVE_TTL = {
+    True: 60,
+    False: 15 * 60,
+}
+
+
+def is_intraday(interval: str) -> bool:
+    """True for bar sizes under a day"""
+    return INTERVAL_ORDER.index(interval) < INTERVAL_ORDER.index("1d")
+
+
+def divides(fine: str, coarse: str) -> bool:
+    """Whether bars of size `fine` can be resampled into bars of size `coarse`"""
+    if INTERVAL_ORDER.index(fine) > INTERVAL_ORDER.index(coarse):
+        return False
+    # Every size splits evenly into the larger ones except weeks into months
+    return not (fine == "1wk" and coarse == "1mo")
+
+
+def source_interval(interval: str, start, today=None) -> str:
+    """
+    Which bar size to download for a request
+
+    Intraday requests fetch the finest size Yahoo still serves for that
+    start date, so later, coarser intraday views come from the same bars.
+    Daily and longer requests fetch daily bars.
+
+    Args:
+        interval: The bar size asked for
+        start: First date of the request
+        today: For testing; defaults to now
+
+    Returns:
+        The interval to download
+    """
+    if not is_intraday(interval):
+        return "1d"
+    today = pd.Timestamp(today or pd.Timestamp.now()).tz_localize(None).normalize()
+    age_days = (today - pd.Timestamp(start).tz_localize(None)).days
+    for candidate in INTERVAL_ORDER[:INTERVAL_ORDER.index(interval) + 1]:
+        if age_days <= INTRADAY_LOOKBACK_DAYS[candidate] and divides(candidate, interval):
+            return candidate
+    return interval
+
+
+def resample_ohlcv(data: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Aggregate bars into coarser ones, per ticker
+
+    Open is the first open, High the max, Low the min, Close the last close
+    and Volume the sum. Bins with no trades (nights, weekends) are dropped.
+
+    Args:
+        data: Bars with Date and Ticker columns plus OHLCV columns
+        interval: Target size, one of INTERVALS
+
+    Returns:
+        Resampled bars in the same layout, each labelled with its start time
+    """
+    if data.empty:
+        return data
+    aggregation = {column: how for column, how in OHLCV_AGGREGATION.items() if column in data.columns}
+    grouper = pd.Grouper(key="Date", freq=INTERVALS[interval], label="left", closed="left")
+    bars = (data.groupby(["Ticker", grouper], sort=False)
+            .agg(aggregation)
+            .dropna(subset=["Close"])
+            .reset_index())
+    # Keep the usual column order: Date first, Ticker after the prices
+    columns = ["Date"] + [c for c in data.columns if c in aggregation] + ["Ticker"]
+    return bars[columns]
+
+
+def slice_dates(data: pd.DataFrame, start, end) -> pd.DataFrame:
+    """Rows with start <= Date < end (naive bounds are read in the data's timezone)"""
+    dates = data["Date"]
+    tz = dates.dt.tz
+    bounds = []
+    for value in (start, end):
+        value = pd.Timestamp(value)
+        if tz is not None and value.tz is None:
+            value = value.tz_localize(tz)
+        bounds.append(value)
+    first, last = dates.searchsorted(bounds[0]), dates.searchsorted(bounds[1])
+    return data.iloc[first:last]
+
+
+class PriceCache:
+    """
+    Downloaded bars per (ticker, interval), shared by every analyzer in the process
+    A request is answered from any cached range with the same or a finer
+    interval that covers its dates; otherwise the bars are downloaded at
+    source_interval and cached. Each (ticker, interval) keeps several date
+    ranges, and ones that overlap or touch are merged into one. Ranges that
+    reach today are only trusted for LIVE_TTL seconds, since the latest bars
+    are still changing; older ranges never go stale.
+    """
+
+    def __init__(self, max_entries: int = 512, live_ttl: Dict[bool, float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            max_entries: Cached date ranges kept (over all tickers) before
+                the least recently used tickers go
+            live_ttl: Seconds a range reaching today is trusted, keyed by
+                is_intraday (LIVE_TTL by default)
+            clock: For testing; seconds from any fixed point
+        """
+        self.max_entries = max_entries
+        self.live_ttl = dict(LIVE_TTL, **(live_ttl or {}))
+        self.clock = clock
+        # (ticker, interval) -> [(start, end, bars, expires or None), ...]
+        self.entries: "OrderedDict[Tuple[str, str], List[Tuple]]" = OrderedDict()
+        # Downloads under way, so a second request for them waits instead of downloading too
+        self.pending: Dict[Tuple[str, str], threading.Event] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, ticker: str, start: pd.Timestamp, end: pd.Timestamp,
+                interval: str) -> Optional[Tuple[str, pd.DataFrame]]:
+        """Coarsest fresh cached range that can serve the request (caller holds the lock)"""
+        now = self.clock()
+        for candidate in reversed(INTERVAL_ORDER[:INTERVAL_ORDER.index(interval) + 1]):
+            ranges = self.entries.get((ticker, candidate))
+            if not ranges or not divides(candidate, interval):
+                continue
+            ranges[:] = [entry for entry in ranges if entry[3] is None or now < entry[3]]
+            for entry_start, entry_end, bars, _ in ranges:
+                if entry_start <= start and end <= entry_end:
+                    self.entries.move_to_end((ticker, candidate))
+                    return candidate, bars
+        return None
+
+    def _store(self, ticker: str, interval: str, start: pd.Timestamp, end: pd.Timestamp,
+               bars: pd.DataFrame) -> None:
+        """Add a downloaded range, merging it with cached ranges it overlaps or touches (caller holds the lock)"""
+        today = pd.Timestamp.now().normalize()
+        expires = self.clock() + self.live_ttl[is_intraday(interval)] if end >= today else None
+        kept = []
+        for entry in self.entries.get((ticker, interval), []):
+            entry_start, entry_end, entry_bars, entry_expires = entry
+            if entry_end < start or end < entry_start:
+                kept.append(entry)
+                continue
+            # The new download wins where the two overlap
+            pieces = [slice_dates(entry_bars, entry_start, start), bars,
+                      slice_dates(entry_bars, end, entry_end)]
+            bars = pd.concat([piece for piece in pieces if not piece.empty], ignore_index=True)
+            if entry_end > end:
+                expires = entry_expires
+            start, end = min(start, entry_start), max(end, entry_end)
+        kept.append((start, end, bars, expires))
+        self.entries[(ticker, interval)] = sorted(kept, key=lambda entry: entry[0])
+        self.entries.move_to_end((ticker, interval))
+        while len(self.entries) > 1 and sum(map(len, self.entries.values())) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, ticker: str, start_time: str, end_time: str, interval: str,
+            download: Callable[[str, str, str, str], Optional[pd.DataFrame]],
+            copy: bool = True) -> Optional[pd.DataFrame]:
+        """
+        Bars for one ticker, from the cache when possible
+
+        If another thread is already downloading this ticker at the same
+        bar size, this waits for it and checks the cache again before
+        downloading itself.
+
+        Args:
+            ticker: Stock symbol
+            start_time: First date (YYYY-MM-DD), inclusive
+            end_time: Last date (YYYY-MM-DD), exclusive like yfinance
+            interval: Bar size, one of INTERVALS
+            download: Function (ticker, start, end, interval) -> DataFrame or
+                None that actually fetches bars
+            copy: False hands back a slice of the cached frame itself (when
+                no resampling is needed); callers must not modify it
+
+        Returns:
+            The bars, or None if the download failed
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f"Unsupported interval: {interval}")
+        start, end = pd.Timestamp(start_time), pd.Timestamp(end_time)
+        source = source_interval(interval, start)
+
+        while True:
+            with self.lock:
+                found = self._cached(ticker, start, end, interval)
+                if found is not None:
+                    self.hits += 1
+                    break
+                waiting = self.pending.get((ticker, source))
+                if waiting is None:
+                    self.misses += 1
+                    done = self.pending[(ticker, source)] = threading.Event()
+                    break
+            waiting.wait()
+
+        if found is not None:
+            source, bars = found
+        else:
+            try:
+                bars = download(ticker, start_time, end_time, source)
+                if bars is None or bars.empty:
+                    return None
+                with self.lock:
+                    self._store(ticker, source, start, end, bars)
+            finally:
+                with self.lock:
+                    del self.pending[(ticker, source)]
+                done.set()
+
+        bars = slice_dates(bars, start, end)
+        if source != interval:
+            return resample_ohlcv(bars, interval).reset_index(drop=True)
+        return bars.reset_index(drop=True) if copy else bars
+
+    def make_room(self, ranges: int) -> int:
+        """
+        Raise max_entries so this many more date ranges fit without evicting any
+
+        Returns:
+            The previous max_entries, to put back when they are no longer needed
+        """
+        with self.lock:
+            previous = self.max_entries
+            held = sum(map(len, self.entries.values()))
+            self.max_entries = max(previous, held + ranges)
+            return previous
+
+    def clear(self) -> None:
+        """Forget everything (e.g. to force fresh prices)"""
+        with self.lock:
+            self.entries.clear()
+
+
+def failure_reason(error: Exception) -> str:
+    """TIMEOUT for a timeout from any library (socket, requests, curl), ERROR otherwise"""
+    if (isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower()
+            or "timed out" in str(error).lower()):
+        return TIMEOUT
+    return ERROR
+
+
+class FailureCache:
+    """
+    Negative cache: recent failed fetches per (ticker, interval)
+    Lets a known-bad symbol fail at once instead of costing another round
+    trip to Yahoo on every analysis. "No data" only answers requests inside
+    the date range that came back empty; errors and timeouts answer any
+    range until they expire.
+    """
+
+    def __init__(self, ttl: Dict[str, float] = None, max_entries: int = 4096,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            ttl: Seconds each reason is remembered (FAILURE_TTL by default)
+            max_entries: Failures kept before the oldest are dropped
+            clock: For testing; seconds from any fixed point
+        """
+        self.ttl = dict(FAILURE_TTL, **(ttl or {}))
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[str, float, pd.Timestamp, pd.Timestamp]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+
+    def add(self, ticker: str, start_time: str, end_time: str, interval: str, reason: str) -> None:
+        """Remember that a fetch failed"""
+        expires = self.clock() + self.ttl[reason]
+        with self.lock:
+            self.entries[(ticker, interval)] = (reason, expires, pd.Timestamp(start_time), pd.Timestamp(end_time))
+            self.entries.move_to_end((ticker, interval))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def check(self, ticker: str, start_time: str, end_time: str, interval: str) -> Optional[str]:
+        """
+        Whether a fetch is already known to fail
+
+        Returns:
+            The reason code (NO_DATA, ERROR or TIMEOUT), or None to go ahead and fetch
+        """
+        with self.lock:
+            entry = self.entries.get((ticker, interval))
+            if entry is None:
+                return None
+            reason, expires, failed_start, failed_end = entry
+            if self.clock() >= expires:
+                del self.entries[(ticker, interval)]
+                return None
+        if reason == NO_DATA and not (failed_start <= pd.Timestamp(start_time)
+                                      and pd.Timestamp(end_time) <= failed_end):
+            return None
+        self.hits += 1
+        return reason
+
+    def reason(self, ticker: str, interval: str) -> Optional[str]:
+        """Reason code of the last remembered failure for display (None if none)"""
+        with self.lock:
+            entry = self.entries.get((ticker, interval))
+        return entry[0] if entry is not None and self.clock() < entry[1] else None
+
+    def forget(self, tickers: List[str] = None) -> None:
+        """
+        Drop remembered failures so the next fetch really tries again
+
+        Args:
+            tickers: Only these symbols (every interval); all of them if None
+        """
+        with self.lock:
+            if tickers is None:
+                self.entries.clear()
+                return
+            tickers = set(tickers)
+            for key in [key for key in self.entries if key[0] in tickers]:
+                del self.entries[key]
+
+
+# One cache of each kind shared by everything in the process
+PRICE_CACHE = PriceCache()
+FAILED_FETCHES = FailureCache()
@@ -0,0 +1,263 @@
+"""
+Memory-mapped columnar price store
+Each column is one flat binary file on disk and every ticker owns a
+contiguous row range, recorded in index.json. Reading maps the files
+instead of loading them, so a ticker's series is a zero-copy slice and
+only the pages actually touched use RAM.
+
+Layout of a store folder:
+    index.json      {"rows": N, "tz": ..., "columns": {...}, "tickers": {ticker: [start, stop]}}
+    Date.bin        int64 nanoseconds since the epoch (UTC)
+    Open.bin ...    float64, one file per price column
+"""
+
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = "index.json"
+
+# Columns kept in a store and how they are laid out on disk
+COLUMNS: Dict[str, str] = {
+    "Date": "int64",
+    "Open": "float64",
+    "High": "float64",
+    "Low": "float64",
+    "Close": "float64",
+    "Volume": "float64",
+}
+
+
+class PriceStoreWriter:
+    """
+    Appends one ticker at a time to a store folder
+    Nothing is combined in memory: each ticker's rows go straight to the end
+    of the column files.
+    """
+
+    def __init__(self, root: str, append: bool = False):
+        """
+        Args:
+            root: Store folder (created if missing)
+            append: Keep an existing store and add tickers to it instead of
+                starting over
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        index_path = os.path.join(root, INDEX_FILE)
+        if append and os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+            self.rows, self.tz, self.tickers = index["rows"], index["tz"], index["tickers"]
+            self.files = {name: self._open_for_append(name, dtype) for name, dtype in COLUMNS.items()}
+        else:
+            self.rows, self.tz, self.tickers = 0, None, {}
+            self.files = {name: open(os.path.join(root, f"{name}.bin"), "wb") for name in COLUMNS}
+
+    def _open_for_append(self, name: str, dtype: str):
+        """
+        Open a column file positioned right after the rows the index covers
+
+        A run that died before writing its index leaves rows past that point;
+        they are cut off so new rows land where the index will say they are.
+        """
+        path = os.path.join(self.root, f"{name}.bin")
+        expected = self.rows * np.dtype(dtype).itemsize
+        f = open(path, "r+b")
+        size = f.seek(0, os.SEEK_END)
+        if size < expected:
+            f.close()
+            raise ValueError(f"{path} is shorter than its index says ({size} < {expected} bytes)")
+        f.truncate(expected)
+        f.seek(expected)
+        return f
+
+    def append(self, ticker: str, data: pd.DataFrame) -> None:
+        """
+        Add one ticker's bars
+
+        Args:
+            ticker: Stock symbol (must not already be in the store)
+            data: Bars with a Date column and any of the price columns
+                (missing ones are stored as NaN)
+        """
+        if ticker in self.tickers:
+            raise ValueError(f"{ticker} is already in the store")
+        if data.empty:
+            return
+
+        data = data.sort_values("Date")
+        dates = pd.DatetimeIndex(data["Date"])
+        if self.tz is None and dates.tz is not None:
+            self.tz = str(dates.tz)
+        if dates.tz is not None:
+            dates = dates.tz_convert("UTC")
+        self.files["Date"].write(dates.as_unit("ns").asi8.tobytes())
+
+        for name, dtype in COLUMNS.items():
+            if name == "Date":
+                continue
+            if name in data.columns:
+                values = data[name].to_numpy(dtype)
+            else:
+                values = np.full(len(data), np.nan, dtype=dtype)
+            self.files[name].write(values.tobytes())
+
+        self.tickers[ticker] = [self.rows, self.rows + len(data)]
+        self.rows += len(data)
+
+    def close(self) -> None:
+        """Flush the column files and write the index"""
+        for f in self.files.values():
+            f.close()
+        index = {"rows": self.rows, "tz": self.tz, "columns": COLUMNS, "tickers": self.tickers}
+        # Write the index last and atomically, so readers never see rows it doesn't cover
+        temp_path = os.path.join(self.root, INDEX_FILE + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_path, os.path.join(self.root, INDEX_FILE))
+
+    def __enter__(self) -> "PriceStoreWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PriceStore:
+    """
+    Read side of a store folder
+    Column data is memory-mapped; slicing a ticker never copies.
+    """
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: Store folder written by PriceStoreWriter
+        """
+        self.root = root
+        with open(os.path.join(root, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.rows: int = index["rows"]
+        self.tz: Optional[str] = index["tz"]
+        self.index: Dict[str, Tuple[int, int]] = {t: tuple(r) for t, r in index["tickers"].items()}
+        self.maps: Dict[str, np.ndarray] = {}
+
+    @property
+    def tickers(self) -> List[str]:
+        return list(self.index)
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _map(self, name: str) -> np.ndarray:
+        """Map a column file on first use"""
+        if name not in self.maps:
+            if self.rows == 0:
+                self.maps[name] = np.empty(0, dtype=COLUMNS[name])
+            else:
+                self.maps[name] = np.memmap(os.path.join(self.root, f"{name}.bin"),
+                                            dtype=COLUMNS[name], mode="r", shape=(self.rows,))
+        return self.maps[name]
+
+    def column(self, name: str, ticker: str = None) -> np.ndarray:
+        """
+        Raw values of a column (zero-copy)
+
+        Args:
+            name: One of COLUMNS
+            ticker: Only this ticker's rows; None for the whole column
+
+        Returns:
+            A read-only view into the mapped file
+        """
+        values = self._map(name)
+        if ticker is None:
+            return values
+        start, stop = self.index[ticker]
+        return values[start:stop]
+
+    def dates(self, ticker: str) -> pd.DatetimeIndex:
+        """A ticker's timestamps in the store's timezone"""
+        dates = pd.DatetimeIndex(self.column("Date", ticker).view("datetime64[ns]"))
+        return dates.tz_localize("UTC").tz_convert(self.tz) if self.tz else dates
+
+    def series(self, ticker: str, name: str = "Close") -> pd.Series:
+        """One ticker's column as a Series indexed by date (values are not copied)"""
+        return pd.Series(self.column(name, ticker), index=self.dates(ticker), name=ticker, copy=False)
+
+    def frame(self, tickers: Iterable[str] = None, columns: Iterable[str] = None) -> pd.DataFrame:
+        """
+        Rebuild combine_stock_data-style rows for some tickers
+
+        This does copy, so use it for the tickers actually being worked on
+        (e.g. in batches), not the whole universe.
+
+        Args:
+            tickers: Which tickers (all of them if None)
+            columns: Price columns to include (all of them if None)
+
+        Returns:
+            Long-format DataFrame with Date, the columns and Ticker
+        """
+        tickers = list(self.index) if tickers is None else [t for t in tickers if t in self.index]
+        columns = [c for c in (columns or COLUMNS) if c != "Date"]
+        if not tickers:
+            return pd.DataFrame(columns=["Date"] + columns + ["Ticker"])
+
+        ranges = [self.index[t] for t in tickers]
+        rows = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        dates = pd.DatetimeIndex(self._map("Date")[rows].view("datetime64[ns]"))
+        if self.tz:
+            dates = dates.tz_localize("UTC").tz_convert(self.tz)
+        data = {"Date": dates}
+        for name in columns:
+            data[name] = self._map(name)[rows]
+        data["Ticker"] = np.repeat(np.asarray(tickers, dtype=object),
+                                   [stop - start for start, stop in ranges])
+        return pd.DataFrame(data)
+
+    def batches(self, size: int = 200, tickers: Iterable[str] = None,
+                columns: Iterable[str] = None) -> Iterable[pd.DataFrame]:
+        """
+        Long-format frames of `size` tickers at a time, so whole-universe
+        work only ever holds one batch in memory
+        """
+        tickers = list(self.index) if tickers is None else list(tickers)
+        for first in range(0, len(tickers), size):
+            yield self.frame(tickers[first:first + size], columns)
+
+    def summary(self, tickers: Iterable[str] = None) -> Dict:
+        """
+        Same figures as StockDataAnalyzer.generate_summary_report, read
+        straight from the mapped columns one ticker at a time
+
+        Args:
+            tickers: Which tickers (all of them if None)
+
+        Returns:
+            A dictionary with key stats for each stock
+        """
+        summary = {}
+        for ticker in (self.index if tickers is None else tickers):
+            if ticker not in self.index:
+                continue
+            close = self.column("Close", ticker)
+            if not len(close):
+                continue
+            dates = self.dates(ticker)
+            summary[ticker] = {
+                'records_count': len(close),
+                'date_range': f"{dates[0]} to {dates[-1]}",
+                'avg_close_price': round(float(close.mean()), 2),
+                'price_change': round(float(close[-1] - close[0]), 2),
+                'highest_price': round(float(np.nanmax(self.column("High", ticker))), 2),
+                'lowest_price': round(float(np.nanmin(self.column("Low", ticker))), 2),
+            }
+        return summary
@@ -0,0 +1,160 @@
+"""
+Cross-ticker returns analysis
+Lines the combined stock data up as one dates x tickers matrix and works
+out log returns, the covariance and correlation matrices and beta against
+a benchmark with NumPy. Matrices are float32 so 1,000+ tickers fit easily
+in memory.
+"""
+
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+
+def price_matrix(data: pd.DataFrame) -> Tuple[pd.DatetimeIndex, List[str], np.ndarray]:
+    """
+    Pivot long-format stock data into aligned closing prices
+
+    Args:
+        data: Rows from combine_stock_data (Date, Ticker, Close)
+
+    Returns:
+        (dates, tickers, prices) where prices[i, j] is tickers[j]'s close on
+        dates[i] as float32, NaN where that ticker has no bar that day
+    """
+    date_codes, dates = pd.factorize(pd.DatetimeIndex(data["Date"]), sort=True)
+    ticker_codes, tickers = pd.factorize(data["Ticker"])
+    prices = np.full((len(dates), len(tickers)), np.nan, dtype=np.float32)
+    prices[date_codes, ticker_codes] = data["Close"].to_numpy(np.float32)
+    return dates, list(tickers), prices
+
+
+def log_returns(prices: np.ndarray) -> np.ndarray:
+    """
+    Day-to-day log returns of a price matrix
+
+    Args:
+        prices: dates x tickers closes
+
+    Returns:
+        float32 matrix one row shorter; NaN where either day is missing
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(np.log(prices), axis=0)
+
+
+def pairwise_moments(returns: np.ndarray, min_periods: int = 20) -> Dict[str, np.ndarray]:
+    """
+    Covariance and correlation using, for each pair, only the days both have data
+
+    Missing values are masked out and every pairwise sum comes from a matrix
+    product, so there is no loop over pairs. Each column is centred first
+    (covariance doesn't change) so float32 sums stay accurate.
+
+    Args:
+        returns: dates x tickers log returns with NaN gaps
+        min_periods: Fewest shared days for a pair to get a value
+
+    Returns:
+        covariance, correlation, pair_var (variance of the row ticker over
+        each pair's shared days) and observations, all tickers x tickers
+    """
+    present = ~np.isnan(returns)
+    with warnings.catch_warnings():
+        # Tickers with no returns at all just give NaN means
+        warnings.simplefilter("ignore", RuntimeWarning)
+        centred = returns - np.nanmean(returns, axis=0, dtype=np.float64).astype(np.float32)
+    values = np.where(present, centred, 0).astype(np.float32)
+    mask = present.astype(np.float32)
+
+    # For pair (i, j): shared days, sum of i's returns, sum of i's squares, sum of products
+    count = mask.T @ mask
+    sums = values.T @ mask
+    squares = (values * values).T @ mask
+    products = values.T @ values
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = (products - sums * sums.T / count) / (count - 1)
+        pair_var = (squares - sums * sums / count) / (count - 1)
+        correlation = covariance / np.sqrt(pair_var * pair_var.T)
+
+    too_short = count < max(min_periods, 2)
+    for matrix in (covariance, pair_var, correlation):
+        matrix[too_short] = np.nan
+    np.clip(correlation, -1.0, 1.0, out=correlation)
+
+    return {
+        "covariance": covariance,
+        "correlation": correlation,
+        "pair_var": pair_var,
+        "observations": count.astype(np.int32),
+    }
+
+
+def analyze_returns(data: pd.DataFrame, benchmark: Optional[str] = None,
+                    min_periods: int = 20) -> Dict:
+    """
+    Returns, correlation, covariance and beta for every ticker in the data
+
+    Args:
+        data: Rows from combine_stock_data
+        benchmark: Ticker to measure beta against (must be in the data)
+        min_periods: Fewest shared days for a pair to get a value
+
+    Returns:
+        A dictionary with correlation and covariance DataFrames, plus a
+        per-ticker DataFrame of total log return, annualised volatility and
+        beta (beta is left out when there is no benchmark)
+    """
+    if data.empty:
+        return {}
+
+    dates, tickers, prices = price_matrix(data)
+    returns = log_returns(prices)
+    moments = pairwise_moments(returns, min_periods)
+
+    per_ticker = pd.DataFrame(index=pd.Index(tickers, name="Ticker"))
+    per_ticker["total_log_return"] = np.nansum(returns, axis=0)
+    per_ticker["annual_volatility"] = np.sqrt(np.diag(moments["pair_var"]) * TRADING_DAYS)
+    if benchmark is not None and benchmark in tickers:
+        b = tickers.index(benchmark)
+        # cov(i, b) over the days both traded / variance of b over those same days
+        with np.errstate(divide="ignore", invalid="ignore"):
+            per_ticker["beta"] = moments["covariance"][:, b] / moments["pair_var"][b, :]
+
+    return {
+        "tickers": tickers,
+        "benchmark": benchmark if benchmark in tickers else None,
+        "start": dates[0],
+        "end": dates[-1],
+        "correlation": pd.DataFrame(moments["correlation"], index=tickers, columns=tickers),
+        "covariance": pd.DataFrame(moments["covariance"], index=tickers, columns=tickers),
+        "per_ticker": per_ticker.astype(np.float32),
+    }
+
+
+def top_pairs(correlation: pd.DataFrame, count: int = 10) -> List[Tuple[str, str, float]]:
+    """
+    Most and least correlated pairs, for a quick read of big matrices
+
+    Args:
+        correlation: Output of analyze_returns
+        count: How many pairs from each end
+
+    Returns:
+        (ticker, ticker, correlation) with the highest first, then the lowest
+    """
+    values = correlation.to_numpy()
+    upper_i, upper_j = np.triu_indices(len(values), k=1)
+    pair_values = values[upper_i, upper_j]
+    valid = ~np.isnan(pair_values)
+    upper_i, upper_j, pair_values = upper_i[valid], upper_j[valid], pair_values[valid]
+    order = np.argsort(pair_values)
+    highest = list(order[::-1][:count])
+    picks = highest + [k for k in order[:count] if k not in set(highest)]
+    names = correlation.index
+    return [(names[upper_i[k]], names[upper_j[k]], round(float(pair_values[k]), 3)) for k in picks]
@@ -0,0 +1,251 @@
+"""
+Local ticker symbol index
+Checks typed symbols against a bundled list: known ones are put in Yahoo
+Finance's spelling (BRK.B -> BRK-B) and completed as they are typed.
+Anything that can't be a symbol at all ("hello world", "???") is rejected
+without a download. The list is not every listed security, so a
+well-formed symbol missing from it is still fetched, but close matches
+from the list (APPL -> AAPL) are offered first so a typo doesn't go
+unnoticed (the negative cache in price_cache makes asking for a bad
+symbol again cheap).
+
+symbols.csv (Symbol,Name, sorted by symbol) holds the members of the major
+US, European and Japanese stock indices, taken from the MIT-licensed
+pytickersymbols data, plus the usual index symbols (^GSPC, ^DJI, ...) and
+big ETFs. Symbols are spelled the way Yahoo Finance wants them. To allow
+more, point FINANCE_SYMBOLS_FILE at another CSV in the same layout.
+"""
+
+import csv
+import difflib
+import os
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SYMBOL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "symbols.csv")
+
+# What a Yahoo Finance symbol can look like: an optional ^ for indices, a
+# base of letters and digits, then up to two short suffixes (BRK-B, 7203.T,
+# VOLV-B.ST, EURUSD=X)
+SYMBOL_PATTERN = re.compile(r"^\^?[A-Z0-9]{1,12}([.\-=][A-Z0-9]{1,4}){0,2}$")
+
+
+def normalize(symbol: str) -> str:
+    """Trim and upper-case a typed symbol"""
+    return symbol.strip().upper()
+
+
+def well_formed(symbol: str) -> bool:
+    """Whether a normalized symbol is spelled like one (listed or not)"""
+    return bool(SYMBOL_PATTERN.match(symbol))
+
+
+def read_symbol_file(path: str) -> Dict[str, str]:
+    """
+    Load a Symbol,Name CSV
+
+    Returns:
+        {symbol: company or fund name}
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        return {normalize(row["Symbol"]): row.get("Name") or "" for row in csv.DictReader(f)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Typing edits (insert, delete, replace, swap neighbours) between two symbols"""
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[len(b)]
+
+
+class SymbolIndex:
+    """
+    Sorted array of known symbols
+    Membership and prefix lookups are binary searches, so they stay
+    O(log n) however long the list gets.
+    """
+
+    def __init__(self, symbols: Dict[str, str]):
+        """
+        Args:
+            symbols: {symbol: name}; symbols should already be normalized
+        """
+        pairs = sorted(symbols.items())
+        self.symbols: List[str] = [symbol for symbol, _ in pairs]
+        self.names: List[str] = [name for _, name in pairs]
+
+    @classmethod
+    def load(cls, paths: Iterable[str] = None) -> "SymbolIndex":
+        """
+        Build an index from symbol files
+
+        Args:
+            paths: CSV files to read; defaults to the bundled file plus
+                FINANCE_SYMBOLS_FILE when that is set
+
+        Returns:
+            The index
+        """
+        if paths is None:
+            paths = [SYMBOL_FILE] + [p for p in [os.environ.get("FINANCE_SYMBOLS_FILE")] if p]
+        symbols = {}
+        for path in paths:
+            symbols.update(read_symbol_file(path))
+        return cls(symbols)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        position = bisect_left(self.symbols, symbol)
+        return position < len(self.symbols) and self.symbols[position] == symbol
+
+    def resolve(self, symbol: str) -> Optional[str]:
+        """
+        The index's spelling of a typed symbol
+
+        Share classes are written with a dash on Yahoo Finance, so BRK.B is
+        accepted as BRK-B.
+
+        Returns:
+            The symbol to fetch, or None if it isn't known
+        """
+        symbol = normalize(symbol)
+        for candidate in (symbol, symbol.replace(".", "-")):
+            if candidate in self:
+                return candidate
+        return None
+
+    def name(self, symbol: str) -> str:
+        """Company or fund name of a known symbol ("" if unknown)"""
+        position = bisect_left(self.symbols, symbol)
+        if position < len(self.symbols) and self.symbols[position] == symbol:
+            return self.names[position]
+        return ""
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """
+        Symbols starting with a prefix, for autocomplete
+
+        Args:
+            prefix: What has been typed so far
+            limit: Most results to return
+
+        Returns:
+            (symbol, name) pairs in symbol order
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = []
+        position = bisect_left(self.symbols, prefix)
+        while (position < len(self.symbols) and len(matches) < limit
+               and self.symbols[position].startswith(prefix)):
+            matches.append((self.symbols[position], self.names[position]))
+            position += 1
+        return matches
+
+    def suggest(self, symbol: str, limit: int = 5) -> List[str]:
+        """
+        Likely intended symbols for one that isn't known
+
+        Close spellings come first (fewest typing edits, then same length and
+        first letter), then symbols sharing the longest prefix
+        """
+        symbol = normalize(symbol)
+        close = difflib.get_close_matches(symbol, self.symbols, n=limit * 4, cutoff=0.6)
+        close.sort(key=lambda candidate: (edit_distance(symbol, candidate),
+                                          abs(len(candidate) - len(symbol)),
+                                          candidate[0] != symbol[0]))
+        suggestions = close[:limit]
+        for length in range(len(symbol), 0, -1):
+            if len(suggestions) >= limit:
+                break
+            for candidate, _ in self.complete(symbol[:length], limit):
+                if candidate not in suggestions:
+                    suggestions.append(candidate)
+        return suggestions[:limit]
+
+    def validate(self, symbols: Iterable[str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Put typed symbols in the index's spelling and sort out the rest
+
+        Args:
+            symbols: Symbols as the user typed them
+
+        Returns:
+            (every symbol to fetch, in the index's spelling where known,
+            the well-formed ones not in the index, which are still fetched
+            since the list is far from complete,
+            the ones that can't be symbols, which are not fetched)
+        """
+        resolved, unlisted, invalid = [], [], []
+        for symbol in symbols:
+            known = self.resolve(symbol)
+            if known is None:
+                known = normalize(symbol)
+                if not well_formed(known):
+                    invalid.append(known)
+                    continue
+                unlisted.append(known)
+            resolved.append(known)
+        return resolved, unlisted, invalid
+
+    def hints(self, failed: Iterable[str], limit: int = 3) -> Dict[str, List[str]]:
+        """
+        Suggestions for symbols whose fetch failed and that the index doesn't list
+
+        Listed symbols that failed are left out: they are spelled right and
+        failed for some other reason.
+
+        Returns:
+            {symbol: suggestions}, only for symbols that have some
+        """
+        hints = {}
+        for symbol in failed:
+            if self.resolve(symbol) is None:
+                suggestions = self.suggest(symbol, limit)
+                if suggestions:
+                    hints[symbol] = suggestions
+        return hints
+
+    def typos(self, unlisted: Iterable[str], limit: int = 3) -> Dict[str, List[str]]:
+        """
+        Listed symbols one typing edit away from unlisted ones (APPL -> AAPL)
+
+        Meant for before fetching: these are probably typos, so the user
+        should see the suggestion rather than only a failed download later.
+
+        Returns:
+            {symbol: close symbols}, only for symbols that have some
+        """
+        typos = {}
+        for symbol in unlisted:
+            if self.resolve(symbol) is not None:
+                continue
+            close = [candidate for candidate in self.suggest(symbol, limit)
+                     if edit_distance(normalize(symbol), candidate) <= 1]
+            if close:
+                typos[symbol] = close
+        return typos
+
+
+_index: Optional[SymbolIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_symbol_index() -> SymbolIndex:
+    """The index shared by the whole process, read from disk on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SymbolIndex.load()
+        return _index
@@ -0,0 +1,201 @@
+"""
+Latency tracing for chat turns
+Times each stage of a turn (prompt, LLM call, streaming, rendering) so slow
+turns can be explained
+
+Tracing is off unless CHATBOT_TRACE=1 is set or TRACER.enabled is switched
+on; TRACER.enable_for_thread turns it on or off for just the current thread
+(e.g. one Streamlit session's rerun). Set CHATBOT_TRACE_FILE to also write
+every span as a JSON line.
+"""
+
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class _NoopSpan:
+    """Stand-in used when tracing is off, so disabled spans cost almost nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """Times the code inside a with block"""
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, time.perf_counter() - self.start,
+                           error=exc_type.__name__ if exc_type else None)
+        return False
+
+
+class Turn:
+    """The spans recorded during one chat turn"""
+    def __init__(self, turn_id: int):
+        self.turn_id = turn_id
+        self.spans: Dict[str, float] = {}
+
+    def breakdown(self) -> Dict[str, float]:
+        """Milliseconds spent in each stage, rounded for display"""
+        return {name: round(ms, 2) for name, ms in self.spans.items()}
+
+
+class Tracer:
+    """
+    Collects span timings into per-turn breakdowns, rolling histograms and
+    an optional JSON lines file
+    """
+
+    def __init__(self, enabled: bool = None, export_path: str = None, max_samples: int = 2048):
+        """
+        Args:
+            enabled: Record spans at all (defaults to the CHATBOT_TRACE variable)
+            export_path: File to append spans to as JSON lines
+                (defaults to the CHATBOT_TRACE_FILE variable)
+            max_samples: Recent timings kept per span name for percentiles
+        """
+        if enabled is None:
+            enabled = os.environ.get("CHATBOT_TRACE", "") not in ("", "0")
+        self.default_enabled = enabled
+        self.export_path = export_path or os.environ.get("CHATBOT_TRACE_FILE")
+        self.max_samples = max_samples
+        self.samples: Dict[str, deque] = {}
+        self.lock = threading.Lock()
+        self.turn_ids = itertools.count(1)
+        # Each Streamlit session and service worker runs on its own thread,
+        # so the turn being traced (and any on/off switch) is kept per thread
+        self.local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether spans are recorded on this thread"""
+        enabled = getattr(self.local, "enabled", None)
+        return self.default_enabled if enabled is None else enabled
+
+    @enabled.setter
+    def enabled(self, value: bool) -> None:
+        """Switch tracing on or off for the whole process (threads with their own switch keep it)"""
+        self.default_enabled = value
+
+    def enable_for_thread(self, enabled: Optional[bool]) -> None:
+        """
+        Switch tracing on or off for the current thread only
+
+        Args:
+            enabled: True or False, or None to follow the process-wide setting again
+        """
+        self.local.enabled = enabled
+
+    def span(self, name: str):
+        """
+        Time a block of code
+
+        Args:
+            name: Stage name, e.g. 'create_prompt' or 'llm.request'
+
+        Returns:
+            A context manager (a shared no-op one when tracing is off)
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name)
+
+    def start_turn(self) -> Optional[Turn]:
+        """Start collecting spans for a new turn on this thread"""
+        if not self.enabled:
+            self.local.turn = None
+            return None
+        turn = Turn(next(self.turn_ids))
+        self.local.turn = turn
+        return turn
+
+    def end_turn(self) -> Optional[Turn]:
+        """Stop collecting spans for this thread's turn and return it"""
+        turn = getattr(self.local, "turn", None)
+        self.local.turn = None
+        return turn
+
+    def record(self, name: str, seconds: float, error: str = None) -> None:
+        """
+        Record a timing measured elsewhere (e.g. time to first token)
+
+        Args:
+            name: Stage name
+            seconds: How long it took
+            error: Exception name if the stage failed
+        """
+        if not self.enabled:
+            return
+        ms = seconds * 1000
+        turn = getattr(self.local, "turn", None)
+        if turn is not None:
+            turn.spans[name] = turn.spans.get(name, 0.0) + ms
+
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.max_samples)
+            samples.append(ms)
+
+            if self.export_path:
+                line = {"ts": time.time(), "turn": turn.turn_id if turn else None,
+                        "span": name, "duration_ms": round(ms, 3)}
+                if error:
+                    line["error"] = error
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(line) + "\n")
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarise recent timings
+
+        Returns:
+            For each span name: sample count and p50/p95/p99 in milliseconds
+        """
+        with self.lock:
+            snapshot = {name: sorted(samples) for name, samples in self.samples.items()}
+
+        report = {}
+        for name, values in snapshot.items():
+            if values:
+                report[name] = {
+                    "count": len(values),
+                    "p50": round(_percentile(values, 50), 2),
+                    "p95": round(_percentile(values, 95), 2),
+                    "p99": round(_percentile(values, 99), 2),
+                }
+        return report
+
+    def reset(self) -> None:
+        """Forget all collected timings"""
+        with self.lock:
+            self.samples.clear()
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+# One tracer shared by the whole process
+TRACER = Tracer()
@@ -1,11 +1,20 @@
 
 from groq import Groq
 import os
+import time
+from typing import Dict, Iterator, List
+from tracing import TRACER
 
 # IMPORTANT: ONLY UPDATE YOUR API KEY BELOW
 
 API_KEY = "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"
-CLIENT = Groq(api_key=API_KEY)
+# Set LLM_BASE_URL to send requests somewhere else, e.g. the local mock
+# server in mock_llm_server.py (None means the normal Groq endpoint)
+BASE_URL = os.environ.get("LLM_BASE_URL")
+CLIENT = Groq(api_key=API_KEY, base_url=BASE_URL)
+# Model used when the bot may call tools (set LLM_TOOL_MODEL to use one
+# that is better at tool calling)
+TOOL_MODEL = os.environ.get("LLM_TOOL_MODEL", "gemma2-9b-it")
 
 def query_llm(message: str) -> str:
     """
@@ -16,6 +25,37 @@ def query_llm(message: str) -> str:
         The LLM's response as a string
     """
     try:
+        with TRACER.span("llm.request"):
+            response = CLIENT.chat.completions.create(
+                model="gemma2-9b-it",
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": message}
+                ],
+                temperature=1,
+                max_tokens=1024,
+                top_p=1,
+                stream=False
+            )
+        return response.choices[0].message.content
+    except Exception as e:
+        if "401" in str(e) or "invalid_api_key" in str(e).lower():
+            return "Error: Invalid API key. Please update your Groq API key in utils.py"
+        else:
+            return f"Error connecting to LLM: {str(e)}"
+    
+
+def stream_llm(message: str) -> Iterator[str]:
+    """
+    Query the LLM and yield the response as it is generated.
+    Args:
+        message: The prompt to send to the LLM
+    Yields:
+        Pieces of the LLM's response as strings
+    """
+    try:
+        start = time.perf_counter()
+        first_token = True
         response = CLIENT.chat.completions.create(
             model="gemma2-9b-it",
             messages=[
@@ -25,12 +65,64 @@ def query_llm(message: str) -> str:
             temperature=1,
             max_tokens=1024,
             top_p=1,
-            stream=False
+            stream=True
         )
-        return response.choices[0].message.content
+        for chunk in response:
+            content = chunk.choices[0].delta.content
+            if content is not None:
+                if first_token:
+                    TRACER.record("llm.ttft", time.perf_counter() - start)
+                    first_token = False
+                yield content
+        TRACER.record("llm.stream", time.perf_counter() - start)
     except Exception as e:
         if "401" in str(e) or "invalid_api_key" in str(e).lower():
-            return "Error: Invalid API key. Please update your Groq API key in utils.py"
+            yield "Error: Invalid API key. Please update your Groq API key in utils.py"
         else:
-            return f"Error connecting to LLM: {str(e)}"
-    
\ No newline at end of file
+            yield f"Error connecting to LLM: {str(e)}"
+
+
+def query_llm_with_tools(messages: List[Dict], tools: List[Dict] = None) -> Dict:
+    """
+    Query the LLM with a full message list and let it ask for tool calls.
+    Args:
+        messages: Chat messages so far (system, user, assistant and tool)
+        tools: Tool descriptions in the OpenAI format; None forces a plain answer
+    Returns:
+        {"content": the reply text (may be empty when tools are called),
+         "tool_calls": [{"id", "name", "arguments" (JSON string)}, ...]}
+    """
+    try:
+        options = {"tools": tools, "tool_choice": "auto"} if tools else {}
+        with TRACER.span("llm.request"):
+            response = CLIENT.chat.completions.create(
+                model=TOOL_MODEL,
+                messages=messages,
+                temperature=1,
+                max_tokens=1024,
+                top_p=1,
+                stream=False,
+                **options
+            )
+        message = response.choices[0].message
+        tool_calls = [{"id": call.id, "name": call.function.name,
+                       "arguments": call.function.arguments or "{}"}
+                      for call in (message.tool_calls or [])]
+        return {"content": message.content or "", "tool_calls": tool_calls}
+    except Exception as e:
+        if "401" in str(e) or "invalid_api_key" in str(e).lower():
+            content = "Error: Invalid API key. Please update your Groq API key in utils.py"
+        else:
+            content = f"Error connecting to LLM: {str(e)}"
+        return {"content": content, "tool_calls": []}
+
+
+def tool_call_message(content: str, tool_calls: List[Dict]) -> Dict:
+    """The assistant message that asked for tool calls, in the form the API expects back"""
+    return {
+        "role": "assistant",
+        "content": content or None,
+        "tool_calls": [{"id": call["id"], "type": "function",
+                        "function": {"name": call["name"], "arguments": call["arguments"]}}
+                       for call in tool_calls],
+    }